@@ -0,0 +1,145 @@
+import argparse
+import datetime
+import decimal
+import sys
+from collections import Counter
+from database_configuration import salt_statistics_db_config
+from database_insertion import KEY_COLUMNS, TABLE_ORDER
+from publication_statistics import STATISTICS_TABLES
+from salt_import import run_import
+from storage_backends import storage_backend
+
+# The databases number the rows differently (MySQL skips the ids of upserts which found an existing row, for example),
+# so the rows are compared with the ids replaced by the natural keys of the rows they refer to.
+
+# The tables the id columns refer to, where the name of the column is the id column of more than one table
+REFERENCES = {
+    ("ProposalIssues", "Issue_Id"): "IssuesForProposals",
+    ("PublicationIssues", "Issue_Id"): "IssuesForPublications",
+}
+
+# The table of every other id column
+ID_TABLES = {id_column: table for table, (id_column, _) in KEY_COLUMNS.items() if id_column != "Issue_Id"}
+
+
+def comparable(value):
+    """
+    We turn a value into the form it has in every database: dates as strings, booleans as integers and floats with the
+    six significant digits of a MySQL FLOAT
+    :param value: The value as read from the database
+    :return: The comparable value
+    """
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(" ")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        value = float(value)
+    if isinstance(value, float):
+        return float("{:.6g}".format(value))
+    return value
+
+
+def table_contents(connection, tables=TABLE_ORDER + STATISTICS_TABLES):
+    """
+    We read the rows of the salt_stats tables, with every id replaced by the natural key of the row it refers to, so
+    that the contents of databases which numbered their rows differently can be compared
+    :param connection: A connection to the database, as made by a StorageBackend
+    :param tables: The tables, every table after the ones it refers to
+    :return: dict of table to Counter of rows, a row being a tuple of (column, value) pairs ordered by column
+    """
+    natural_keys = {}
+    contents = {}
+    with connection.cursor() as cur:
+        for table in tables:
+            cur.execute("SELECT * FROM {}".format(table))
+            columns = [column[0] for column in cur.description]
+            id_column, key_columns = KEY_COLUMNS.get(table, (None, []))
+            rows = Counter()
+            ids = {}
+            for values in cur.fetchall():
+                row = {}
+                for column, value in zip(columns, values):
+                    if column == id_column:
+                        continue
+                    reference = REFERENCES.get((table, column), ID_TABLES.get(column))
+                    if reference is None or value is None:
+                        row[column] = comparable(value)
+                    else:
+                        # a dangling id can only be told by its number
+                        row[column] = natural_keys[reference].get(value, ("unknown id", value))
+                rows[tuple(sorted(row.items()))] += 1
+                if id_column is not None:
+                    ids[values[columns.index(id_column)]] = tuple(row[column] for column in key_columns)
+            contents[table] = rows
+            natural_keys[table] = ids
+    return contents
+
+
+def content_differences(expected, actual, limit=5):
+    """
+    We list the differences between the contents of two databases
+    :param expected: The contents of the first database, as returned by table_contents
+    :param actual: The contents of the second database
+    :param limit: Maximum number of rows listed for a table, the others are only counted
+    :return: list of descriptions of the differences, which is empty if the contents are identical
+    """
+    differences = []
+    for table in expected:
+        for rows, where in [(expected[table] - actual[table], "first"), (actual[table] - expected[table], "second")]:
+            if not rows:
+                continue
+            differences.append("{}: {} row(s) only in the {} database".format(table, sum(rows.values()), where))
+            differences.extend("    {}".format(dict(row)) for row in list(rows.elements())[:limit])
+    return differences
+
+
+def compare_backends(backends, tables=TABLE_ORDER + STATISTICS_TABLES):
+    """
+    We compare the contents of the salt_stats tables of every backend with those of the first one
+    :param backends: The StorageBackends
+    :param tables: The tables compared
+    :return: list of (backend, differences) tuples for the backends after the first one
+    """
+    contents = []
+    for backend in backends:
+        connection = backend.connect()
+        try:
+            contents.append(table_contents(connection, tables))
+        finally:
+            connection.close()
+    return [(backend, content_differences(contents[0], backend_contents))
+            for backend, backend_contents in zip(backends[1:], contents[1:])]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that the salt_stats tables of different databases have "
+                                                 "identical rows.")
+    parser.add_argument("databases", nargs="+",
+                        help="the databases to compare: mysql, sqlite:<path> or duckdb:<path>")
+    parser.add_argument("--spreadsheet", help="import this SALT publication statistics xlsx file into every database "
+                                              "first; the databases should be empty")
+    parser.add_argument("--sheet", default="Sheet1", help="name of the sheet with the publications")
+    args = parser.parse_args(argv)
+    if len(args.databases) < 2:
+        parser.error("at least two databases are needed")
+
+    backends = [storage_backend(name, salt_statistics_db_config()) for name in args.databases]
+    if args.spreadsheet:
+        for backend in backends:
+            run_import(args.spreadsheet, sheet_name=args.sheet, backend=backend)
+
+    identical = True
+    for (_, differences), name in zip(compare_backends(backends), args.databases[1:]):
+        for difference in differences:
+            print("{}: {}".format(name, difference), file=sys.stderr)
+        identical = identical and not differences
+    if identical:
+        print("The databases have identical rows")
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import argparse
+import random
+import sys
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+
+# The number of publications on a 1x spreadsheet
+PUBLICATIONS = 500
+
+# The columns of the SALT publication statistics spreadsheet, in their order on the sheet
+COLUMNS = ["1st Author (status 1 November 2019)", "Position of 1st author", "Institute of 1st author",
+           "Partnership of 1st author", "Year", "Month (the ADS 'pub date')", "ADS link", "type of paper",
+           "type of science", "Full author list", "Partners (on paper, excl 1st author)",
+           "Institutes of partners (on paper, excl 1st author)", "Num of SA on paper", "Number of papers",
+           "Proposal code(s)", "Proposal semester", "ToO", "PI", "Partner (time allocated)",
+           "Institutes (on proposal)", "student project", "Instrument(s)", "Instrument mode(s)", "Dates obs (cf WM)",
+           "Priority (ies)", "Total SALT time", "Fraction of total time [%]", "Comments"]
+AUTHOR = COLUMNS.index("1st Author (status 1 November 2019)")
+PROPOSAL_CODE = COLUMNS.index("Proposal code(s)")
+# the columns with the information of a proposal, which are filled in on the continuation rows too
+PROPOSAL_COLUMNS = range(PROPOSAL_CODE, COLUMNS.index("Comments"))
+
+# The colors of the legend, as in legend.LEGEND
+VIOLET_FONT = Font(color="FFA64D79")
+BROWN_FONT = Font(color="FFB45F06")
+GREY_FONT = Font(color="FF999999")
+GREEN_FONT = Font(color="FF6AA84F")
+YELLOW_FILL = PatternFill("solid", fgColor="FFFFF2CC")
+
+POSITIONS = ["Staff", "SA", "PhD student", "MSc student", "Collaboration", "student"]
+PAPER_TYPES = ["science", "science", "science", "data", "instrument", "non-ref"]
+PARTNERS = ["RSA", "UKSC", "POL", "IUCAA", "RU", "UW", "DC", "UNC", "AMNH", "Other"]
+INSTITUTES = ["UCT", "SAAO", "UWC", "NWU", "Keele", "CAMK", "IUCAA", "Rutgers", "UW Madison", "Dartmouth"]
+# the types of science are a category and a subject of science_taxonomy.SCIENCE_TYPES
+SCIENCE_TYPES = ["exg-agn", "exg-gal", "exg-qso", "exg-r-gal", "exg-gcl", "exg-stb", "Gal-*", "Gal-bin", "Gal-cv",
+                 "Gal-wd", "Gal-pn", "Gal-xrb", "Gal-V*", "Gal-yso", "sol", "ast", "exo", "tde", "sne"]
+INSTRUMENT_MODES = {"RSS": ["Long Slit", "MOS", "Fabry Perot", "Spectropolarimetry"], "HRS": ["HR", "MR", "LR"],
+                    "SALTICAM": ["Imaging"], "BVIT": ["Photometry"]}
+STUDENT_PROJECTS = [None, None, None, None, "PhD", "MSc"]
+SURNAMES = ["Buckley", "Crawford", "Potter", "Kniazev", "Vaisanen", "Hettlage", "Kotze", "Mohamed", "Ramphul",
+            "Kuhn", "Romero", "Schellart", "Berdnikov", "Gulbis", "Coppejans", "Nordsieck", "Loaring", "Sefako"]
+
+
+def proposal_codes(count, rng):
+    """
+    We make up distinct proposal codes such as 2016-1-SCI-012, with the year and semester they are for. The number
+    at the end makes them distinct.
+    :param count: Number of proposal codes
+    :param rng: The random number generator
+    :return: list of (proposal code, year, semester) tuples
+    """
+    codes = []
+    for number in range(count):
+        year = rng.randint(2011, 2019)
+        semester = rng.choice([1, 2])
+        codes.append(("{}-{}-{}-{:03d}".format(year, semester, rng.choice(["SCI", "SCI", "SCI", "DDT", "MLT"]),
+                                                number), year, semester))
+    return codes
+
+
+def publication_rows(number, codes, authors, rng):
+    """
+    We make up the rows of a publication, which are the row with the paper and its first proposal and a
+    continuation row without an author for each of its other proposals
+    :param number: The number of the publication, which makes its ADS link unique
+    :param codes: The proposal codes to choose from
+    :param authors: The first authors to choose from, as (name, position, institute, partner) tuples
+    :param rng: The random number generator
+    :return: list of rows, each a list of the values of the COLUMNS
+    """
+    name, position, institute, partner = rng.choice(authors)
+    year = rng.randint(2011, 2019)
+    science_type = rng.choice(SCIENCE_TYPES)
+    other_partners = ",".join(sorted(rng.sample(PARTNERS, rng.randint(0, 3)))) or "--"
+    paper = [name, position, institute, partner, year, rng.randint(1, 12),
+             "https://ui.adsabs.harvard.edu/abs/{}MNRAS.{:05d}".format(year, number), rng.choice(PAPER_TYPES),
+             science_type, ", ".join(rng.choice(SURNAMES) for _ in range(rng.randint(1, 8))), other_partners,
+             ",".join(rng.sample(INSTITUTES, rng.randint(0, 2))) or "--", rng.randint(0, 6), 1]
+
+    rows = []
+    for code, code_year, code_semester in rng.sample(codes, rng.choice([1, 1, 1, 2, 2, 3, 4])):
+        instrument = rng.choice(list(INSTRUMENT_MODES))
+        proposal = [code,
+                    # the semester is left for the SDB to fill in on some rows
+                    "{}.{}".format(code_year, code_semester) if rng.random() < 0.8 else None,
+                    rng.choice(["no", "no", "no", "yes"]), rng.choice(SURNAMES), rng.choice(PARTNERS),
+                    rng.choice(INSTITUTES), rng.choice(STUDENT_PROJECTS), instrument,
+                    rng.choice(INSTRUMENT_MODES[instrument]),
+                    "{}-{:02d}-{:02d}".format(code_year, rng.randint(1, 12), rng.randint(1, 28)),
+                    rng.choice([0, 1, 2, 3, 4]), rng.randint(600, 40000), rng.randint(1, 100)]
+        rows.append((paper if not rows else [None] * len(paper)) + proposal + [None])
+    rows[0][-1] = rng.choice([None, None, None, "re-reduced data", "--"])
+    return rows
+
+
+def styled(ws, values, fonts=None, fills=None):
+    """
+    We turn the values of a row into cells of a write-only sheet, with the given fonts and fills
+    :param ws: The write-only worksheet
+    :param values: The values of the row
+    :param fonts: dict of column index to Font
+    :param fills: dict of column index to PatternFill
+    :return: list of WriteOnlyCell
+    """
+    cells = []
+    for column, value in enumerate(values):
+        cell = WriteOnlyCell(ws, value=value)
+        if fonts and column in fonts:
+            cell.font = fonts[column]
+        if fills and column in fills:
+            cell.fill = fills[column]
+        cells.append(cell)
+    return cells
+
+
+def generate_spreadsheet(path, scale=1.0, seed=2019):
+    """
+    We write a synthetic SALT publication statistics spreadsheet with the columns, legend colors, continuation rows,
+    discarded papers and legend of the real one. The same scale and seed always give the same spreadsheet.
+    :param path: Path of the xlsx file to write
+    :param scale: Size relative to the current spreadsheet, 1 is PUBLICATIONS publications
+    :param seed: Seed of the random number generator
+    :return: Number of publications written, including the discarded papers
+    """
+    rng = random.Random(seed)
+    publications = max(1, int(PUBLICATIONS * scale))
+    codes = proposal_codes(int(publications * 1.5), rng)
+    authors = [("{} {}".format(rng.choice(SURNAMES), "ABCDEFGHJKLMNPRSTUVW"[number % 20] + str(number)),
+                rng.choice(POSITIONS), rng.choice(INSTITUTES), rng.choice(PARTNERS))
+               for number in range(max(1, publications // 3))]
+
+    workbook = Workbook(write_only=True)
+    ws = workbook.create_sheet("Sheet1")
+    ws.append(COLUMNS)
+
+    discarded = max(1, publications // 20)
+    for number in range(publications - discarded):
+        rows = publication_rows(number, codes, authors, rng)
+        color = rng.random()
+        for position, row in enumerate(rows):
+            fonts, fills = {}, {}
+            if position == 0 and color < 0.05:
+                fonts[AUTHOR] = VIOLET_FONT
+            elif position == 0 and color < 0.1:
+                fonts[AUTHOR] = BROWN_FONT
+            if rng.random() < 0.05:
+                # a proposal which is greyed out
+                fonts.update((column, GREY_FONT) for column in PROPOSAL_COLUMNS)
+            elif rng.random() < 0.05:
+                # a proposal code which is not mentioned in the paper
+                fonts[PROPOSAL_CODE] = GREEN_FONT
+            if rng.random() < 0.05:
+                fills[rng.choice(PROPOSAL_COLUMNS)] = YELLOW_FILL
+            ws.append(styled(ws, row, fonts, fills))
+
+    ws.append(styled(ws, ["discarded papers:"]))
+    for number in range(publications - discarded, publications):
+        for row in publication_rows(number, codes, authors, rng):
+            ws.append(styled(ws, row, {column: GREY_FONT for column in range(len(COLUMNS))}))
+
+    # the legend, whose cells are left out of the flags; it starts with the row mentioning violet
+    ws.append([])
+    ws.append(styled(ws, ["violet: data already presented in other SALT paper"], {AUTHOR: VIOLET_FONT}))
+    ws.append(styled(ws, ["brown: typo in paper"], {AUTHOR: BROWN_FONT}))
+    ws.append(styled(ws, ["grey: discarded papers or proposals not counted"], {AUTHOR: GREY_FONT}))
+    ws.append(styled(ws, ["green: proposal code(s) not mentioned in paper, inferred"], {AUTHOR: GREEN_FONT}))
+    for text in ["yellow background: todo/data missing", None, None]:
+        ws.append(styled(ws, [text], fills={AUTHOR: YELLOW_FILL}))
+
+    workbook.save(path)
+    return publications
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic SALT publication statistics spreadsheet.")
+    parser.add_argument("path", help="path of the xlsx file to write")
+    parser.add_argument("--scale", type=float, default=1,
+                        help="size relative to the current spreadsheet ({} publications)".format(PUBLICATIONS))
+    parser.add_argument("--seed", type=int, default=2019, help="seed of the random number generator")
+    args = parser.parse_args(argv)
+    publications = generate_spreadsheet(args.path, args.scale, args.seed)
+    print("Wrote {} publications to {}".format(publications, args.path))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
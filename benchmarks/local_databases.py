@@ -0,0 +1,166 @@
+import os
+import random
+from database_configuration import DatabaseConfiguration
+from schema_migrations import migrate
+from sql_scripts import sql_statements
+from benchmarks.generate_spreadsheet import INSTITUTES, SURNAMES
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TABLES_SQL = os.path.join(os.path.dirname(BENCHMARKS_DIRECTORY), "sql", "tables.sql")
+SDB_TABLES_SQL = os.path.join(BENCHMARKS_DIRECTORY, "sdb_tables.sql")
+
+# The databases the benchmark creates on the local server. The SDB queries refer to sdb_daily by name.
+SALT_STATS_DATABASE = "salt_stats_benchmark"
+SDB_DATABASE = "sdb_daily"
+
+# The hosts the benchmark may drop and create databases on
+LOCAL_HOSTS = ["localhost", "127.0.0.1", "::1"]
+
+
+def local_server_config(database):
+    """
+    The configuration of a database on the local MySQL server the benchmark runs against, from the environment (or
+    the .env file): benchmark_host, benchmark_port, benchmark_user and benchmark_password
+    :param database: Name of the database
+    :return: The database configuration
+    """
+    host = os.getenv("benchmark_host", "127.0.0.1")
+    if host not in LOCAL_HOSTS:
+        raise ValueError("The benchmark drops and creates databases, so it only runs against a local server, "
+                         "not {}".format(host))
+    return DatabaseConfiguration(
+        username=os.getenv("benchmark_user", "root"),
+        password=os.getenv("benchmark_password", ""),
+        host=host,
+        port=int(os.getenv("benchmark_port", "3306")),
+        database=database
+    )
+
+
+def server_connection(database_config: DatabaseConfiguration):
+    """
+    A connection to the server of a database configuration, without using any of its databases
+    :param database_config: The database configuration
+    :return: The MySQLdb connection
+    """
+    import MySQLdb
+    return MySQLdb.connect(user=database_config.username(), password=database_config.password(),
+                           host=database_config.host(), port=database_config.port())
+
+
+def run_script(connection, path):
+    """
+    We run the statements of an SQL file
+    :param connection: The database connection
+    :param path: Path of the SQL file
+    :return:
+    """
+    with open(path) as f:
+        statements = sql_statements(f.read())
+    with connection.cursor() as cur:
+        for statement in statements:
+            cur.execute(statement)
+    connection.commit()
+
+
+def recreate_database(database_config: DatabaseConfiguration, script):
+    """
+    We drop the database if it exists and create it again with the tables of an SQL file
+    :param database_config: The database configuration
+    :param script: Path of the SQL file with the tables
+    :return: A connection to the new database
+    """
+    connection = server_connection(database_config)
+    with connection.cursor() as cur:
+        cur.execute("DROP DATABASE IF EXISTS `{}`".format(database_config.database()))
+        cur.execute("CREATE DATABASE `{}`".format(database_config.database()))
+    connection.select_db(database_config.database())
+    run_script(connection, script)
+    return connection
+
+
+def create_salt_stats(database_config: DatabaseConfiguration):
+    """
+    We create an empty salt_stats database from sql/tables.sql and the schema migrations
+    :param database_config: The configuration of the database to create
+    :return:
+    """
+    connection = recreate_database(database_config, TABLES_SQL)
+    try:
+        migrate(connection)
+    finally:
+        connection.close()
+
+
+def create_sdb(database_config: DatabaseConfiguration, proposal_codes, seed=2019, known=0.95):
+    """
+    We create the SDB stand-in with the tables of sdb_tables.sql, and fill it with made up investigators, institutes,
+    semesters and theses for the proposal codes
+    :param database_config: The configuration of the database to create, which has to be sdb_daily
+    :param proposal_codes: The proposal codes on the spreadsheet
+    :param seed: Seed of the random number generator
+    :param known: Fraction of the proposal codes the SDB knows
+    :return:
+    """
+    rng = random.Random(seed)
+    codes = sorted(set(str(code) for code in proposal_codes) - {"None", "nan"})
+    semesters = [(year, semester) for year in range(2005, 2031) for semester in (1, 2)]
+    semester_ids = {semester: number + 1 for number, semester in enumerate(semesters)}
+    investigators = [(number + 1, rng.randint(1, len(INSTITUTES)), rng.choice(SURNAMES), "F{}".format(number))
+                     for number in range(max(10, len(codes) // 5))]
+
+    proposals, general_info, proposal_investigators, contacts, theses = [], [], [], [], []
+    for code in codes:
+        if rng.random() > known:
+            continue
+        code_id = len(proposals) + 1
+        year, semester = code.split("-")[:2]
+        proposals.append((code_id, code, semester_ids.get((int(year), int(semester)), 1)))
+        general_info.append((code_id, rng.random() < 0.2))
+        team = rng.sample(investigators, rng.randint(1, 3))
+        proposal_investigators.extend((code_id, investigator[0]) for investigator in team)
+        contacts.append((code_id, team[0][0]))
+        theses.extend((code_id, rng.choice([1, 2])) for _ in range(rng.choice([0, 0, 0, 1, 2])))
+
+    connection = recreate_database(database_config, SDB_TABLES_SQL)
+    try:
+        with connection.cursor() as cur:
+            cur.executemany("INSERT INTO Semester(Semester_Id, Year, Semester) VALUES (%s, %s, %s)",
+                            [(semester_ids[semester],) + semester for semester in semesters])
+            cur.executemany("INSERT INTO InstituteName(InstituteName_Id, InstituteName_Name) VALUES (%s, %s)",
+                            list(enumerate(INSTITUTES, 1)))
+            cur.executemany("INSERT INTO Institute(Institute_Id, InstituteName_Id) VALUES (%s, %s)",
+                            [(number, number) for number in range(1, len(INSTITUTES) + 1)])
+            cur.executemany("INSERT INTO Investigator(Investigator_Id, Institute_Id, Surname, FirstName) "
+                            "VALUES (%s, %s, %s, %s)", investigators)
+            cur.executemany("INSERT INTO ProposalCode(ProposalCode_Id, Proposal_Code) VALUES (%s, %s)",
+                            [(code_id, code) for code_id, code, _ in proposals])
+            cur.executemany("INSERT INTO Proposal(ProposalCode_Id, Semester_Id) VALUES (%s, %s)",
+                            [(code_id, semester_id) for code_id, _, semester_id in proposals])
+            cur.executemany("INSERT INTO ProposalGeneralInfo(ProposalCode_Id, ActOnAlert) VALUES (%s, %s)",
+                            general_info)
+            cur.executemany("INSERT INTO ProposalInvestigator(ProposalCode_Id, Investigator_Id) VALUES (%s, %s)",
+                            proposal_investigators)
+            cur.executemany("INSERT INTO ProposalContact(ProposalCode_Id, Leader_Id) VALUES (%s, %s)", contacts)
+            cur.executemany("INSERT INTO P1Thesis(ProposalCode_Id, ThesisType_Id) VALUES (%s, %s)", theses)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def use_local_databases(salt_stats_config: DatabaseConfiguration, sdb_config: DatabaseConfiguration):
+    """
+    We point the importer at the local databases, by setting the environment variables which
+    salt_import.salt_statistics_db_config and sdb_queries.sdb_config read. Variables in the environment take
+    precedence over the .env file.
+    :param salt_stats_config: The configuration of the local salt_stats database
+    :param sdb_config: The configuration of the local SDB
+    :return:
+    """
+    os.environ.update({
+        "salt_stats_host": salt_stats_config.host(), "salt_stats_user": salt_stats_config.username(),
+        "salt_stats_password": salt_stats_config.password(), "salt_stats_database": salt_stats_config.database(),
+        "salt_stats_port": str(salt_stats_config.port()),
+        "host": sdb_config.host(), "user": sdb_config.username(), "password": sdb_config.password(),
+        "database": sdb_config.database(), "port": str(sdb_config.port()),
+    })
@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from connection_pool import close_pools
+from database_insertion import DatabaseInsertion
+from reading_spreadsheet import create_dataframe, fixing_bad_column_return_none, read_spreadsheet, without_legend
+from salt_import import insert_dimensions, insert_position_of_first_author, insert_publication_record, \
+    insert_type_of_publication, salt_statistics_db_config
+from sdb_queries import prefetch_proposal_information
+from spreadsheet_snapshot import ENGINES, SpreadsheetSnapshot
+from spreadsheet_validation import check_spreadsheet
+from benchmarks.generate_spreadsheet import generate_spreadsheet
+from benchmarks.local_databases import SALT_STATS_DATABASE, SDB_DATABASE, create_salt_stats, create_sdb, \
+    local_server_config, server_connection, use_local_databases
+
+# The benchmark is run from the root of the repository against a local MySQL server (such as one started from the
+# mysql docker image), on which it creates the salt_stats_benchmark and sdb_daily databases:
+#   python -m benchmarks.run_benchmark --output baseline.json
+#   python -m benchmarks.run_benchmark --baseline baseline.json
+# The second run exits with 1 if any stage has become slower, runs more queries or needs more memory.
+
+# The sizes of the spreadsheet the benchmark is run for, relative to the current spreadsheet
+SCALES = [1, 10, 100]
+
+
+class StageTimer:
+    """
+    The wall time, number of queries and peak Python memory of the stages of an import. The queries are counted
+    with the Questions status variable of the local server, which counts the statements of every client, so nothing
+    else should be using the server while the benchmark runs.
+    Parameters
+    ----------
+    monitor : Connection
+        A connection to the local server, only used to read its status.
+    memory : bool
+        Whether the peak memory is measured with tracemalloc, which slows the stages down.
+    """
+
+    def __init__(self, monitor, memory: bool = True) -> None:
+        self._monitor = monitor
+        self._memory = memory
+        self._results = {}
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _questions(self) -> int:
+        with self._monitor.cursor() as cur:
+            cur.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+            return int(cur.fetchone()[1])
+
+    def run(self, stage, function, *args, **kwargs):
+        """
+        Run a stage and record its measurements.
+        :param stage: Name of the stage
+        :param function: The function running the stage
+        :param args: Positional arguments of the function
+        :param kwargs: Keyword arguments of the function
+        :return: What the function returns
+        """
+
+        questions = self._questions()
+        if self._memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if self._memory else None
+        # the SHOW STATUS reading the count is a question too
+        queries = self._questions() - questions - 1
+        self._results[stage] = {"seconds": round(seconds, 3), "queries": queries,
+                                "peak_memory_mb": None if peak is None else round(peak / 2 ** 20, 1)}
+        return result
+
+    def results(self) -> dict:
+        """
+        The measurements of the stages which have run.
+        Returns
+        -------
+        dict
+            The seconds, queries and peak memory in MB of each stage.
+        """
+
+        return dict(self._results)
+
+
+def parse_spreadsheet(path, engine="openpyxl"):
+    """
+    We parse the spreadsheet into a SpreadsheetSnapshot and its DataFrame
+    :param path: Path of the xlsx file
+    :param engine: How the cells and their colors are read, "openpyxl" or "stream"
+    :return: The snapshot and the DataFrame
+    """
+    snapshot = SpreadsheetSnapshot(path, engine=engine)
+    return snapshot, snapshot.dataframe()
+
+
+def insert_records(records, proposal_information, batch_size=1000):
+    """
+    We insert the publications into the salt_stats database the way salt_import.run_import does
+    :param records: The publications read by read_spreadsheet
+    :param proposal_information: The SDB information fetched by prefetch_proposal_information
+    :param batch_size: Number of rows written to the database at a time
+    :return:
+    """
+    salt_stats = DatabaseInsertion(salt_statistics_db_config())
+    try:
+        insert_type_of_publication(salt_stats)
+        insert_position_of_first_author(salt_stats)
+        with salt_stats.batch(batch_size=batch_size):
+            insert_dimensions(salt_stats, records, proposal_information)
+            for values in records:
+                insert_publication_record(salt_stats, values, proposal_information, dimensions=False)
+            salt_stats.refresh_statistics()
+    finally:
+        salt_stats.close()
+
+
+def benchmark_import(path, engine="openpyxl", batch_size=1000, sdb_workers=1, memory=True):
+    """
+    We import a spreadsheet into freshly created local databases, measuring every stage
+    :param path: Path of the xlsx file
+    :param engine: How the cells and their colors are read, "openpyxl" or "stream"
+    :param batch_size: Number of rows written to the database at a time
+    :param sdb_workers: Maximum number of queries run against the SDB at the same time
+    :param memory: Whether the peak memory of the stages is measured
+    :return: dict with the number of rows and publications and the measurements of the stages
+    """
+    salt_stats_config = local_server_config(SALT_STATS_DATABASE)
+    sdb_config = local_server_config(SDB_DATABASE)
+    create_salt_stats(salt_stats_config)
+    codes = SpreadsheetSnapshot(path, engine="stream").dataframe()["Proposal code(s)"]
+    create_sdb(sdb_config, (fixing_bad_column_return_none(code) for code in codes))
+    use_local_databases(salt_stats_config, sdb_config)
+    # connections made for an earlier run are for databases which have been dropped since
+    close_pools()
+
+    monitor = server_connection(salt_stats_config)
+    timer = StageTimer(monitor, memory)
+    try:
+        snapshot, spreadsheet = timer.run("parse", parse_spreadsheet, path, engine)
+        timer.run("create_dataframe", create_dataframe, snapshot, 1, spreadsheet.shape[-1], spreadsheet.shape[0])
+        timer.run("validate", check_spreadsheet, without_legend(snapshot.dataframe()))
+        proposal_information = timer.run(
+            "prefetch", prefetch_proposal_information,
+            [fixing_bad_column_return_none(code) for code in snapshot.dataframe()["Proposal code(s)"]],
+            max_workers=sdb_workers)
+        records = timer.run("read_spreadsheet", read_spreadsheet, snapshot, proposal_information)
+        timer.run("insert", insert_records, records, proposal_information, batch_size)
+    finally:
+        monitor.close()
+        close_pools()
+
+    return {"rows": len(spreadsheet), "publications": len(records), "stages": timer.results()}
+
+
+def run_benchmark(scales=None, directory=None, engine="openpyxl", batch_size=1000, sdb_workers=1, memory=True):
+    """
+    We generate a spreadsheet for every scale and import it, measuring every stage
+    :param scales: The sizes of the spreadsheets relative to the current one, SCALES if None
+    :param directory: Directory for the spreadsheets, which are kept and reused; a temporary directory if None
+    :param engine: How the cells and their colors are read, "openpyxl" or "stream"
+    :param batch_size: Number of rows written to the database at a time
+    :param sdb_workers: Maximum number of queries run against the SDB at the same time
+    :param memory: Whether the peak memory of the stages is measured
+    :return: The baseline, as written to JSON
+    """
+    temporary = tempfile.TemporaryDirectory() if directory is None else None
+    directory = temporary.name if temporary is not None else directory
+    try:
+        runs = []
+        for scale in SCALES if scales is None else scales:
+            path = os.path.join(directory, "SALT publication statistics {}x.xlsx".format(scale))
+            if not os.path.exists(path):
+                generate_spreadsheet(path, scale)
+            run = {"scale": scale}
+            run.update(benchmark_import(path, engine, batch_size, sdb_workers, memory))
+            stages = run["stages"].values()
+            run["total"] = {"seconds": round(sum(stage["seconds"] for stage in stages), 3),
+                            "queries": sum(stage["queries"] for stage in stages)}
+            runs.append(run)
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if temporary is not None:
+            temporary.cleanup()
+
+    return {"python": platform.python_version(), "engine": engine, "batch_size": batch_size,
+            "sdb_workers": sdb_workers, "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+            "runs": runs}
+
+
+def regressions(baseline, current, tolerance=0.25):
+    """
+    We compare the measurements of a benchmark with a baseline. A stage has regressed if it is more than tolerance
+    slower, runs more queries or needs more than tolerance more memory.
+    :param baseline: The baseline, as returned by run_benchmark
+    :param current: The measurements to compare, as returned by run_benchmark
+    :param tolerance: Fraction by which the time and memory of a stage may grow
+    :return: list of descriptions of the regressions
+    """
+    baseline_runs = {run["scale"]: run for run in baseline["runs"]}
+    found = []
+    for run in current["runs"]:
+        if run["scale"] not in baseline_runs:
+            continue
+        for stage, measured in run["stages"].items():
+            expected = baseline_runs[run["scale"]]["stages"].get(stage)
+            if expected is None:
+                continue
+            if measured["seconds"] > expected["seconds"] * (1 + tolerance):
+                found.append("{}x {}: {}s instead of {}s".format(run["scale"], stage, measured["seconds"],
+                                                                  expected["seconds"]))
+            if measured["queries"] > expected["queries"]:
+                found.append("{}x {}: {} queries instead of {}".format(run["scale"], stage, measured["queries"],
+                                                                       expected["queries"]))
+            if measured["peak_memory_mb"] is not None and expected["peak_memory_mb"] is not None and \
+                    measured["peak_memory_mb"] > expected["peak_memory_mb"] * (1 + tolerance):
+                found.append("{}x {}: {} MB instead of {} MB".format(run["scale"], stage, measured["peak_memory_mb"],
+                                                                     expected["peak_memory_mb"]))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the import of synthetic SALT publication statistics "
+                                                 "spreadsheets into local databases.")
+    parser.add_argument("--scales", type=float, nargs="+", default=SCALES,
+                        help="sizes of the spreadsheets relative to the current one")
+    parser.add_argument("--directory", help="directory in which the generated spreadsheets are kept")
+    parser.add_argument("--engine", choices=ENGINES, default="openpyxl",
+                        help="how the cells and their colors are read")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="number of rows written to the database at a time")
+    parser.add_argument("--sdb-workers", type=int, default=1,
+                        help="maximum number of queries run against the SDB at the same time")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="don't measure the peak memory, which slows the stages down")
+    parser.add_argument("--output", help="file the measurements are written to as JSON")
+    parser.add_argument("--baseline", help="JSON file with measurements to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="fraction by which the time and memory of a stage may grow over the baseline")
+    args = parser.parse_args(argv)
+
+    scales = [int(scale) if scale == int(scale) else scale for scale in args.scales]
+    results = run_benchmark(scales, args.directory, args.engine, args.batch_size, args.sdb_workers,
+                            not args.no_memory)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(json.load(f), results, args.tolerance)
+        for regression in found:
+            print("Regression: {}".format(regression), file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+-- The tables of the SDB (science database) which the importer queries, with only the columns it uses. The
+-- benchmark creates them in a local database named sdb_daily, as the queries refer to some of them by that name.
+
+CREATE TABLE ProposalCode(
+        ProposalCode_Id INT PRIMARY KEY AUTO_INCREMENT,
+        Proposal_Code VARCHAR(20)
+);
+
+CREATE UNIQUE INDEX idx_proposalCode ON ProposalCode(Proposal_Code);
+
+CREATE TABLE Semester(
+        Semester_Id INT PRIMARY KEY AUTO_INCREMENT,
+        Year INT,
+        Semester INT
+);
+
+CREATE TABLE Proposal(
+        Proposal_Id INT PRIMARY KEY AUTO_INCREMENT,
+        ProposalCode_Id INT,
+        Semester_Id INT,
+        FOREIGN KEY (ProposalCode_Id) REFERENCES ProposalCode(ProposalCode_Id),
+        FOREIGN KEY (Semester_Id) REFERENCES Semester(Semester_Id)
+);
+
+CREATE TABLE ProposalGeneralInfo(
+        ProposalCode_Id INT PRIMARY KEY,
+        ActOnAlert BOOLEAN,
+        FOREIGN KEY (ProposalCode_Id) REFERENCES ProposalCode(ProposalCode_Id)
+);
+
+CREATE TABLE InstituteName(
+        InstituteName_Id INT PRIMARY KEY AUTO_INCREMENT,
+        InstituteName_Name VARCHAR(40)
+);
+
+CREATE TABLE Institute(
+        Institute_Id INT PRIMARY KEY AUTO_INCREMENT,
+        InstituteName_Id INT,
+        FOREIGN KEY (InstituteName_Id) REFERENCES InstituteName(InstituteName_Id)
+);
+
+CREATE TABLE Investigator(
+        Investigator_Id INT PRIMARY KEY AUTO_INCREMENT,
+        Institute_Id INT,
+        Surname VARCHAR(20),
+        FirstName VARCHAR(20),
+        FOREIGN KEY (Institute_Id) REFERENCES Institute(Institute_Id)
+);
+
+CREATE TABLE ProposalInvestigator(
+        ProposalCode_Id INT,
+        Investigator_Id INT,
+        FOREIGN KEY (ProposalCode_Id) REFERENCES ProposalCode(ProposalCode_Id),
+        FOREIGN KEY (Investigator_Id) REFERENCES Investigator(Investigator_Id)
+);
+
+CREATE TABLE ProposalContact(
+        ProposalCode_Id INT PRIMARY KEY,
+        Leader_Id INT,
+        FOREIGN KEY (ProposalCode_Id) REFERENCES ProposalCode(ProposalCode_Id),
+        FOREIGN KEY (Leader_Id) REFERENCES Investigator(Investigator_Id)
+);
+
+CREATE TABLE P1Thesis(
+        P1Thesis_Id INT PRIMARY KEY AUTO_INCREMENT,
+        ProposalCode_Id INT,
+        ThesisType_Id INT,
+        FOREIGN KEY (ProposalCode_Id) REFERENCES ProposalCode(ProposalCode_Id)
+);
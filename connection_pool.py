@@ -0,0 +1,307 @@
+import threading
+import time
+from contextlib import contextmanager
+from database_configuration import DatabaseConfiguration
+from instrumentation import instrumented_cursor
+
+# The number of connections a pool may have open if it isn't given one
+DEFAULT_POOL_SIZE = 4
+
+
+class PooledConnection:
+    """
+    A connection checked out of a ConnectionPool. It stands in for the MySQLdb connection it wraps, and replaces it
+    with a new one if the server has closed it.
+    Parameters
+    ----------
+    pool : ConnectionPool
+        The pool the connection belongs to.
+    connection : Connection
+        The MySQLdb connection.
+    """
+
+    def __init__(self, pool, connection) -> None:
+        self._pool = pool
+        self._connection = connection
+        # the thread the connection is checked out to and how many times it has checked it out
+        self._thread = None
+        self._checkouts = 0
+        self._last_used = time.monotonic()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args):
+        return instrumented_cursor(self._connection.cursor(*args), self._pool._database_config.database())
+
+    def commit(self) -> None:
+        self._connection.commit()
+
+    def rollback(self) -> None:
+        self._connection.rollback()
+
+    def ping(self) -> bool:
+        """
+        Check that the server still has the connection open, and connect again if it hasn't (for example because
+        the connection was idle for longer than the server's wait_timeout). Anything not committed on the old
+        connection is lost, so this is only done between transactions.
+        :return: Whether the connection had to be made again
+        """
+
+        import MySQLdb
+        try:
+            self._connection.ping()
+            return False
+        except MySQLdb.OperationalError:
+            try:
+                self._connection.close()
+            except MySQLdb.Error:
+                pass
+            self._connection = self._pool.connect()
+            return True
+
+    def close(self) -> None:
+        """
+        Check the connection back in to its pool. The connection itself stays open for the next checkout.
+        :return:
+        """
+
+        self._pool.checkin(self)
+
+
+class ConnectionPool:
+    """
+    A bounded pool of connections to a MySQL database. A thread checking out a connection while it has one checked
+    out gets the same connection again, so that everything a thread does in a transaction uses one connection, and
+    the connection is only checked back in once it has been checked in as many times as it has been checked out.
+    Connections which have been idle for longer than stale_after seconds are pinged when they are checked out, and
+    made again if the server has closed them.
+    Parameters
+    ----------
+    database_config : DatabaseConfiguration
+        The configuration of the database.
+    max_size : int
+        Maximum number of connections the pool has open at the same time.
+    timeout : float
+        Number of seconds a checkout waits for a connection when they are all checked out, None to wait forever.
+    stale_after : float
+        Number of seconds after which an idle connection is pinged before it is checked out again.
+    connect_args :
+        Further arguments for MySQLdb.connect, such as cursorclass.
+    """
+
+    def __init__(self, database_config: DatabaseConfiguration, max_size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = 60, stale_after: float = 30, **connect_args) -> None:
+        if max_size < 1:
+            raise ValueError("A connection pool needs room for at least one connection")
+        self._database_config = database_config
+        self._max_size = max_size
+        self._timeout = timeout
+        self._stale_after = stale_after
+        self._connect_args = connect_args
+        self._lock = threading.Condition()
+        # the connections which are checked in, the most recently used last
+        self._idle = []
+        # the connection checked out to each thread
+        self._checked_out = {}
+        self._size = 0
+        self._closed = False
+
+    def max_size(self) -> int:
+        """
+        The maximum number of connections the pool has open at the same time.
+        Returns
+        -------
+        int
+            The maximum number of connections.
+        """
+
+        return self._max_size
+
+    def resize(self, max_size: int) -> None:
+        """
+        Change the maximum number of connections. Connections above a smaller maximum are closed as they are checked
+        in.
+        :param max_size: The new maximum number of connections
+        :return:
+        """
+
+        if max_size < 1:
+            raise ValueError("A connection pool needs room for at least one connection")
+        with self._lock:
+            self._max_size = max_size
+            self._lock.notify_all()
+
+    def connect(self):
+        """
+        A new connection to the database, which isn't managed by the pool.
+        :return: The MySQLdb connection
+        """
+
+        # imported here, so that the embedded databases can be used without mysqlclient
+        import MySQLdb
+        return MySQLdb.connect(
+            user=self._database_config.username(),
+            password=self._database_config.password(),
+            host=self._database_config.host(),
+            port=self._database_config.port(),
+            database=self._database_config.database(),
+            **self._connect_args
+        )
+
+    def checkout(self) -> PooledConnection:
+        """
+        Check a connection out of the pool, waiting for one to be checked in if the pool is full. It has to be checked
+        in again with checkin (or its close method) when the thread is done with it.
+        :return: The connection
+        """
+
+        thread = threading.get_ident()
+        with self._lock:
+            if self._closed:
+                raise ValueError("The connection pool has been closed")
+            pooled = self._checked_out.get(thread)
+            if pooled is not None:
+                pooled._checkouts += 1
+                return pooled
+
+            deadline = None if self._timeout is None else time.monotonic() + self._timeout
+            while not self._idle and self._size >= self._max_size:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No connection to {} became free within {} seconds".format(
+                        self._database_config.database(), self._timeout))
+                self._lock.wait(remaining)
+                if self._closed:
+                    raise ValueError("The connection pool has been closed")
+            pooled = self._idle.pop() if self._idle else None
+            if pooled is None:
+                # the connection is counted before it is made, so that other threads can't take its place
+                self._size += 1
+
+        try:
+            if pooled is None:
+                pooled = PooledConnection(self, self.connect())
+            elif time.monotonic() - pooled._last_used > self._stale_after:
+                pooled.ping()
+        except BaseException:
+            self._discard(pooled)
+            raise
+
+        pooled._thread = thread
+        pooled._checkouts = 1
+        with self._lock:
+            self._checked_out[thread] = pooled
+        return pooled
+
+    def checkin(self, pooled: PooledConnection) -> None:
+        """
+        Check a connection back in to the pool. Anything the thread left uncommitted is rolled back, so that it isn't
+        committed by the next thread using the connection.
+        :param pooled: The connection, as returned by checkout
+        :return:
+        """
+
+        with self._lock:
+            if pooled._checkouts <= 0:
+                raise ValueError("The connection is not checked out")
+            pooled._checkouts -= 1
+            if pooled._checkouts:
+                return
+            del self._checked_out[pooled._thread]
+            pooled._thread = None
+
+        import MySQLdb
+        try:
+            pooled.rollback()
+        except MySQLdb.Error:
+            # the connection is broken, the next checkout makes a new one
+            self._discard(pooled)
+            return
+
+        pooled._last_used = time.monotonic()
+        with self._lock:
+            if self._closed or self._size > self._max_size:
+                self._size -= 1
+                pooled._connection.close()
+            else:
+                self._idle.append(pooled)
+            self._lock.notify()
+
+    def _discard(self, pooled) -> None:
+        if pooled is not None:
+            import MySQLdb
+            try:
+                pooled._connection.close()
+            except MySQLdb.Error:
+                pass
+        with self._lock:
+            self._size -= 1
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Check a connection out for the with block and check it back in at the end of it.
+        :return: The connection
+        """
+
+        pooled = self.checkout()
+        try:
+            yield pooled
+        finally:
+            self.checkin(pooled)
+
+    def close(self) -> None:
+        """
+        Close the idle connections. Connections which are checked out are closed when they are checked in.
+        :return:
+        """
+
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._lock.notify_all()
+        for pooled in idle:
+            pooled._connection.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def shared_pool(database_config: DatabaseConfiguration, max_size: int = None, **connect_args) -> ConnectionPool:
+    """
+    The pool shared by everything connecting to the same database as the same user with the same connection arguments,
+    which is created the first time it is asked for.
+    :param database_config: The configuration of the database
+    :param max_size: Maximum number of connections, the pool is made bigger if it is smaller than this. None keeps the
+    size of an existing pool, or uses DEFAULT_POOL_SIZE for a new one.
+    :param connect_args: Further arguments for MySQLdb.connect, such as cursorclass
+    :return: The pool
+    """
+
+    key = (database_config.host(), database_config.port(), database_config.username(), database_config.database(),
+           tuple(sorted(connect_args.items(), key=lambda item: item[0])))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(database_config, max_size or DEFAULT_POOL_SIZE, **connect_args)
+            _pools[key] = pool
+        elif max_size is not None and max_size > pool.max_size():
+            pool.resize(max_size)
+        return pool
+
+
+def close_pools() -> None:
+    """
+    Close all the shared pools.
+    :return:
+    """
+
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -1,3 +1,6 @@
+import os
+from dotenv import load_dotenv
+
 
 class DatabaseConfiguration:
     """
@@ -80,3 +83,18 @@ class DatabaseConfiguration:
         """
 
         return self._port
+
+
+def salt_statistics_db_config():
+    """
+    The configuration of the salt_stats database, from the environment (or the .env file)
+    :return: The database configuration
+    """
+    load_dotenv()
+    return DatabaseConfiguration(
+        username=os.getenv("salt_stats_user"),
+        password=os.getenv("salt_stats_password"),
+        host=os.getenv("salt_stats_host"),
+        port=int(os.getenv("salt_stats_port", "3306")),
+        database=os.getenv("salt_stats_database")
+    )
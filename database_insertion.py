@@ -1,46 +1,396 @@
+from contextlib import contextmanager
 from database_configuration import DatabaseConfiguration
-from MySQLdb import connect
+from instrumentation import operation
+from publication_statistics import refresh_statistics
+from storage_backends import MySQLBackend, StorageBackend
+
+# The tables in the order their buffered rows are written, so that the rows a row refers to are written first
+TABLE_ORDER = ["FirstAuthorPosition", "PublicationType", "FirstAuthor", "ScienceCategory", "ScienceSubject",
+               "Partner", "Publication", "PublicationPartner", "PublicationInstitute", "Proposal", "StudentProjects",
+               "TimeAllocatingPartner", "Instrument", "InstrumentMode", "Semester", "ProposalInstrumentUse",
+               "IssuesForProposals", "IssuesForPublications", "ProposalIssues", "PublicationIssues",
+               "PublicationFingerprint"]
+
+# The id column and the natural key columns of the tables we look ids up in
+KEY_COLUMNS = {
+    "FirstAuthorPosition": ("Position_Id", ["AuthorPosition"]),
+    "PublicationType": ("PublicationType_Id", ["PublicationType"]),
+    "FirstAuthor": ("FirstAuthor_Id", ["Name"]),
+    "ScienceCategory": ("ScienceCategory_Id", ["ScienceCategory"]),
+    "ScienceSubject": ("ScienceSubject_Id", ["ScienceSubject"]),
+    "Partner": ("Partner_Id", ["Name"]),
+    # a first author can have more than one paper in a month, and every publication date is the 15th of its month
+    "Publication": ("Publication_Id", ["PublicationDate", "FirstAuthor_Id", "ADSLink"]),
+    "Proposal": ("Proposal_Id", ["ProposalCode"]),
+    "Instrument": ("Instrument_Id", ["Instrument"]),
+    "InstrumentMode": ("InstrumentMode_Id", ["Mode"]),
+    "Semester": ("Semester_Id", ["Year", "Semester"]),
+    "IssuesForProposals": ("Issue_Id", ["Issue"]),
+    "IssuesForPublications": ("Issue_Id", ["Issue"]),
+}
+
+# The unique key columns of the tables without an id, which their upserts are deduplicated by
+LINK_KEY_COLUMNS = {
+    "PublicationPartner": ["Publication_Id", "Partner_Id"],
+    "PublicationInstitute": ["Publication_Id", "Institute"],
+    "StudentProjects": ["Proposal_Id"],
+    "TimeAllocatingPartner": ["Proposal_Id", "Partner_Id"],
+    "ProposalInstrumentUse": ["Publication_Id", "Proposal_Id", "InstrumentMode_Id"],
+    "ProposalIssues": ["Proposal_Id", "Issue_Id"],
+    "PublicationIssues": ["Publication_Id", "Issue_Id"],
+    "PublicationFingerprint": ["RecordKey"],
+}
+
+# The columns other than the natural key columns of the dimension tables, which upsert_dimension inserts in bulk, with
+# the table a column refers to, if any. The tables are in the order they have to be inserted.
+DIMENSION_COLUMNS = {
+    "FirstAuthor": [("Position_Id", "FirstAuthorPosition")],
+    "ScienceCategory": [],
+    "ScienceSubject": [("Explanation", None), ("ScienceCategory_Id", "ScienceCategory")],
+    "Partner": [],
+    "Proposal": [("PrincipalInvestigator", None), ("TargetOfOpportunity", None), ("Institutes", None)],
+    "Instrument": [],
+    "InstrumentMode": [("Instrument_Id", "Instrument")],
+    "Semester": [],
+    "IssuesForProposals": [],
+    "IssuesForPublications": [],
+}
 
 
 class DatabaseInsertion:
+    """
+    The inserts and upserts of the salt_stats tables.
+    Parameters
+    ----------
+    database_config : DatabaseConfiguration
+        The configuration of the MySQL database, if no backend is given.
+    backend : StorageBackend
+        The database the tables are written to, such as an SQLiteBackend.
+    """
+
+    def __init__(self, database_config: DatabaseConfiguration = None, backend: StorageBackend = None):
+        if backend is None:
+            if database_config is None:
+                raise ValueError("Either a database configuration or a storage backend is needed")
+            backend = MySQLBackend(database_config)
+        self._backend = backend
+        # the connection is held for the lifetime of the object; a MySQL connection is shared with anything else the
+        # thread checks out of the same pool
+        self._connection = backend.connect()
+        self._batch_size = None
+        self._pending = {}
+        self._pending_rows = 0
+        # natural key -> id for the tables in KEY_COLUMNS, loaded the first time an id of the table is needed
+        self._keys = {}
+        # natural key -> the other values upserted for it in this run, so that repeating an upsert can be skipped
+        self._upserted = {}
+        # the upsert statements of the backend, by table, columns, updated columns and whether they set the lastrowid
+        self._statements = {}
+        # the years of publication and the (year, semester) of proposals written since the summary tables were last
+        # refreshed
+        self._touched_years = set()
+        self._touched_semesters = set()
+        # the publications whose instrument use in the database is only what this run has written: the ones inserted
+        # in this run and the ones whose earlier instrument use has been deleted
+        self._current_instrument_use = set()
+
+    @contextmanager
+    def batch(self, batch_size=1000):
+        """
+        Buffer the inserts made inside the with block and write them with one executemany per table. The buffered rows
+        are written whenever batch_size of them have been collected, and everything is committed once at the end of the
+        block, so that an error part of the way through leaves the database as it was.
+        :param batch_size: Number of buffered rows after which they are written to the database
+        :return:
+        """
+        if self._batch_size is not None:
+            # we are already in a batch, its transaction covers this block too
+            yield self
+            return
+
+        # a long-running job may have left the connection idle for longer than the server keeps it open
+        self._connection.ping()
+        self._batch_size = batch_size
+        try:
+            yield self
+            self.flush()
+            self._connection.commit()
+        except BaseException:
+            self._pending = {}
+            self._pending_rows = 0
+            # the ids of the rows inserted in the batch are gone with it
+            self._keys = {}
+            self._upserted = {}
+            self._touched_years = set()
+            self._touched_semesters = set()
+            self._current_instrument_use = set()
+            self._connection.rollback()
+            raise
+        finally:
+            self._batch_size = None
+
+    def close(self):
+        """
+        Check the connection back in to its pool. Anything not committed is rolled back.
+        :return:
+        """
+        self._connection.close()
+
+    @operation()
+    def refresh_statistics(self, everything=False):
+        """
+        Refresh the summary tables of publication_statistics for the years and semesters of the publications written or
+        deleted since they were last refreshed. In a batch this is part of its transaction.
+        :param everything: Whether all the summary tables are aggregated from scratch instead
+        :return:
+        """
+        self.flush()
+        if everything:
+            refresh_statistics(self._connection, self._backend)
+        else:
+            refresh_statistics(self._connection, self._backend, self._touched_years, self._touched_semesters)
+        self._touched_years = set()
+        self._touched_semesters = set()
+        if self._batch_size is None:
+            self._connection.commit()
+
+    def _touch(self, publication_date=None, year=None, semester=None):
+        """
+        Note the groups of the summary tables a written row counts in.
+        :param publication_date: The publication date, as a date or its string
+        :param year: The year of the semester of a proposal
+        :param semester: The semester of a proposal
+        :return:
+        """
+        publication_year = str(publication_date)[:4]
+        if publication_year.isdigit():
+            self._touched_years.add(int(publication_year))
+        try:
+            self._touched_semesters.add((int(year), int(semester)))
+        except (TypeError, ValueError):
+            pass
+
+    @operation()
+    def flush(self):
+        """
+        Write the buffered rows to the database, table by table in the order of TABLE_ORDER. This does not commit.
+        :return:
+        """
+        if not self._pending:
+            return
+        pending, self._pending, self._pending_rows = self._pending, {}, 0
+        tables = sorted(pending, key=lambda t: TABLE_ORDER.index(t) if t in TABLE_ORDER else len(TABLE_ORDER))
+        with self._connection.cursor() as cur:
+            for table in tables:
+                sql, rows = pending[table]
+                cur.executemany(sql, rows)
+
+    def _execute(self, table, sql, params):
+        """
+        Run an insert for a table, or buffer it if we are in a batch.
+        :param table: Table the row is inserted into
+        :param sql: The insert statement, as written by _upsert_sql so that MySQLdb's executemany can turn it into a
+        multi-row insert
+        :param params: The parameters of the statement
+        :return:
+        """
+        if self._batch_size is None:
+            with self._connection.cursor() as cur:
+                cur.execute(sql, params)
+                self._connection.commit()
+            return
+
+        if table in self._pending and self._pending[table][0] != sql:
+            self.flush()
+        self._pending.setdefault(table, (sql, []))[1].append(params)
+        self._pending_rows += 1
+        if self._pending_rows >= self._batch_size:
+            self.flush()
+
+    def _upsert_sql(self, table, columns, update_columns=(), with_id=False):
+        """
+        The backend's upsert of a table, which is deduplicated by its natural key or the unique key of LINK_KEY_COLUMNS.
+        :param table: The table
+        :param columns: The columns the values are inserted into
+        :param update_columns: The columns updated on an existing row
+        :param with_id: Whether the id of the row must be the lastrowid of the statement, if the backend can do that
+        :return: The statement
+        """
+        statement_key = (table, tuple(columns), tuple(update_columns), with_id)
+        sql = self._statements.get(statement_key)
+        if sql is None:
+            id_column, key_columns = KEY_COLUMNS[table] if table in KEY_COLUMNS else (None, LINK_KEY_COLUMNS[table])
+            sql = self._backend.upsert_sql(table, columns, key_columns, update_columns, id_column if with_id else None)
+            self._statements[statement_key] = sql
+        return sql
+
+    def _upsert(self, table, values, update_columns=()):
+        """
+        Upsert a row of a table without an id, or buffer it if we are in a batch.
+        :param table: A table in LINK_KEY_COLUMNS
+        :param values: dict of column to value
+        :param update_columns: The columns updated on an existing row
+        :return:
+        """
+        self._execute(table, self._upsert_sql(table, list(values), update_columns), tuple(values.values()))
+
+    @staticmethod
+    def _natural_key(values):
+        """
+        The cache key for natural key values. The values are compared as strings, as the spreadsheet and the database
+        don't agree on types (such as "2019" and 2019 for a year, or a date and its string).
+        :param values: The natural key values
+        :return: The cache key, or None if any of the values is missing
+        """
+        if any(value is None for value in values):
+            return None
+        return tuple(str(value) for value in values)
+
+    def _key_cache(self, table):
+        """
+        The ids of a table by natural key. They are all loaded with one query the first time they are needed.
+        :param table: A table in KEY_COLUMNS
+        :return: The natural key to id dictionary for the table
+        """
+        if table not in self._keys:
+            id_column, key_columns = KEY_COLUMNS[table]
+            self.flush()
+            with self._connection.cursor() as cur:
+                # where a natural key is not unique we use its first row, as the old "limit 1" subqueries did
+                sql = "SELECT MIN({id}), {keys} FROM {table} GROUP BY {keys}".format(
+                    id=id_column, keys=", ".join(key_columns), table=table)
+                cur.execute(sql)
+                self._keys[table] = {self._natural_key(row[1:]): row[0] for row in cur.fetchall()}
+        return self._keys[table]
+
+    def _id(self, table, *values):
+        """
+        The id of the row of a table with the given natural key values.
+        :param table: A table in KEY_COLUMNS
+        :param values: The natural key values
+        :return: The id, or None if there is no such row
+        """
+        key = self._natural_key(values)
+        if key is None:
+            return None
+        return self._key_cache(table).get(key)
+
+    def _insert_with_id(self, table, values, update_columns=(), other_values=()):
+        """
+        Upsert a row whose id is needed by other rows. The statement is run straight away, also in a batch, and the id
+        of the row is cached.
+        :param table: A table in KEY_COLUMNS
+        :param values: dict of column to value, with the natural key columns
+        :param update_columns: The columns updated on an existing row
+        :param other_values: The other values of the row, an upsert which has already been run with the same values
+        is skipped
+        :return: The id of the row
+        """
+        id_column, key_columns = KEY_COLUMNS[table]
+        key_values = [values[column] for column in key_columns]
+        cache = self._key_cache(table)
+        key = self._natural_key(key_values)
+        upserted = self._upserted.setdefault(table, {})
+        if key is not None and key in cache and upserted.get(key) == tuple(other_values):
+            return cache[key]
+
+        with self._connection.cursor() as cur:
+            cur.execute(self._upsert_sql(table, list(values), update_columns, with_id=True), tuple(values.values()))
+            row_id = cur.lastrowid if self._backend.upsert_sets_lastrowid else None
+            if row_id is None and key is not None and key not in cache:
+                # the backend can't tell the id of the row, so it is looked up by the natural key
+                cur.execute("SELECT MIN({id}) FROM {table} WHERE {keys}".format(
+                    id=id_column, table=table, keys=" AND ".join("{} = %s".format(column) for column in key_columns)),
+                    key_values)
+                row_id = cur.fetchone()[0]
+        if self._batch_size is None:
+            self._connection.commit()
+
+        if key is not None:
+            # we keep the first row for a key, like the lookups of the other rows would
+            cache.setdefault(key, row_id)
+            upserted[key] = tuple(other_values)
+            row_id = cache[key]
+        return row_id
+
+    @operation()
+    def upsert_dimension(self, table, rows):
+        """
+        Insert or update the rows of a dimension table with one executemany, and load the ids of the table. Rows with
+        the same natural key are merged, with the values of the last one, as running their upserts one after the other
+        would. Rows which are the same as an earlier upsert in this run and rows with a missing natural key value are
+        skipped.
+        :param table: A table in DIMENSION_COLUMNS
+        :param rows: The rows, as tuples of the natural key values followed by the values of the other columns. A
+        column which refers to another table is given by the natural key value of the row it refers to.
+        :return: The natural key to id dictionary for the table
+        """
+        _, key_columns = KEY_COLUMNS[table]
+        other_columns = DIMENSION_COLUMNS[table]
+        distinct = {}
+        for row in rows:
+            key = self._natural_key(row[:len(key_columns)])
+            if key is None:
+                continue
+            other_values = tuple(value if reference is None else self._id(reference, value)
+                                 for value, (_, reference) in zip(row[len(key_columns):], other_columns))
+            distinct[key] = (tuple(row[:len(key_columns)]), other_values)
+
+        cache = self._key_cache(table)
+        upserted = self._upserted.setdefault(table, {})
+        changed = [key_values + other_values for key, (key_values, other_values) in distinct.items()
+                   if key not in cache or upserted.get(key) != other_values]
+        if changed:
+            updates = [column for column, _ in other_columns]
+            with self._connection.cursor() as cur:
+                cur.executemany(self._upsert_sql(table, key_columns + updates, updates), changed)
+            if self._batch_size is None:
+                self._connection.commit()
+            # the ids of the new rows are loaded with one query
+            del self._keys[table]
+            cache = self._key_cache(table)
+
+        for key, (_, other_values) in distinct.items():
+            upserted[key] = other_values
+        return dict(cache)
+
+    @operation()
+    def insert_publication_type(self, publication_type):
+        """
+        Insert a type of publication
+        :param publication_type:
+        :return:
+        """
+        self._insert_with_id("PublicationType", dict(PublicationType=publication_type))
 
-    def __init__(self, database_config: DatabaseConfiguration):
-        self._connection = connect(
-            user=database_config.username(),
-            password=database_config.password(),
-            host=database_config.host(),
-            port=database_config.port(),
-            database=database_config.database()
-        )
-        self._cursor = self._connection.cursor()
+    @operation()
+    def insert_first_author_position(self, position):
+        """
+        Insert a position a first author can have
+        :param position:
+        :return:
+        """
+        self._insert_with_id("FirstAuthorPosition", dict(AuthorPosition=position))
 
+    @operation()
     def insert_partner(self, partner_name):
         """
         Insert name of partner for first author
         :param partner_name:
         :return:
         """
-        with self._connection.cursor() as cur:
-            sql = """INSERT INTO Partner(Name) 
-                     VALUE(%(partner_name)s)
-                     ON DUPLICATE KEY UPDATE Name=%(partner_name)s"""
-            cur.execute(sql, dict(partner_name=partner_name))
-            self._connection.commit()
+        self._insert_with_id("Partner", dict(Name=partner_name))
 
+    @operation()
     def insert_science_category(self, science_category):
         """
         Insert science category of publication
         :param science_category:
         :return:
         """
-        with self._connection.cursor() as cur:
-            sql = """INSERT INTO ScienceCategory(ScienceCategory)
-                     VALUE (%(science_category)s)
-                     ON DUPLICATE KEY UPDATE ScienceCategory = %(science_category)s
-                  """
-            cur.execute(sql, dict(science_category=science_category))
-            self._connection.commit()
+        self._insert_with_id("ScienceCategory", dict(ScienceCategory=science_category))
 
+    @operation()
     def insert_proposal(self, proposal_code, principal_investigator, target_of_opportunity, institutes):
         """
         Insert proposal information which makes the SALT publication(s)
@@ -50,22 +400,14 @@ class DatabaseInsertion:
         :param institutes:
         :return:
         """
-        with self._connection.cursor() as cur:
-            sql = """
-            INSERT  INTO Proposal(ProposalCode, PrincipalInvestigator,TargetOfOpportunity,Institutes) 
-            VALUES (%(proposal_code)s, %(principal_investigator)s, %(target)s, %(institutes)s)
-            ON DUPLICATE KEY UPDATE 
-            ProposalCode = %(proposal_code)s, 
-            PrincipalInvestigator = %(principal_investigator)s,
-            TargetOfOpportunity = %(target)s,
-            Institutes = %(institutes)s
-            """
-            cur.execute(sql, dict(proposal_code=proposal_code,
-                                  principal_investigator=principal_investigator,
-                                  target=target_of_opportunity,
-                                  institutes=institutes))
-            self._connection.commit()
+        self._insert_with_id("Proposal", dict(ProposalCode=proposal_code,
+                                              PrincipalInvestigator=principal_investigator,
+                                              TargetOfOpportunity=target_of_opportunity,
+                                              Institutes=institutes),
+                             ["PrincipalInvestigator", "TargetOfOpportunity", "Institutes"],
+                             [principal_investigator, target_of_opportunity, institutes])
 
+    @operation()
     def insert_semester(self, year, semester):
         """
         Insert the semester for a SALT Proposal
@@ -73,13 +415,9 @@ class DatabaseInsertion:
         :param semester: Semester which SALT proposal was in
         :return:
         """
-        with self._connection.cursor() as cur:
-            sql = """ INSERT INTO Semester(Year, Semester) 
-                      VALUES (%(year)s, %(semester)s)
-                      ON DUPLICATE KEY UPDATE Year=%(year)s,Semester=%(semester)s"""
-            cur.execute(sql, dict(year=year, semester=semester))
-            self._connection.commit()
+        self._insert_with_id("Semester", dict(Year=year, Semester=semester))
 
+    @operation()
     def insert_instrument_mode(self, instrument, mode):
         """
         Insert Instrument mode used per proposal of SALT
@@ -87,50 +425,29 @@ class DatabaseInsertion:
         :param mode: Instrument mode used in SALT Proposal
         :return:
         """
-        with self._connection.cursor() as cur:
-            sql = """
-            INSERT  INTO InstrumentMode(Instrument_Id, Mode) 
-            VALUES ((SELECT Instrument_Id 
-                    FROM Instrument
-                    WHERE Instrument = %(instrument)s),
-                   %(mode)s) ON DUPLICATE KEY UPDATE Mode = %(mode)s
-            """
-            cur.execute(sql, dict(instrument=instrument, mode=mode))
-            self._connection.commit()
+        instrument_id = self._id("Instrument", instrument)
+        self._insert_with_id("InstrumentMode", dict(Instrument_Id=instrument_id, Mode=mode), [], [instrument_id])
 
+    @operation()
     def insert_time_allocating_partner(self, proposal_code, partner_name):
         """Inserting time allocating partner for a publication
         :param partner_name:
         :param proposal_code:
         :return:
         """
-        with self._connection.cursor() as cur:
-            sql = """
-            INSERT  INTO TimeAllocatingPartner(Partner_Id, Proposal_Id) 
-            VALUES ((SELECT Proposal_Id 
-                    FROM Proposal
-                    WHERE ProposalCode = %(proposal_code)s limit 1),
-                   (SELECT Partner_Id
-                    FROM Partner
-                    WHERE Name = %(partner_name)s)
-                    )
-            """
-            cur.execute(sql, dict(proposal_code=proposal_code, partner_name=partner_name))
-            self._connection.commit()
+        self._upsert("TimeAllocatingPartner", dict(Partner_Id=self._id("Partner", partner_name),
+                                                   Proposal_Id=self._id("Proposal", proposal_code)))
 
+    @operation()
     def insert_instrument(self, instrument):
         """
         Insert instrument used in proposal for publication
         :param instrument:
         :return:
         """
-        with self._connection.cursor() as cur:
-            sql = """ INSERT INTO Instrument(Instrument) 
-                      VALUE (%(instrument)s)
-                      ON DUPLICATE KEY UPDATE Instrument=%(instrument)s"""
-            cur.execute(sql, dict(instrument=instrument))
-            self._connection.commit()
+        self._insert_with_id("Instrument", dict(Instrument=instrument))
 
+    @operation()
     def insert_science_subject(self, science_subject, explanation, science_category):
         """
         Insert science subject of SALT publication
@@ -139,77 +456,56 @@ class DatabaseInsertion:
         :param explanation:
         :return:
         """
-        with self._connection.cursor() as cur:
-            sql = """
-            INSERT  INTO ScienceSubject(ScienceCategory_Id, ScienceSubject, Explanation) 
-            VALUES ((SELECT ScienceCategory_Id 
-                     FROM ScienceCategory
-                     WHERE ScienceCategory = %(science_category)s),
-                    %(science_subject)s,
-                    %(explanation)s
-                    )
-            ON DUPLICATE KEY UPDATE ScienceSubject = %(science_subject)s, Explanation = %(explanation)s
-            """
-            cur.execute(sql, dict(science_subject=science_subject,
-                                  explanation=explanation,
-                                  science_category=science_category))
-            self._connection.commit()
+        science_category_id = self._id("ScienceCategory", science_category)
+        self._insert_with_id("ScienceSubject", dict(ScienceCategory_Id=science_category_id,
+                                                    ScienceSubject=science_subject,
+                                                    Explanation=explanation),
+                             ["Explanation"], [explanation, science_category_id])
 
-    def insert_proposal_instrument_use(self, publication_date, first_author_name,
+    @operation()
+    def insert_proposal_instrument_use(self, publication_date, first_author_name, ads_link,
                                        proposal_code, instrument_mode,
                                        year, semester, observation_date, priority,
                                        total_time, time_percentage):
-        with self._connection.cursor() as cur:
-            sql = """
-            INSERT  INTO ProposalInstrumentUse(Publication_Id, 
-                                               Proposal_Id,
-                                               InstrumentMode_Id,
-                                               Semester_Id,
-                                               ObservationDates,
-                                               Priorities,
-                                               TotalSALTTime,
-                                               SALTTimeFraction) 
-            VALUES ((SELECT Publication_Id 
-                     FROM Publication
-                     WHERE PublicationDate = %(publication_date)s 
-                     AND FirstAuthor_Id = (SELECT FirstAuthor_Id 
-                                           FROM FirstAuthor WHERE
-                                           Name = %(first_author_name)s)
-                    ),
-                    (SELECT Proposal_Id 
-                     FROM Proposal
-                     WHERE ProposalCode = %(proposal_code)s limit 1
-                     ),  
-                    (SELECT InstrumentMode_Id
-                     FROM InstrumentMode
-                     WHERE Mode = %(instrument_mode)s 
-                     ),
-                    (SELECT Semester_Id
-                     FROM Semester
-                     WHERE Year = %(year)s and Semester=%(semester)s
-                     ),
-                    %(observation_date)s,
-                    %(priorities)s,
-                    %(total_time)s,
-                    %(time_percentage)s
-                    )
-            """
-            cur.execute(sql, dict(publication_date=publication_date,
-                                  first_author_name=first_author_name,
-                                  proposal_code=proposal_code,
-                                  instrument_mode=instrument_mode,
-                                  year=year,
-                                  semester=semester,
-                                  observation_date=observation_date,
-                                  priorities=priority,
-                                  total_time=total_time,
-                                  time_percentage=time_percentage
-                                  ))
-            self._connection.commit()
+        self._touch(publication_date, year, semester)
+        publication_id = self._publication_id(publication_date, first_author_name, ads_link)
+        if publication_id is not None and publication_id not in self._current_instrument_use:
+            # the rows are keyed by their mode, so the rows of a proposal whose mode has changed on the spreadsheet
+            # would be kept next to the new ones
+            with self._connection.cursor() as cur:
+                self._delete_instrument_use(cur, publication_id)
+            self._current_instrument_use.add(publication_id)
+        self._upsert("ProposalInstrumentUse", dict(
+            Publication_Id=publication_id,
+            Proposal_Id=self._id("Proposal", proposal_code),
+            InstrumentMode_Id=self._id("InstrumentMode", instrument_mode),
+            Semester_Id=self._id("Semester", year, semester),
+            ObservationDates=observation_date,
+            Priorities=priority,
+            TotalSALTTime=total_time,
+            SALTTimeFraction=time_percentage
+        ), ["Semester_Id", "ObservationDates", "Priorities", "TotalSALTTime", "SALTTimeFraction"])
+
+    def _delete_instrument_use(self, cur, publication_id):
+        """
+        Delete the instrument use of a publication straight away, and note its semesters for the summary tables.
+        :param cur: A cursor of the connection
+        :param publication_id: The id of the publication
+        :return:
+        """
+        cur.execute("""SELECT s.Year, s.Semester
+                       FROM ProposalInstrumentUse u JOIN Semester s ON s.Semester_Id = u.Semester_Id
+                       WHERE u.Publication_Id = %(publication_id)s""", dict(publication_id=publication_id))
+        for year, semester in cur.fetchall():
+            self._touch(year=year, semester=semester)
+        cur.execute("DELETE FROM ProposalInstrumentUse WHERE Publication_Id = %(publication_id)s",
+                    dict(publication_id=publication_id))
 
+    @operation()
     def get_proposal_id(self, proposal_code):
+        self.flush()
         with self._connection.cursor() as cur:
-            sql = """SELECT  Proposal_Id 
+            sql = """SELECT  Proposal_Id
                      FROM Proposal
                      WHERE ProposalCode = %(proposal_code)s
                      """
@@ -217,71 +513,46 @@ class DatabaseInsertion:
             results = cur.fetchall()
             return results
 
+    @operation()
     def insert_student_project(self, proposal_code, msc_project, phd_project):
-        proposal_id = self.get_proposal_id(proposal_code)
+        proposal_id = self._id("Proposal", proposal_code)
         if proposal_id:
-            with self._connection.cursor() as cur:
-                sql = """
-                INSERT INTO StudentProjects(Proposal_Id, MSc_Projects, PhD_projects) 
-                VALUES (%(proposal_id)s,
-                        %(MSc_project)s,
-                        %(PhD_project)s)
-                ON DUPLICATE KEY UPDATE Proposal_Id = %(proposal_id)s, 
-                                                   Msc_Projects= %(MSc_project)s,
-                                                   PhD_Projects = %(PhD_project)s
-                 """
-                cur.execute(sql, dict(proposal_id=proposal_id,
-                                      MSc_project=msc_project,
-                                      PhD_project=phd_project))
-                self._connection.commit()
+            self._upsert("StudentProjects", dict(Proposal_Id=proposal_id,
+                                                 MSc_Projects=msc_project,
+                                                 PhD_Projects=phd_project),
+                         ["MSc_Projects", "PhD_Projects"])
+
+    def _publication_id(self, publication_date, first_author_name, ads_link):
+        """
+        The id of a publication, which we know by its date, first author and ADS link.
+        :param publication_date:
+        :param first_author_name:
+        :param ads_link:
+        :return: The id, or None if there is no such publication
+        """
+        return self._id("Publication", publication_date, self._id("FirstAuthor", first_author_name), ads_link)
 
+    @operation()
     def insert_publication_institute(self, publication_date,
                                      institute,
                                      first_author_name,
+                                     ads_link,
                                      first_author_belonging,
                                      other_author_belonging):
-        with self._connection.cursor() as cur:
-            sql = """
-            INSERT INTO PublicationInstitute(Publication_Id, 
-                                             Institute,
-                                             FirstAuthorBelonging,
-                                             OtherAuthorsBelonging)
-            VALUES(
-                   (SELECT Publication_Id 
-                    FROM Publication 
-                    WHERE PublicationDate = %(publication_date)s
-                    AND FirstAuthor_Id = (SELECT FirstAuthor_Id 
-                                          FROM FirstAuthor
-                                          WHERE Name = %(first_author_name)s)
-                    ),
-                   %(institute)s,
-                   %(first_author_belonging)s,
-                   %(other_author_belonging)s
-                   )
-                  """
-            cur.execute(sql, dict(publication_date=publication_date,
-                                  first_author_name=first_author_name,
-                                  institute=institute,
-                                  first_author_belonging=first_author_belonging,
-                                  other_author_belonging=other_author_belonging))
-            self._connection.commit()
+        self._upsert("PublicationInstitute", dict(
+            Publication_Id=self._publication_id(publication_date, first_author_name, ads_link),
+            Institute=institute,
+            FirstAuthorBelonging=first_author_belonging,
+            OtherAuthorsBelonging=other_author_belonging), ["FirstAuthorBelonging", "OtherAuthorsBelonging"])
 
+    @operation()
     def insert_first_author(self, name, position):
-        with self._connection.cursor() as cur:
-            sql = """
-            INSERT INTO FirstAuthor(Name, Position_id)
-            VALUES (%(name)s, 
-                   (SELECT Position_Id 
-                    FROM FirstAuthorPosition
-                    WHERE AuthorPosition = %(position)s)
-                   )
-            ON DUPLICATE KEY UPDATE Name = %(name)s, Position_Id = (SELECT Position_Id 
-                                                                    FROM FirstAuthorPosition
-                                                                    WHERE AuthorPosition = %(position)s)"""
-            cur.execute(sql, dict(name=name, position=position))
-            self._connection.commit()
+        position_id = self._id("FirstAuthorPosition", position)
+        self._insert_with_id("FirstAuthor", dict(Name=name, Position_Id=position_id), ["Position_Id"], [position_id])
 
+    @operation()
     def get_publication_type_id(self, publication_type):
+        self.flush()
         with self._connection.cursor() as cur:
             sql = """SELECT  PublicationType_Id
                      FROM PublicationType
@@ -291,114 +562,108 @@ class DatabaseInsertion:
             results = cur.fetchall()
             return results
 
+    @operation()
     def insert_publication(self, author_name, publication_date, ads_link, science_subject, publication_type,
                            authors, number_of_sa, comments):
-        if self.get_publication_type_id(publication_type):
-            with self._connection.cursor() as cur:
-                sql = """
-                INSERT INTO Publication(FirstAuthor_Id, PublicationDate, ADSLink, PublicationType_id, 
-                                        ScienceSubject_Id, Authors, NumberOfSAs, Comments)
-                VALUES ((SELECT FirstAuthor_Id
-                         FROM FirstAuthor
-                         WHERE Name = %(author_name)s
-                         ),
-                         %(publication_date)s,
-                         %(ads_link)s,
-                         (SELECT ScienceSubject_Id 
-                          FROM ScienceSubject
-                          WHERE ScienceSubject = %(science_subject)s
-                          ),
-                         (SELECT PublicationType_Id
-                          FROM PublicationType
-                          WHERE PublicationType = %(publication_type)s
-                          ),
-                         %(authors)s,
-                         %(number_of_sa)s,
-                         %(comments)s)
-                """
-                cur.execute(sql, dict(author_name=author_name,
-                                      publication_date=publication_date,
-                                      ads_link=ads_link,
-                                      science_subject=science_subject,
-                                      publication_type=publication_type,
-                                      authors=authors,
-                                      number_of_sa=number_of_sa,
-                                      comments=comments))
-                self._connection.commit()
+        publication_type_id = self._id("PublicationType", publication_type)
+        if publication_type_id:
+            self._touch(publication_date)
+            first_author_id = self._id("FirstAuthor", author_name)
+            science_subject_id = self._id("ScienceSubject", science_subject)
+            new = self._id("Publication", publication_date, first_author_id, ads_link) is None
+            publication_id = self._insert_with_id("Publication", dict(FirstAuthor_Id=first_author_id,
+                                                     PublicationDate=publication_date,
+                                                     ADSLink=ads_link,
+                                                     PublicationType_Id=publication_type_id,
+                                                     ScienceSubject_Id=science_subject_id,
+                                                     Authors=authors,
+                                                     NumberOfSAs=number_of_sa,
+                                                     Comments=comments),
+                                 ["PublicationType_Id", "ScienceSubject_Id", "Authors", "NumberOfSAs", "Comments"],
+                                 [publication_type_id, science_subject_id, authors, number_of_sa, comments])
+            if new:
+                # a new publication has no instrument use to replace
+                self._current_instrument_use.add(publication_id)
 
-    def insert_publication_partner(self, publication_date, first_author_name, partner_name,
+    @operation()
+    def insert_publication_partner(self, publication_date, first_author_name, ads_link, partner_name,
                                    first_author_belonging, other_author_belonging):
-        with self._connection.cursor() as cur:
-            sql = """
-                    INSERT INTO PublicationPartner(Publication_Id,
-                                                   Partner_Id,
-                                                   FirstAuthorBelonging, 
-                                                   OtherAuthorsBelonging)                           
-                    VALUES ((SELECT Publication_Id 
-                             FROM Publication
-                             WHERE PublicationDate = %(publication_date)s 
-                             AND FirstAuthor_Id = (SELECT  FirstAuthor_Id
-                                                   FROM FirstAuthor
-                                                   WHERE Name = %(first_author_name)s)),
-                             (SELECT Partner_Id 
-                              FROM Partner
-                              WHERE Name = %(partner_name)s
-                             ),
-                             %(first_author_belonging)s,
-                             %(other_author_belonging)s)
-                  """
-            cur.execute(sql, dict(publication_date=publication_date,
-                                  first_author_name=first_author_name,
-                                  partner_name=partner_name,
-                                  first_author_belonging=first_author_belonging,
-                                  other_author_belonging=other_author_belonging))
-            self._connection.commit()
+        self._upsert("PublicationPartner", dict(
+            Publication_Id=self._publication_id(publication_date, first_author_name, ads_link),
+            Partner_Id=self._id("Partner", partner_name),
+            FirstAuthorBelonging=first_author_belonging,
+            OtherAuthorsBelonging=other_author_belonging), ["FirstAuthorBelonging", "OtherAuthorsBelonging"])
 
+    @operation()
     def insert_actual_issues_with_proposals(self, issue):
-        with self._connection.cursor() as cur:
-            sql = """ INSERT INTO IssuesForProposals(Issue)
-                      VALUE (%(issue)s) ON DUPLICATE KEY UPDATE Issue = %(issue)s
-                  """
-            cur.execute(sql, dict(issue=issue))
-            self._connection.commit()
+        self._insert_with_id("IssuesForProposals", dict(Issue=issue))
 
+    @operation()
     def insert_actual_issues_with_publications(self, issue):
-        with self._connection.cursor() as cur:
-            sql = """ INSERT INTO IssuesForPublications(Issue)
-                      VALUE (%(issue)s) ON DUPLICATE KEY UPDATE Issue = %(issue)s 
-                  """
-            cur.execute(sql, dict(issue=issue))
-            self._connection.commit()
+        self._insert_with_id("IssuesForPublications", dict(Issue=issue))
 
+    @operation()
     def insert_proposal_issues(self, proposal_code, issue):
-        proposal_id = self.get_proposal_id(proposal_code)
+        proposal_id = self._id("Proposal", proposal_code)
         if proposal_id:
-            with self._connection.cursor() as cur:
-                sql = """
-                INSERT INTO ProposalIssues(Proposal_Id, Issue_Id) 
-                VALUES ((SELECT Proposal_Id FROM Proposal WHERE ProposalCode = %(proposal_code)s),
-                        (SELECT Issue_Id FROM IssuesForProposals WHERE Issue = %(issue)s)
-                        )    
-                """
-                cur.execute(sql, dict(proposal_code=proposal_code, issue=issue))
-                self._connection.commit()
+            self._upsert("ProposalIssues", dict(Proposal_Id=proposal_id,
+                                                Issue_Id=self._id("IssuesForProposals", issue)))
+
+    @operation()
+    def insert_publication_issues(self, publication_date, first_author_name, ads_link, issue):
+        self._upsert("PublicationIssues", dict(
+            Publication_Id=self._publication_id(publication_date, first_author_name, ads_link),
+            Issue_Id=self._id("IssuesForPublications", issue)))
+
+    @operation()
+    def publication_fingerprints(self):
+        """
+        The fingerprints of the publication records imported by an incremental import.
+        :return: dict of record key to (fingerprint, publication id)
+        """
+        self.flush()
+        with self._connection.cursor() as cur:
+            cur.execute("SELECT RecordKey, Fingerprint, Publication_Id FROM PublicationFingerprint")
+            return {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
+    @operation()
+    def insert_publication_fingerprint(self, record_key, fingerprint, publication_date, first_author_name, ads_link):
+        self._upsert("PublicationFingerprint", dict(
+            RecordKey=record_key,
+            Fingerprint=fingerprint,
+            Publication_Id=self._publication_id(publication_date, first_author_name, ads_link)),
+            ["Fingerprint", "Publication_Id"])
 
-    def insert_publication_issues(self, publication_date, first_author_name, issue):
+    @operation()
+    def delete_publication(self, record_key, publication_id):
+        """
+        Delete a publication imported by an incremental import, with the rows which belong to it and its fingerprint.
+        The proposals, authors and other rows it refers to are kept, as other publications may refer to them too. The
+        deletes are run straight away, before any buffered inserts which might re-insert the publication.
+        :param record_key: The record key of the publication's fingerprint
+        :param publication_id: The id of the publication, or None if it is not in the database
+        :return:
+        """
+        self.flush()
         with self._connection.cursor() as cur:
-            sql = """
-            INSERT INTO PublicationIssues(Publication_Id, Issue_Id)
-            VALUES ((SELECT Publication_Id 
-                     FROM Publication
-                     WHERE PublicationDate = %(publication_date)s 
-                     AND FirstAuthor_Id = (SELECT FirstAuthor_Id 
-                                           FROM FirstAuthor
-                                           WHERE Name = %(first_author_name)s)),
-                    (SELECT Issue_Id
-                     FROM IssuesForPublications
-                     WHERE Issue = %(issue)s)
-                    )
-            """
-            cur.execute(sql, dict(publication_date=publication_date,
-                                  first_author_name=first_author_name,
-                                  issue=issue))
+            if publication_id is not None:
+                # the publication no longer counts in the summary tables
+                cur.execute("SELECT PublicationDate FROM Publication WHERE Publication_Id = %(publication_id)s",
+                            dict(publication_id=publication_id))
+                for (publication_date,) in cur.fetchall():
+                    self._touch(publication_date)
+                self._delete_instrument_use(cur, publication_id)
+            cur.execute("DELETE FROM PublicationFingerprint WHERE RecordKey = %(record_key)s",
+                        dict(record_key=record_key))
+            if publication_id is not None:
+                for table in ["PublicationPartner", "PublicationInstitute", "PublicationIssues", "Publication"]:
+                    cur.execute("DELETE FROM {} WHERE Publication_Id = %(publication_id)s".format(table),
+                                dict(publication_id=publication_id))
+        if self._batch_size is None:
             self._connection.commit()
+
+        # the publication must not be found by its natural key any more
+        cache = self._keys.get("Publication", {})
+        for key in [key for key, row_id in cache.items() if row_id == publication_id]:
+            del cache[key]
+            self._upserted.get("Publication", {}).pop(key, None)
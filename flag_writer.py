@@ -0,0 +1,96 @@
+import pandas as pd
+
+
+class FlagWriter:
+    """
+    Flags for the rows of a worksheet, collected in memory and written in one go.
+    Parameters
+    ----------
+    column : int
+        Number of the column the flags are written to.
+    column_name : str
+        Name of the column the flags are written to, we use "Flag".
+    """
+
+    def __init__(self, column: int, column_name: str = "Flag") -> None:
+        self._column = column
+        self._column_name = column_name
+        self._flags = {}
+
+    def column(self) -> int:
+        """
+        The number of the flag column.
+        Returns
+        -------
+        int
+            The column number.
+        """
+
+        return self._column
+
+    def column_name(self) -> str:
+        """
+        The name of the flag column.
+        Returns
+        -------
+        str
+            The column name.
+        """
+
+        return self._column_name
+
+    def add(self, row: int, value) -> None:
+        """
+        Add a flag for a row. A later flag for the same row replaces the earlier one.
+        :param row: The row we need to add a flag to
+        :param value: The value to be added in the spreadsheet
+        :return:
+        """
+
+        self._flags[row] = value
+
+    def flags(self) -> dict:
+        """
+        The flags collected so far.
+        Returns
+        -------
+        dict
+            The flag value for each row number.
+        """
+
+        return dict(self._flags)
+
+    def write(self, worksheet) -> None:
+        """
+        Write the column name and all the flags to a worksheet.
+        :param worksheet: The worksheet to add the flags to
+        :return:
+        """
+
+        worksheet.cell(row=1, column=self._column).value = self._column_name
+        for row, value in self._flags.items():
+            worksheet.cell(row=row, column=self._column).value = value
+
+    def write_dataframe(self, dataframe):
+        """
+        Write the column name and all the flags to a DataFrame read from a worksheet, as if they had been written to
+        the worksheet before it was read. The first row of the worksheet is the header of the DataFrame.
+        :param dataframe: The DataFrame to add the flags to
+        :return: The DataFrame with the flags
+        """
+
+        dataframe = dataframe.copy()
+        # empty cells are read as NaN
+        values = [float("nan")] * len(dataframe)
+        for row, value in self._flags.items():
+            if 0 <= row - 2 < len(dataframe):
+                values[row - 2] = value
+        flags = pd.Series(values, index=dataframe.index, dtype=object)
+
+        position = self._column - 1
+        if position < len(dataframe.columns):
+            dataframe = dataframe.rename(columns={dataframe.columns[position]: self._column_name})
+            dataframe[self._column_name] = flags.where(flags.notnull(), dataframe[self._column_name])
+        else:
+            dataframe[self._column_name] = flags
+        return dataframe
@@ -0,0 +1,337 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+from legend import BROWN, GREEN, GREY, LEGEND, VIOLET, YELLOW, StyleClassifier
+from reading_spreadsheet import AUTHOR_COLUMN, fixing_bad_column_return_none, publication_records, publication_rows
+from sdb_queries import prefetch_proposal_information
+from spreadsheet_validation import SpreadsheetValidationError, validate_spreadsheet
+
+# The stages of a streaming import of the spreadsheet. Every stage is a generator taking the output of the one before:
+#   sheet_rows -> classified_rows -> dataframe_chunks -> publication_chunks -> record_stream -> record_batches
+# so that only a chunk of rows and a batch of publications are held in memory at a time, whatever the size of the
+# sheet. publication_batches puts them together.
+
+
+def sheet_rows(snapshot, min_row=1, max_col=None, max_row=None):
+    """
+    We group the cells of the sheet by row. Rows which are not in the sheet XML (such as empty rows) are left out.
+    :param snapshot: The spreadsheet
+    :param min_row: First row to read
+    :param max_col: Last column to read, all the columns are read if None
+    :param max_row: Last row to read, all the rows are read if None
+    :return: generator of (row number, list of StyledCell) tuples
+    """
+    row_number = None
+    cells = []
+    for cell in snapshot.styled_cells(min_row, max_col, max_row):
+        if cell.row != row_number:
+            if cells:
+                yield row_number, cells
+            row_number = cell.row
+            cells = []
+        cells.append(cell)
+    if cells:
+        yield row_number, cells
+
+
+def sheet_summary(snapshot, legend=LEGEND):
+    """
+    We go through the sheet once, without keeping its rows, for what the rows can't tell until the end of the sheet:
+    where the discarded papers and the legend start, and which colored cells belong to the legend. As create_dataframe
+    does, the colors of the last row with a value are not looked at, and the last colored cells of each color are
+    taken to be the legend's (the last three for yellow).
+    :param snapshot: The spreadsheet
+    :param legend: The colors of the legend, see legend.LEGEND
+    :return: dict such as
+    {"columns": ["1st Author (status 1 November 2019)", ...], "column_names": {1: "1st Author ...", ...},
+     "last_row": 123, "legend_row": 117, "discarded": 95, "legend_cells": {(117, 1), (119, 1)}}
+    where columns are the header values (None for an empty header cell), column_names are the header values as
+    find_column_name gives them, legend_row is None if there is no legend, discarded is 0 if there are no discarded
+    papers and legend_cells are the (row, column) of the cells whose colors are the legend's
+    """
+    classifier = StyleClassifier(legend)
+    columns = []
+    column_names = {}
+    author_column = None
+    last_row = 0
+    legend_row = None
+    discarded_papers = 0
+    last_cells = {VIOLET: None, BROWN: None, GREY: None, GREEN: None}
+    last_yellow_cells = deque(maxlen=3)
+    # the colored cells from the last row with a value on, which only count once a later row has a value
+    pending = []
+
+    for row_number, cells in sheet_rows(snapshot):
+        if row_number == 1:
+            header = {cell.column: cell.value for cell in cells}
+            named = [column for column, value in header.items() if value is not None]
+            columns = [header.get(column) for column in range(1, max(named) + 1)] if named else []
+            column_names = {count: header[column] for count, column in enumerate(named, 1)}
+            if AUTHOR_COLUMN in columns:
+                author_column = columns.index(AUTHOR_COLUMN) + 1
+
+        if any(cell.value is not None for cell in cells):
+            for cell, categories in pending:
+                if cell.value == "discarded papers:":
+                    discarded_papers = cell.row
+                for category in last_cells:
+                    if categories & category:
+                        last_cells[category] = cell
+                if categories & YELLOW:
+                    last_yellow_cells.append(cell)
+            pending = []
+            last_row = row_number
+
+        for cell in cells:
+            if cell.column > len(columns):
+                continue
+            if legend_row is None and row_number > 1 and cell.column == author_column and \
+                    cell.value is not None and "violet" in str(cell.value):
+                legend_row = row_number
+            categories = classifier.classify(cell)
+            if categories or cell.value == "discarded papers:":
+                pending.append((cell, categories))
+
+    # the last grey cell is only the legend's if it is below the discarded papers
+    if last_cells[GREY] is not None and last_cells[GREY].row <= discarded_papers:
+        last_cells[GREY] = None
+    legend_cells = {(cell.row, cell.column) for cell in list(last_cells.values()) + list(last_yellow_cells)
+                    if cell is not None}
+    return {"columns": columns, "column_names": column_names, "last_row": last_row, "legend_row": legend_row,
+            "discarded": discarded_papers, "legend_cells": legend_cells}
+
+
+def row_flag(row_number, cells, summary, classifier):
+    """
+    We work out the flag create_dataframe gives a row from the colors of its cells.
+    :param row_number: The row number
+    :param cells: The StyledCells of the row
+    :param summary: The sheet_summary of the sheet
+    :param classifier: The StyleClassifier for the legend
+    :return: The flag, or None if the row has no flag
+    """
+    categories = 0
+    green_columns = []
+    for cell in cells:
+        if cell.column > len(summary["columns"]) or (row_number, cell.column) in summary["legend_cells"]:
+            continue
+        cell_categories = classifier.classify(cell)
+        categories |= cell_categories
+        if cell_categories & GREEN:
+            green_columns.append(summary["column_names"][cell.column])
+
+    flag = None
+    if categories & BROWN:
+        flag = 0
+    if categories & VIOLET:
+        flag = 1
+    if categories & GREY and row_number > summary["discarded"]:
+        flag = 2
+    if categories & GREY and row_number < summary["discarded"]:
+        flag = 3
+    if categories & YELLOW:
+        flag = 4
+    if green_columns:
+        flag = "{} not mentioned in paper, inferred".format(",".join(green_columns))
+        if categories & BROWN:
+            flag = "0, " + flag
+        elif categories & VIOLET:
+            flag = "1, " + flag
+    return flag
+
+
+def classified_rows(snapshot, summary, legend=LEGEND):
+    """
+    We read the rows of the sheet below the header and above the legend, with their flags. Empty rows are included,
+    as pandas would read them.
+    :param snapshot: The spreadsheet
+    :param summary: The sheet_summary of the sheet
+    :param legend: The colors of the legend, see legend.LEGEND
+    :return: generator of (row number, list of the values of the columns, flag) tuples
+    """
+    classifier = StyleClassifier(legend)
+    width = len(summary["columns"])
+    max_row = summary["last_row"] if summary["legend_row"] is None else summary["legend_row"] - 1
+    next_row = 2
+    for row_number, cells in sheet_rows(snapshot, min_row=2, max_col=width, max_row=max_row):
+        for empty_row in range(next_row, row_number):
+            yield empty_row, [None] * width, None
+        values = [None] * width
+        for cell in cells:
+            values[cell.column - 1] = cell.value
+        # as in create_dataframe, the colors of the last row with a value are not looked at
+        flag = row_flag(row_number, cells, summary, classifier) if row_number < summary["last_row"] else None
+        yield row_number, values, flag
+        next_row = row_number + 1
+    for empty_row in range(next_row, max_row + 1):
+        yield empty_row, [None] * width, None
+
+
+def excel_value(value):
+    """
+    We convert a cell value the way pandas does when it reads a spreadsheet with openpyxl
+    :param value: The cell value
+    :return: "" for an empty cell, an int for a whole number and the value otherwise
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def dataframe_chunks(rows, columns, chunk_size=1000):
+    """
+    We turn the rows into DataFrames of chunk_size rows, typed by pandas as pd.read_excel would type them and with the
+    flags in the Flag column
+    :param rows: The rows from classified_rows
+    :param columns: The header values, from sheet_summary
+    :param chunk_size: Number of rows per DataFrame
+    :return: generator of DataFrames, indexed by row number - 2 like the DataFrame of the whole sheet
+    """
+    header = [excel_value(value) for value in columns]
+
+    def dataframe(chunk, row_numbers, flags):
+        df = TextParser([header] + chunk, header=0, skip_blank_lines=False).read()
+        df.index = pd.Index(row_numbers) - 2
+        # integer columns are read as floats when the sheet has empty cells in them, which all but a few chunks do
+        for name in df.columns[df.dtypes.apply(lambda dtype: dtype.kind in "iu").to_numpy()]:
+            df[name] = df[name].astype(float)
+        # empty cells are read as NaN
+        df["Flag"] = pd.Series([float("nan") if flag is None else flag for flag in flags], index=df.index,
+                               dtype=object)
+        return df
+
+    chunk, row_numbers, flags = [], [], []
+    for row_number, values, flag in rows:
+        chunk.append([excel_value(value) for value in values])
+        row_numbers.append(row_number)
+        flags.append(flag)
+        if len(chunk) == chunk_size:
+            yield dataframe(chunk, row_numbers, flags)
+            chunk, row_numbers, flags = [], [], []
+    if chunk:
+        yield dataframe(chunk, row_numbers, flags)
+
+
+def publication_chunks(frames):
+    """
+    We move the rows of the last publication of every DataFrame to the next one, so that the proposals on the rows
+    below a publication are in the same DataFrame as the publication
+    :param frames: The DataFrames from dataframe_chunks
+    :return: generator of DataFrames with whole publications
+    """
+    carried = None
+    for df in frames:
+        if carried is not None:
+            df = pd.concat([carried, df])
+        is_publication, _ = publication_rows(df)
+        starts = np.flatnonzero(is_publication.to_numpy())
+        if len(starts) == 0:
+            carried = df
+            continue
+        if starts[-1] > 0:
+            yield df.iloc[:starts[-1]]
+        carried = df.iloc[starts[-1]:]
+    if carried is not None and len(carried):
+        yield carried
+
+
+def record_stream(frames, fetch_information=prefetch_proposal_information, lookahead=0):
+    """
+    We create the publication records of every DataFrame, with the SDB information of its proposals. With a lookahead,
+    the SDB information of the next DataFrames is fetched in a background thread while the records of the current
+    one are used, and the records are still delivered in the order of the sheet. A SpreadsheetValidationError with the
+    problems of all the DataFrames is raised after the last one if any of them has problems.
+    :param frames: The DataFrames from publication_chunks
+    :param fetch_information: The function fetching the SDB information for proposal codes
+    :param lookahead: Number of DataFrames whose SDB information is fetched ahead
+    :return: generator of (publication, SDB information) tuples
+    """
+    def fetch(df):
+        return fetch_information(fixing_bad_column_return_none(code) for code in df["Proposal code(s)"])
+
+    # every DataFrame is validated before its SDB information is fetched. Once one of them has problems, the others are
+    # only validated, and the problems of the whole sheet are raised together at the end, so that the transaction the
+    # records are inserted in is rolled back
+    problems = []
+
+    if lookahead <= 0:
+        for df in frames:
+            problems.extend(validate_spreadsheet(df))
+            if problems:
+                continue
+            proposal_information = fetch(df)
+            for record in publication_records(df, proposal_information):
+                yield record, proposal_information
+        if problems:
+            raise SpreadsheetValidationError(problems)
+        return
+
+    # one fetch at a time, so that the SDB queries in flight are the ones of fetch_information
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = deque()
+        for df in frames:
+            problems.extend(validate_spreadsheet(df))
+            if problems:
+                pending.clear()
+                continue
+            pending.append((df, executor.submit(fetch, df)))
+            while len(pending) > lookahead:
+                df, future = pending.popleft()
+                proposal_information = future.result()
+                for record in publication_records(df, proposal_information):
+                    yield record, proposal_information
+        if problems:
+            raise SpreadsheetValidationError(problems)
+        while pending:
+            df, future = pending.popleft()
+            proposal_information = future.result()
+            for record in publication_records(df, proposal_information):
+                yield record, proposal_information
+
+
+def record_batches(records, batch_size=100):
+    """
+    We collect the publication records into batches
+    :param records: The (publication, SDB information) tuples from record_stream
+    :param batch_size: Number of publications per batch
+    :return: generator of (list of publications, SDB information of their proposals) tuples
+    """
+    batch = []
+    proposal_information = {}
+    last_information = None
+    for record, information in records:
+        batch.append(record)
+        if information is not last_information:
+            proposal_information.update(information)
+            last_information = information
+        if len(batch) == batch_size:
+            yield batch, proposal_information
+            batch = []
+            proposal_information = dict(information)
+    if batch:
+        yield batch, proposal_information
+
+
+def publication_batches(snapshot, batch_size=100, chunk_size=1000, legend=LEGEND,
+                        fetch_information=prefetch_proposal_information, lookahead=0):
+    """
+    We stream the publications of a spreadsheet in batches. They are the same publications as read_spreadsheet reads
+    after create_dataframe, except that columns to the right of the header are ignored. The sheet is read twice, first
+    by sheet_summary and then row by row, and the first batch is ready as soon as its rows have been read. For the
+    memory not to grow with the sheet, the snapshot should use the stream engine.
+    :param snapshot: The spreadsheet
+    :param batch_size: Number of publications per batch
+    :param chunk_size: Number of rows of the sheet handled at a time
+    :param legend: The colors of the legend, see legend.LEGEND
+    :param fetch_information: The function fetching the SDB information for proposal codes
+    :param lookahead: Number of chunks whose SDB information is fetched while the publications before them are used
+    :return: generator of (list of publications, SDB information of their proposals) tuples
+    """
+    summary = sheet_summary(snapshot, legend)
+    rows = classified_rows(snapshot, summary, legend)
+    frames = publication_chunks(dataframe_chunks(rows, summary["columns"], chunk_size))
+    return record_batches(record_stream(frames, fetch_information, lookahead), batch_size)
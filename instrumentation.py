@@ -0,0 +1,379 @@
+import bisect
+import functools
+import heapq
+import json
+import os
+import re
+import threading
+import time
+
+# The upper bounds in seconds of the buckets of the histograms of the query round trips
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# The recorder of the current run, None when the instrumentation is disabled. Everything instrumented checks it
+# first, so that the instrumentation costs a global lookup when it is disabled.
+_recorder = None
+
+# the operation (such as DatabaseInsertion.insert_publication) each thread is in, which its queries are counted for
+_local = threading.local()
+
+
+class RunRecorder:
+    """
+    The measurements of an import: the wall and CPU time of its stages, the calls, queries, rows and query time of
+    every operation (the insert methods of DatabaseInsertion and the SDB helpers), a histogram of the query round
+    trips for each database and the slowest statements. Stages can be nested, and the time of a stage includes the
+    stages inside it. The CPU time is the CPU time of the whole process, including any worker threads.
+    Parameters
+    ----------
+    slowest : int
+        Number of slowest statements kept.
+    buckets : list of float
+        The upper bounds in seconds of the latency histogram buckets.
+    """
+
+    def __init__(self, slowest: int = 10, buckets=None) -> None:
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._slowest_count = slowest
+        self._buckets = list(LATENCY_BUCKETS if buckets is None else buckets)
+        self._stages = {}
+        self._operations = {}
+        self._latency = {}
+        # (seconds, sequence number, statement, operation, database), the fastest first
+        self._slowest = []
+        self._sequence = 0
+
+    def record_stage(self, name: str, wall: float, cpu: float) -> None:
+        """
+        Record a run of a stage.
+        :param name: Name of the stage
+        :param wall: Wall time in seconds
+        :param cpu: CPU time of the process in seconds
+        :return:
+        """
+
+        with self._lock:
+            measured = self._stages.setdefault(name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0})
+            measured["calls"] += 1
+            measured["wall_seconds"] += wall
+            measured["cpu_seconds"] += cpu
+
+    def record_call(self, operation: str, seconds: float) -> None:
+        """
+        Record a call of an operation.
+        :param operation: Name of the operation
+        :param seconds: Wall time of the call in seconds, including its queries
+        :return:
+        """
+
+        with self._lock:
+            measured = self._operation(operation)
+            measured["calls"] += 1
+            measured["seconds"] += seconds
+
+    def record_query(self, database: str, operation: str, statement: str, seconds: float, rows: int) -> None:
+        """
+        Record a query.
+        :param database: Name of the database it ran on
+        :param operation: Name of the operation it ran for, None if it wasn't run by an operation
+        :param statement: The statement, without its parameters
+        :param seconds: Round trip time in seconds
+        :param rows: Number of rows returned or affected, as given by the cursor
+        :return:
+        """
+
+        operation = operation or "other"
+        with self._lock:
+            measured = self._operation(operation)
+            measured["queries"] += 1
+            measured["rows"] += max(rows or 0, 0)
+            measured["query_seconds"] += seconds
+
+            latency = self._latency.setdefault(database, {"counts": [0] * (len(self._buckets) + 1), "sum": 0.0})
+            latency["counts"][bisect.bisect_left(self._buckets, seconds)] += 1
+            latency["sum"] += seconds
+
+            self._sequence += 1
+            if len(self._slowest) < self._slowest_count or seconds > self._slowest[0][0]:
+                entry = (seconds, self._sequence, statement, operation, database)
+                if len(self._slowest) < self._slowest_count:
+                    heapq.heappush(self._slowest, entry)
+                else:
+                    heapq.heapreplace(self._slowest, entry)
+
+    def _operation(self, operation):
+        return self._operations.setdefault(operation, {"calls": 0, "seconds": 0.0, "queries": 0, "rows": 0,
+                                                       "query_seconds": 0.0})
+
+    def report(self) -> dict:
+        """
+        The measurements as a dictionary which can be written as JSON.
+        Returns
+        -------
+        dict
+            The stages, operations, latency histograms and slowest statements.
+        """
+
+        with self._lock:
+            latency = {}
+            for database, measured in self._latency.items():
+                bounds = [str(bound) for bound in self._buckets] + ["+Inf"]
+                latency[database] = {"buckets": dict(zip(bounds, measured["counts"])),
+                                     "count": sum(measured["counts"]), "sum_seconds": round(measured["sum"], 6)}
+            return {
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self._started)),
+                "seconds": round(time.time() - self._started, 3),
+                "stages": {name: {key: round(value, 6) for key, value in measured.items()}
+                           for name, measured in self._stages.items()},
+                "operations": {name: {key: round(value, 6) for key, value in measured.items()}
+                               for name, measured in sorted(self._operations.items())},
+                "latency": latency,
+                "slowest": [{"seconds": round(seconds, 6), "statement": statement, "operation": operation,
+                             "database": database}
+                            for seconds, _, statement, operation, database in sorted(self._slowest, reverse=True)],
+            }
+
+    def prometheus(self, prefix: str = "salt_import") -> str:
+        """
+        The measurements in the Prometheus text format, for the textfile collector of the node exporter.
+        :param prefix: Prefix of the metric names
+        :return: The metrics
+        """
+
+        report = self.report()
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append("# HELP {}_{} {}".format(prefix, name, description))
+            lines.append("# TYPE {}_{} {}".format(prefix, name, kind))
+            for labels, value in samples:
+                label_text = ",".join('{}="{}"'.format(key, _escape_label(value)) for key, value in labels)
+                lines.append("{}_{}{} {}".format(prefix, name, "{" + label_text + "}" if label_text else "", value))
+
+        metric("last_run_timestamp_seconds", "gauge", "Time the last import started.", [((), self._started)])
+        metric("run_seconds", "gauge", "Wall time of the last import.", [((), report["seconds"])])
+        for key, description in [("wall_seconds", "Wall time"), ("cpu_seconds", "CPU time of the process"),
+                                 ("calls", "Number of runs")]:
+            metric("stage_" + key, "gauge", "{} of the stages of the last import.".format(description),
+                   [((("stage", name),), measured[key]) for name, measured in report["stages"].items()])
+        for key, description in [("calls", "Number of calls"), ("queries", "Number of queries"),
+                                 ("rows", "Number of rows returned or affected"),
+                                 ("query_seconds", "Time spent in queries")]:
+            metric("operation_" + key, "gauge", "{} of the operations of the last import.".format(description),
+                   [((("operation", name),), measured[key]) for name, measured in report["operations"].items()])
+
+        name = "{}_query_duration_seconds".format(prefix)
+        lines.append("# HELP {} Round trip time of the queries of the last import.".format(name))
+        lines.append("# TYPE {} histogram".format(name))
+        for database, measured in report["latency"].items():
+            cumulative = 0
+            for bound, count in measured["buckets"].items():
+                cumulative += count
+                lines.append('{}_bucket{{database="{}",le="{}"}} {}'.format(name, _escape_label(database), bound,
+                                                                          cumulative))
+            lines.append('{}_sum{{database="{}"}} {}'.format(name, _escape_label(database), measured["sum_seconds"]))
+            lines.append('{}_count{{database="{}"}} {}'.format(name, _escape_label(database), measured["count"]))
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def enable(recorder: RunRecorder = None) -> RunRecorder:
+    """
+    Start recording the measurements of a run.
+    :param recorder: The recorder to record them with, a new one if None
+    :return: The recorder
+    """
+    global _recorder
+    _recorder = RunRecorder() if recorder is None else recorder
+    return _recorder
+
+
+def disable():
+    """
+    Stop recording measurements.
+    :return: The recorder which recorded them, None if they weren't being recorded
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    return recorder
+
+
+def recorder():
+    """
+    The recorder of the current run
+    :return: The recorder, None if the instrumentation is disabled
+    """
+    return _recorder
+
+
+class _Stage:
+    __slots__ = ("_name", "_recorder", "_wall", "_cpu")
+
+    def __init__(self, name):
+        self._name = name
+
+    def __enter__(self):
+        self._recorder = _recorder
+        if self._recorder is not None:
+            self._wall = time.perf_counter()
+            self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        if self._recorder is not None:
+            self._recorder.record_stage(self._name, time.perf_counter() - self._wall, time.process_time() - self._cpu)
+        return False
+
+
+def stage(name):
+    """
+    A with block timed as a stage of the import
+    :param name: Name of the stage
+    :return: The context manager
+    """
+    return _Stage(name)
+
+
+def staged(name):
+    """
+    A decorator timing every call of a function as a stage of the import
+    :param name: Name of the stage
+    :return: The decorator
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return function(*args, **kwargs)
+            with _Stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def operation(name=None):
+    """
+    A decorator counting the calls of a function and the queries run while it is called. Queries run by an operation
+    called by another one are counted for the inner one.
+    :param name: Name of the operation, the qualified name of the function if None
+    :return: The decorator
+    """
+    def decorate(function):
+        label = function.__qualname__ if name is None else name
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            recorder = _recorder
+            if recorder is None:
+                return function(*args, **kwargs)
+            outer = getattr(_local, "operation", None)
+            _local.operation = label
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _local.operation = outer
+                recorder.record_call(label, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+class InstrumentedCursor:
+    """
+    A cursor which records the round trip of every statement it runs, for the operation the thread is in.
+    Parameters
+    ----------
+    cursor : Cursor
+        The MySQLdb cursor.
+    database : str
+        Name of the database the cursor runs its statements on.
+    recorder : RunRecorder
+        The recorder of the run.
+    """
+
+    def __init__(self, cursor, database: str, recorder: RunRecorder) -> None:
+        self._cursor = cursor
+        self._database = database
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def _timed(self, method, query, args):
+        start = time.perf_counter()
+        try:
+            return method(query, args)
+        finally:
+            self._recorder.record_query(self._database, getattr(_local, "operation", None), statement_text(query),
+                                        time.perf_counter() - start, self._cursor.rowcount)
+
+    def execute(self, query, args=None):
+        return self._timed(self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        return self._timed(self._cursor.executemany, query, args)
+
+
+def instrumented_cursor(cursor, database):
+    """
+    The cursor, wrapped so that its statements are recorded if the instrumentation is enabled
+    :param cursor: The MySQLdb cursor
+    :param database: Name of the database of the cursor
+    :return: The cursor, or an InstrumentedCursor wrapping it
+    """
+    recorder = _recorder
+    if recorder is None:
+        return cursor
+    return InstrumentedCursor(cursor, database, recorder)
+
+
+def statement_text(query, length=200):
+    """
+    A statement on a single line and cut to a length, for the report. The parameters are not part of it.
+    :param query: The statement
+    :param length: Maximum length
+    :return: The statement text
+    """
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    text = re.sub(r"\s+", " ", str(query)).strip()
+    return text if len(text) <= length else text[:length - 3] + "..."
+
+
+def write_report(path, recorder: RunRecorder) -> None:
+    """
+    Write the measurements of a run as JSON.
+    :param path: Path of the JSON file
+    :param recorder: The recorder of the run
+    :return:
+    """
+    with open(path, "w") as f:
+        json.dump(recorder.report(), f, indent=2)
+
+
+def write_prometheus(path, recorder: RunRecorder) -> None:
+    """
+    Write the measurements of a run in the Prometheus text format. The file is written next to its final path and
+    then renamed, so that the node exporter never reads half a file.
+    :param path: Path of the file, which should end in .prom for the textfile collector
+    :param recorder: The recorder of the run
+    :return:
+    """
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "w") as f:
+        f.write(recorder.prometheus())
+    os.replace(temporary, path)
@@ -0,0 +1,66 @@
+# The categories of the legend of the spreadsheet. A cell can be in more than one category (such as a grey font on
+# a yellow background), so a classification is the sum of the categories of the cell.
+NONE = 0
+GREY = 1
+VIOLET = 2
+GREEN = 4
+BROWN = 8
+YELLOW = 16
+RED = 32
+
+# The rgb colors (as openpyxl gives them) of the font and fill of each category of the legend
+LEGEND = {
+    GREY: {"font": ["FFB7B7B7", "FF999999"]},
+    VIOLET: {"font": ["FFA64D79"]},
+    GREEN: {"font": ["FF6AA84F"]},
+    BROWN: {"font": ["FFB45F06", "FF783F04"]},
+    # yellow background indicating missing information
+    YELLOW: {"fill": ["FFFFF2CC"]},
+    RED: {"font": ["FFFF0000"]},
+}
+
+
+class StyleClassifier:
+    """
+    The legend categories of the cells of a workbook. A workbook only has a few dozen distinct styles, so the colors
+    of a style are checked against the legend the first time the style is seen and every other cell with the style is
+    classified by looking up its style id.
+    Parameters
+    ----------
+    legend : dict
+        The font and fill rgb colors of each category, such as LEGEND.
+    """
+
+    def __init__(self, legend: dict = None) -> None:
+        self._font_categories = {}
+        self._fill_categories = {}
+        for category, colors in (LEGEND if legend is None else legend).items():
+            for rgb in colors.get("font", []):
+                self._font_categories[rgb] = self._font_categories.get(rgb, NONE) | category
+            for rgb in colors.get("fill", []):
+                self._fill_categories[rgb] = self._fill_categories.get(rgb, NONE) | category
+        self._style_categories = {}
+
+    def colors(self, font_rgb, fill_rgb) -> int:
+        """
+        The categories of a font and fill color.
+        :param font_rgb: The rgb color of the font
+        :param fill_rgb: The rgb color of the fill
+        :return: The categories, NONE if the colors are not in the legend
+        """
+
+        return self._font_categories.get(font_rgb, NONE) | self._fill_categories.get(fill_rgb, NONE)
+
+    def classify(self, cell) -> int:
+        """
+        The categories of a cell.
+        :param cell: A StyledCell
+        :return: The categories, NONE if the colors of the cell are not in the legend
+        """
+
+        if cell.style_id is None:
+            return self.colors(cell.font_rgb, cell.fill_rgb)
+        categories = self._style_categories.get(cell.style_id)
+        if categories is None:
+            categories = self._style_categories[cell.style_id] = self.colors(cell.font_rgb, cell.fill_rgb)
+        return categories
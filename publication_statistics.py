@@ -0,0 +1,249 @@
+import argparse
+import json
+import sys
+from database_configuration import DatabaseConfiguration, salt_statistics_db_config
+from instrumentation import staged
+from storage_backends import MySQLBackend, StorageBackend, storage_backend
+
+# The summary tables, which are aggregated from the fact tables by the statements below. The tables keyed by year are
+# refreshed for the years of publication, the ones keyed by semester for the semesters of the proposals.
+YEAR_STATISTICS = ["PartnerStatistics", "ScienceCategoryStatistics"]
+SEMESTER_STATISTICS = ["InstrumentModeStatistics", "ProposalStatistics"]
+STATISTICS_TABLES = YEAR_STATISTICS + SEMESTER_STATISTICS
+
+# The statements aggregating the summary tables. {year} stands for the year of the publication date, which every
+# database writes differently, {years} and {semesters} for the condition on the years and semesters refreshed.
+AGGREGATE_STATEMENTS = {
+    # publications per partner of the authors, with how many of them have a first author or other authors from it
+    "PartnerStatistics": """
+    INSERT INTO PartnerStatistics(Year, Partner, Publications, FirstAuthorPublications, OtherAuthorsPublications)
+    SELECT {year}, pa.Name, COUNT(DISTINCT p.Publication_Id),
+           SUM(CASE WHEN pp.FirstAuthorBelonging THEN 1 ELSE 0 END),
+           SUM(CASE WHEN pp.OtherAuthorsBelonging THEN 1 ELSE 0 END)
+    FROM Publication p
+        JOIN PublicationPartner pp ON pp.Publication_Id = p.Publication_Id
+        LEFT JOIN Partner pa ON pa.Partner_Id = pp.Partner_Id
+    WHERE {years}
+    GROUP BY {year}, pa.Name
+    """,
+    # publications per science category
+    "ScienceCategoryStatistics": """
+    INSERT INTO ScienceCategoryStatistics(Year, ScienceCategory, Publications)
+    SELECT {year}, c.ScienceCategory, COUNT(*)
+    FROM Publication p
+        LEFT JOIN ScienceSubject s ON s.ScienceSubject_Id = p.ScienceSubject_Id
+        LEFT JOIN ScienceCategory c ON c.ScienceCategory_Id = s.ScienceCategory_Id
+    WHERE {years}
+    GROUP BY {year}, c.ScienceCategory
+    """,
+    # the proposals which used an instrument mode in a semester and their SALT time, counting a proposal once however
+    # many publications it has
+    "InstrumentModeStatistics": """
+    INSERT INTO InstrumentModeStatistics(Year, Semester, Instrument, InstrumentMode, Proposals, TotalSALTTime)
+    SELECT s.Year, s.Semester, i.Instrument, m.Mode, COUNT(*), SUM(u.TotalSALTTime)
+    FROM (SELECT Semester_Id, InstrumentMode_Id, Proposal_Id, MAX(TotalSALTTime) AS TotalSALTTime
+          FROM ProposalInstrumentUse
+          WHERE Proposal_Id IS NOT NULL AND Semester_Id IN (SELECT Semester_Id FROM Semester s WHERE {semesters})
+          GROUP BY Semester_Id, InstrumentMode_Id, Proposal_Id) u
+        JOIN Semester s ON s.Semester_Id = u.Semester_Id
+        LEFT JOIN InstrumentMode m ON m.InstrumentMode_Id = u.InstrumentMode_Id
+        LEFT JOIN Instrument i ON i.Instrument_Id = m.Instrument_Id
+    GROUP BY s.Year, s.Semester, i.Instrument, m.Mode
+    """,
+    # the proposals with publications of a semester, how many of them are target of opportunity proposals and their
+    # student projects
+    "ProposalStatistics": """
+    INSERT INTO ProposalStatistics(Year, Semester, Proposals, TargetOfOpportunityProposals, MScProjects, PhDProjects)
+    SELECT s.Year, s.Semester, COUNT(*), SUM(CASE WHEN p.TargetOfOpportunity THEN 1 ELSE 0 END),
+           SUM(COALESCE(sp.MSc_Projects, 0)), SUM(COALESCE(sp.PhD_Projects, 0))
+    FROM (SELECT DISTINCT Semester_Id, Proposal_Id
+          FROM ProposalInstrumentUse
+          WHERE Proposal_Id IS NOT NULL AND Semester_Id IN (SELECT Semester_Id FROM Semester s WHERE {semesters})) u
+        JOIN Semester s ON s.Semester_Id = u.Semester_Id
+        JOIN Proposal p ON p.Proposal_Id = u.Proposal_Id
+        LEFT JOIN StudentProjects sp ON sp.Proposal_Id = u.Proposal_Id
+    GROUP BY s.Year, s.Semester
+    """,
+}
+
+
+def year_condition(expression, years):
+    """
+    We write the condition that a year is one of the given ones
+    :param expression: The SQL expression of the year
+    :param years: The years, or None for any year
+    :return: The condition and its parameters
+    """
+    if years is None:
+        return "{} IS NOT NULL".format(expression), []
+    years = sorted(years)
+    return "{} IN ({})".format(expression, ", ".join(["%s"] * len(years))), years
+
+
+def semester_condition(alias, semesters):
+    """
+    We write the condition that the semester of the Semester table is one of the given ones
+    :param alias: The alias of the Semester table, or the name of a table with Year and Semester columns
+    :param semesters: The (year, semester) tuples, or None for any semester
+    :return: The condition and its parameters
+    """
+    if semesters is None:
+        return "{}.Year IS NOT NULL".format(alias), []
+    semesters = sorted(semesters)
+    condition = " OR ".join("({0}.Year = %s AND {0}.Semester = %s)".format(alias) for _ in semesters)
+    return "({})".format(condition), [value for semester in semesters for value in semester]
+
+
+@staged("statistics")
+def refresh_statistics(connection, backend: StorageBackend, years=None, semesters=None):
+    """
+    We aggregate the summary tables again for some years of publication and semesters of proposals, from the fact
+    tables. All the rows of such a year or semester are replaced, as a publication counted in a group can't be taken
+    out of it on its own. This does not commit.
+    :param connection: The connection to the salt_stats database
+    :param backend: The backend of the database
+    :param years: The years of publication refreshed, all of them if None
+    :param semesters: The (year, semester) tuples refreshed, all of them if None
+    :return:
+    """
+    with connection.cursor() as cur:
+        # an empty set of years or semesters has nothing to refresh
+        if years is None or years:
+            year = backend.year_sql("p.PublicationDate")
+            condition, parameters = year_condition(year, years)
+            for table in YEAR_STATISTICS:
+                cur.execute("DELETE FROM {} WHERE {}".format(table, year_condition("Year", years)[0]), parameters)
+                cur.execute(AGGREGATE_STATEMENTS[table].format(year=year, years=condition), parameters)
+        if semesters is None or semesters:
+            condition, parameters = semester_condition("s", semesters)
+            for table in SEMESTER_STATISTICS:
+                cur.execute("DELETE FROM {} WHERE {}".format(table, semester_condition(table, semesters)[0]),
+                            parameters)
+                cur.execute(AGGREGATE_STATEMENTS[table].format(semesters=condition), parameters)
+
+
+class PublicationStatistics:
+    """
+    The reports, read from the summary tables. Every method returns a list of dicts, one for each row, ordered by
+    year (and semester).
+    Parameters
+    ----------
+    database_config : DatabaseConfiguration
+        The configuration of the MySQL database, if no backend is given.
+    backend : StorageBackend
+        The database the summary tables are read from.
+    """
+
+    def __init__(self, database_config: DatabaseConfiguration = None, backend: StorageBackend = None) -> None:
+        if backend is None:
+            if database_config is None:
+                raise ValueError("Either a database configuration or a storage backend is needed")
+            backend = MySQLBackend(database_config)
+        self._backend = backend
+        self._connection = backend.connect()
+
+    def close(self) -> None:
+        """
+        Give the connection back.
+        :return:
+        """
+
+        self._connection.close()
+
+    def _rows(self, table, columns, order, years):
+        condition, parameters = year_condition("Year", years)
+        sql = "SELECT {} FROM {} WHERE {} ORDER BY {}".format(", ".join(columns), table, condition, ", ".join(order))
+        with self._connection.cursor() as cur:
+            cur.execute(sql, parameters)
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+    def refresh(self) -> None:
+        """
+        Aggregate all the summary tables from scratch, and commit.
+        :return:
+        """
+
+        try:
+            refresh_statistics(self._connection, self._backend)
+            self._connection.commit()
+        except BaseException:
+            self._connection.rollback()
+            raise
+
+    def publications_per_partner(self, years=None) -> list:
+        """
+        The publications per year and partner of the authors.
+        :param years: The years of publication, all of them if None
+        :return: list of dicts with Year, Partner, Publications, FirstAuthorPublications and OtherAuthorsPublications
+        """
+
+        return self._rows("PartnerStatistics", ["Year", "Partner", "Publications", "FirstAuthorPublications",
+                                                "OtherAuthorsPublications"], ["Year", "Partner"], years)
+
+    def publications_per_science_category(self, years=None) -> list:
+        """
+        The publications per year and science category.
+        :param years: The years of publication, all of them if None
+        :return: list of dicts with Year, ScienceCategory and Publications
+        """
+
+        return self._rows("ScienceCategoryStatistics", ["Year", "ScienceCategory", "Publications"],
+                          ["Year", "ScienceCategory"], years)
+
+    def salt_time_per_instrument_mode(self, years=None) -> list:
+        """
+        The proposals with publications which used an instrument mode, and their SALT time, per semester.
+        :param years: The years of the semesters, all of them if None
+        :return: list of dicts with Year, Semester, Instrument, InstrumentMode, Proposals and TotalSALTTime
+        """
+
+        return self._rows("InstrumentModeStatistics", ["Year", "Semester", "Instrument", "InstrumentMode",
+                                                       "Proposals", "TotalSALTTime"],
+                          ["Year", "Semester", "Instrument", "InstrumentMode"], years)
+
+    def proposal_statistics(self, years=None) -> list:
+        """
+        The proposals with publications per semester, with their student projects and the share of target of
+        opportunity proposals.
+        :param years: The years of the semesters, all of them if None
+        :return: list of dicts with Year, Semester, Proposals, TargetOfOpportunityProposals,
+        TargetOfOpportunityShare, MScProjects and PhDProjects
+        """
+
+        rows = self._rows("ProposalStatistics", ["Year", "Semester", "Proposals", "TargetOfOpportunityProposals",
+                                                 "MScProjects", "PhDProjects"], ["Year", "Semester"], years)
+        for row in rows:
+            proposals = row["Proposals"]
+            row["TargetOfOpportunityShare"] = row["TargetOfOpportunityProposals"] / proposals if proposals else None
+        return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the publication statistics of the salt_stats database as "
+                                                 "JSON.")
+    parser.add_argument("--database", default="mysql",
+                        help="mysql for the database configured in the environment, or sqlite:<path> or "
+                             "duckdb:<path> for a local database file")
+    parser.add_argument("--years", type=int, nargs="+", help="only these years")
+    parser.add_argument("--refresh", action="store_true",
+                        help="aggregate all the summary tables from scratch first")
+    args = parser.parse_args(argv)
+
+    statistics = PublicationStatistics(backend=storage_backend(args.database, salt_statistics_db_config()))
+    try:
+        if args.refresh:
+            statistics.refresh()
+        report = {
+            "publications_per_partner": statistics.publications_per_partner(args.years),
+            "publications_per_science_category": statistics.publications_per_science_category(args.years),
+            "salt_time_per_instrument_mode": statistics.salt_time_per_instrument_mode(args.years),
+            "proposal_statistics": statistics.proposal_statistics(args.years),
+        }
+    finally:
+        statistics.close()
+    print(json.dumps(report, indent=2, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,445 @@
+import argparse
+import functools
+import hashlib
+import json
+import sys
+from database_configuration import salt_statistics_db_config
+from database_insertion import DIMENSION_COLUMNS, DatabaseInsertion
+from import_pipeline import publication_batches
+from instrumentation import disable, enable, stage, write_prometheus, write_report
+from reading_spreadsheet import create_dataframe, find_proposal_semester, fixing_bad_column_return_none, \
+    publication_information, publication_issues, read_spreadsheet, without_legend
+from sdb_queries import prefetch_proposal_information
+from spreadsheet_cache import DEFAULT_CACHE_DIRECTORY, SpreadsheetCache
+from spreadsheet_snapshot import ENGINES, SpreadsheetSnapshot
+from spreadsheet_validation import check_spreadsheet, validate_spreadsheet
+from staging_load import StagingLoader
+from storage_backends import MySQLBackend, storage_backend
+
+
+def insert_type_of_publication(salt_stats):
+    publication_types = ["data", "science", 'instrument', "no", "non-ref"]
+    for publication in publication_types:
+        salt_stats.insert_publication_type(publication)
+
+
+def insert_position_of_first_author(salt_stats):
+    positions = ["Staff", "SA", "PhD student", "MSc student", "SALT Chairman", "Collaboration",
+                 "student", "Head SALT Ops"]
+    for position in positions:
+        salt_stats.insert_first_author_position(position)
+
+
+def publication_dimensions(values, proposal_information):
+    """
+    We list the rows of the dimension tables which a publication read by read_spreadsheet refers to
+    :param values: The publication
+    :param proposal_information: The SDB information fetched by prefetch_proposal_information
+    :return: list of (table, row) tuples, with the rows as DatabaseInsertion.upsert_dimension takes them
+    """
+    paper = publication_information(values["Publication Paper"])
+    first_proposal = publication_information(values["Proposal code(s)"])
+    rows = []
+
+    if values["Name"]:
+        rows.append(("FirstAuthor", (values["Name"], values["Position of 1st author"])))
+
+    if paper["Type of Science"]:
+        rows.append(("ScienceCategory", (paper["Type of Science"],)))
+        rows.append(("ScienceSubject", (paper["Science subject"], paper["Science explanation"],
+                                        paper["Type of Science"])))
+
+    if values["Partnership of 1st author"]:
+        rows.append(("Partner", (values["Partnership of 1st author"],)))
+
+    for value in values["Proposal code(s)"]:
+        if not value["Proposal code"]:
+            continue
+        information = proposal_information[value["Proposal code"]]
+        # proposals which the SDB doesn't know are skipped
+        if information["PI"] is not None and information["institutes"] is not None:
+            rows.append(("Proposal", (value["Proposal code"], information["PI"],
+                                      information["target of opportunity"], information["institutes"])))
+        if value["Instrument(s)"]:
+            rows.append(("Instrument", (value["Instrument(s)"],)))
+            if value["Instrument mode(s)"]:
+                rows.append(("InstrumentMode", (value["Instrument mode(s)"], value["Instrument(s)"])))
+        if value["proposal semester"]:
+            proposal_semester = find_proposal_semester(value["proposal semester"], value["Proposal code"],
+                                                       proposal_information)
+            rows.append(("Semester", (proposal_semester.get("year"), proposal_semester.get("semester"))))
+        rows.append(("IssuesForProposals", (value["proposal issue"],)))
+
+    rows.append(("IssuesForPublications", (publication_issues(first_proposal["Flag"]),)))
+    return rows
+
+
+def insert_dimensions(salt_stats, records, proposal_information):
+    """
+    We insert the distinct rows of the dimension tables (first authors, science categories and subjects, partners,
+    proposals, instruments, instrument modes, semesters and issues) of the publications read by read_spreadsheet,
+    with one bulk upsert per table, so that inserting the publications only has to look up ids
+    :param salt_stats: The DatabaseInsertion for the salt_stats database
+    :param records: The publications
+    :param proposal_information: The SDB information fetched by prefetch_proposal_information
+    :return: dict of table to its natural key to id dictionary
+    """
+    rows = {}
+    for values in records:
+        for table, row in publication_dimensions(values, proposal_information):
+            rows.setdefault(table, []).append(row)
+    return {table: salt_stats.upsert_dimension(table, rows.get(table, [])) for table in DIMENSION_COLUMNS}
+
+
+def insert_publication_record(salt_stats, values, proposal_information, dimensions=True):
+    """
+    We insert a publication read by read_spreadsheet, with its proposals, into the salt_stats database
+    :param salt_stats: The DatabaseInsertion for the salt_stats database
+    :param values: The publication
+    :param proposal_information: The SDB information fetched by prefetch_proposal_information
+    :param dimensions: Whether the rows of the dimension tables are inserted too, False if insert_dimensions has
+    already inserted them
+    :return:
+    """
+    paper = publication_information(values["Publication Paper"])
+    first_proposal = publication_information(values["Proposal code(s)"])
+
+    if dimensions:
+        insert_dimensions(salt_stats, [values], proposal_information)
+
+    # insert into Publication table
+    salt_stats.insert_publication(values["Name"],
+                                  paper["Publication date"],
+                                  values["ADS link"],
+                                  paper["Science subject"],
+                                  paper["Type of paper"],
+                                  paper["Full author list"],
+                                  paper["No of SA"],
+                                  paper["Comments"]
+                                  )
+
+    # insert publication partner and institute of the 1st author
+    if values["Partnership of 1st author"]:
+        salt_stats.insert_publication_partner(paper["Publication date"],
+                                              values["Name"],
+                                              values["ADS link"],
+                                              values["Partnership of 1st author"],
+                                              paper["First Author Belonging"],
+                                              paper["Other Author Belonging"],
+                                              )
+        # insert publication institute
+        if values["Institute of 1st author"]:
+            salt_stats.insert_publication_institute(paper["Publication date"],
+                                                    values["Institute of 1st author"],
+                                                    values["Name"],
+                                                    values["ADS link"],
+                                                    paper["First Author Belonging"],
+                                                    paper["Other Author Belonging"])
+
+    # insert student projects
+    for value in values["Proposal code(s)"]:
+        if value["Proposal code"]:
+            salt_stats.insert_student_project(value["Proposal code"],
+                                              value["master's student"],
+                                              value["phd student"]
+                                              )
+
+    # insert time allocating partner
+    for value in values["Proposal code(s)"]:
+        if value["Proposal code"] and value["Partner(time allocated)"]:
+            salt_stats.insert_time_allocating_partner(value["Proposal code"], value["Partner(time allocated)"])
+
+    # insert proposal instrument use, for every proposal of the publication, or for its first proposal row if none of
+    # them has a proposal code
+    proposals = [value for value in values["Proposal code(s)"] if value["Proposal code"]] or [first_proposal]
+    for value in proposals:
+        proposal_semester = find_proposal_semester(value["proposal semester"], value["Proposal code"],
+                                                   proposal_information)
+        salt_stats.insert_proposal_instrument_use(paper["Publication date"],
+                                                  values["Name"],
+                                                  values["ADS link"],
+                                                  value["Proposal code"],
+                                                  value["Instrument mode(s)"],
+                                                  proposal_semester.get("year"),
+                                                  proposal_semester.get("semester"),
+                                                  value["observation date"],
+                                                  value["Priorities"],
+                                                  value["Total SALT time"],
+                                                  value["Fraction of total time"])
+
+    # Then we insert to the ProposalIssues tables
+    for value in values["Proposal code(s)"]:
+        if value["Proposal code"]:
+            salt_stats.insert_proposal_issues(value["Proposal code"], value["proposal issue"])
+
+    # Then we insert to the PublicationIssues table
+    salt_stats.insert_publication_issues(paper["Publication date"], values["Name"], values["ADS link"],
+                                         paper["publication issue"])
+
+
+def record_fingerprint(values):
+    """
+    We fingerprint a publication read by read_spreadsheet, so that an incremental import can tell whether it has
+    changed since it was last imported
+    :param values: The publication
+    :return: The sha256 hex digest of everything in the record, including its proposal rows
+    """
+    record = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha256(record.encode("utf-8")).hexdigest()
+
+
+def record_keys(records):
+    """
+    We identify the publications read by read_spreadsheet by their first author and ADS link. A publication which
+    appears more than once on the spreadsheet is told apart by how many times it has appeared before.
+    :param records: The publications
+    :return: list of sha256 hex digests, one for each publication
+    """
+    occurrences = {}
+    keys = []
+    for values in records:
+        identity = (values["Name"], values["ADS link"])
+        occurrence = occurrences.get(identity, 0)
+        occurrences[identity] = occurrence + 1
+        key = json.dumps([values["Name"], values["ADS link"], occurrence], default=str)
+        keys.append(hashlib.sha256(key.encode("utf-8")).hexdigest())
+    return keys
+
+
+def import_incrementally(salt_stats, records, proposal_information):
+    """
+    We only insert the publications which are new or have changed since the last incremental import, replacing the
+    changed ones, and delete the publications which are no longer on the spreadsheet
+    :param salt_stats: The DatabaseInsertion for the salt_stats database
+    :param records: The publications read by read_spreadsheet
+    :param proposal_information: The SDB information fetched by prefetch_proposal_information
+    :return: dict with the number of publications inserted, replaced, deleted and unchanged
+    """
+    stored = salt_stats.publication_fingerprints()
+    counts = {"inserted": 0, "replaced": 0, "deleted": 0, "unchanged": 0}
+
+    changed = []
+    unchanged = []
+    for record_key, values in zip(record_keys(records), records):
+        fingerprint = record_fingerprint(values)
+        stored_fingerprint, publication_id = stored.pop(record_key, (None, None))
+        if stored_fingerprint == fingerprint:
+            counts["unchanged"] += 1
+            unchanged.append((record_key, values, fingerprint, stored_fingerprint, publication_id))
+        elif stored_fingerprint is not None:
+            counts["replaced"] += 1
+            changed.append((record_key, values, fingerprint, stored_fingerprint, publication_id))
+        else:
+            counts["inserted"] += 1
+            changed.append((record_key, values, fingerprint, stored_fingerprint, publication_id))
+    # what is left has vanished from the spreadsheet
+    counts["deleted"] = len(stored)
+
+    # an unchanged publication which shares its row in the database with a publication which is replaced or deleted
+    # is imported again, as the row is deleted
+    deleted_ids = {publication_id for _, _, _, stored_fingerprint, publication_id in changed
+                   if stored_fingerprint is not None}
+    deleted_ids.update(publication_id for _, publication_id in stored.values())
+    changed.extend(entry for entry in unchanged if entry[4] is not None and entry[4] in deleted_ids)
+
+    # all the publications are deleted before any is inserted, so that none of the inserted rows refers to a deleted
+    # publication
+    for record_key, _, _, stored_fingerprint, publication_id in changed:
+        if stored_fingerprint is not None:
+            salt_stats.delete_publication(record_key, publication_id)
+    for record_key, (_, publication_id) in stored.items():
+        salt_stats.delete_publication(record_key, publication_id)
+
+    insert_dimensions(salt_stats, [values for _, values, _, _, _ in changed], proposal_information)
+    for record_key, values, fingerprint, _, _ in changed:
+        insert_publication_record(salt_stats, values, proposal_information, dimensions=False)
+        paper = publication_information(values["Publication Paper"])
+        salt_stats.insert_publication_fingerprint(record_key, fingerprint, paper["Publication date"], values["Name"],
+                                                  values["ADS link"])
+
+    return counts
+
+
+def import_batches(salt_stats, batches):
+    """
+    We insert the batches of publications streamed by import_pipeline.publication_batches, each with its own
+    dimension pre-pass, so that the first publications are inserted before the last rows of the spreadsheet are read
+    :param salt_stats: The DatabaseInsertion for the salt_stats database
+    :param batches: The (list of publications, SDB information of their proposals) tuples
+    :return:
+    """
+    for records, proposal_information in batches:
+        insert_dimensions(salt_stats, records, proposal_information)
+        for values in records:
+            insert_publication_record(salt_stats, values, proposal_information, dimensions=False)
+
+
+def flagged_snapshot(path, sheet_name="Sheet1", engine="openpyxl", cache_directory=DEFAULT_CACHE_DIRECTORY):
+    """
+    We parse the spreadsheet and flag its rows with the colors of the legend, unless the cache has the flagged
+    spreadsheet already
+    :param path: Path of the SALT publication statistics xlsx file
+    :param sheet_name: Name of the sheet with the publications
+    :param engine: How the cells and their colors are read, "openpyxl" or "stream"
+    :param cache_directory: Directory of the cache of flagged spreadsheets, the spreadsheet is always parsed if None
+    :return: The SpreadsheetSnapshot, with the Flag column
+    """
+    # an unchanged spreadsheet is not parsed and flagged again
+    cache = SpreadsheetCache(cache_directory) if cache_directory is not None else None
+    snapshot = cache.load(path, sheet_name) if cache is not None else None
+    if snapshot is None:
+        snapshot = SpreadsheetSnapshot(path, sheet_name, engine=engine)
+        spreadsheet = snapshot.dataframe()
+        create_dataframe(snapshot, 1, spreadsheet.shape[-1], spreadsheet.shape[0])
+        if cache is not None:
+            cache.store(path, snapshot.dataframe(), snapshot.flags(), sheet_name)
+    return snapshot
+
+
+def run_import(path, sheet_name="Sheet1", batch_size=1000, engine="openpyxl", cache_directory=DEFAULT_CACHE_DIRECTORY,
+               incremental=False, staging=False, pipeline=False, chunk_size=1000, sdb_workers=1, backend=None):
+    """
+    We import the SALT publication statistics spreadsheet into the salt_stats database. The rows are flagged
+    with the colors of the legend, the SDB information of the proposals is fetched and then every publication is
+    inserted, all in one transaction.
+    :param path: Path of the SALT publication statistics xlsx file
+    :param sheet_name: Name of the sheet with the publications
+    :param batch_size: Number of rows written to the database at a time
+    :param engine: How the cells and their colors are read, "openpyxl" or "stream"
+    :param cache_directory: Directory of the cache of flagged spreadsheets, the spreadsheet is always parsed if None
+    :param incremental: Whether only the publications which have changed since the last incremental import are
+    imported, see import_incrementally
+    :param staging: Whether the publications are loaded through the staging tables, see StagingLoader
+    :param pipeline: Whether the spreadsheet is streamed through import_pipeline, a chunk of rows at a time, rather
+    than read as a whole. The cache is not used then.
+    :param chunk_size: Number of rows of the spreadsheet read at a time by the pipeline
+    :param sdb_workers: Maximum number of queries run against the SDB at the same time
+    :param backend: The StorageBackend the salt_stats tables are written to, the MySQL database of
+    salt_statistics_db_config if None
+    :return: The counts from import_incrementally for an incremental import, otherwise None
+    """
+    if backend is None:
+        backend = MySQLBackend(salt_statistics_db_config())
+    if incremental and staging:
+        raise ValueError("An incremental import can't be loaded through the staging tables")
+    if pipeline and (incremental or staging):
+        raise ValueError("The pipeline can't be used for an incremental import or with the staging tables")
+    if staging and not isinstance(backend, MySQLBackend):
+        raise ValueError("Only a MySQL database has the staging tables")
+
+    if not pipeline:
+        snapshot = flagged_snapshot(path, sheet_name, engine, cache_directory)
+        # every problem on the spreadsheet is reported at once, before anything is fetched or written
+        check_spreadsheet(without_legend(snapshot.dataframe()))
+
+    salt_stats = DatabaseInsertion(backend=backend)
+    try:
+        insert_type_of_publication(salt_stats)
+        insert_position_of_first_author(salt_stats)
+
+        fetch_information = functools.partial(prefetch_proposal_information, max_workers=sdb_workers)
+        if pipeline:
+            # the publications of every batch are inserted as soon as its rows have been read, in one transaction, while
+            # the SDB information of the next chunk is fetched
+            with stage("pipeline"), salt_stats.batch(batch_size=batch_size):
+                import_batches(salt_stats, publication_batches(SpreadsheetSnapshot(path, sheet_name, engine=engine),
+                                                               batch_size=batch_size, chunk_size=chunk_size,
+                                                               fetch_information=fetch_information, lookahead=1))
+                salt_stats.refresh_statistics()
+            return None
+
+        # The SDB information for all the proposal codes on the spreadsheet is fetched up front
+        proposal_information = fetch_information(
+            fixing_bad_column_return_none(code) for code in snapshot.dataframe()["Proposal code(s)"])
+
+        records = read_spreadsheet(snapshot, proposal_information)
+        if staging:
+            StagingLoader(backend.database_config()).load(records, proposal_information, chunk_size=batch_size)
+            # the staging load doesn't tell which publications it wrote
+            salt_stats.refresh_statistics(everything=True)
+            return None
+
+        # Everything is inserted in one transaction, with the rows written in batches, and the summary tables are
+        # refreshed for the publications written in the same transaction
+        counts = None
+        with stage("insert"), salt_stats.batch(batch_size=batch_size):
+            if incremental:
+                counts = import_incrementally(salt_stats, records, proposal_information)
+            else:
+                # the distinct dimension rows are inserted first, the publications then only refer to their ids
+                insert_dimensions(salt_stats, records, proposal_information)
+                for values in records:
+                    insert_publication_record(salt_stats, values, proposal_information, dimensions=False)
+            salt_stats.refresh_statistics()
+        return counts
+    finally:
+        # the connection goes back to the pool, for the next import in this process
+        salt_stats.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import the SALT publication statistics spreadsheet into the "
+                                                 "salt_stats database.")
+    parser.add_argument("path", help="path of the SALT publication statistics xlsx file")
+    parser.add_argument("--sheet", default="Sheet1", help="name of the sheet with the publications")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="number of rows written to the database at a time")
+    parser.add_argument("--engine", choices=ENGINES, default="openpyxl",
+                        help="how the cells and their colors are read; stream reads the sheet XML without loading "
+                             "the whole workbook")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIRECTORY,
+                        help="directory of the cache of flagged spreadsheets")
+    parser.add_argument("--no-cache", action="store_true", help="always parse the spreadsheet")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only import the publications which have changed since the last incremental import and "
+                             "delete the ones which are no longer on the spreadsheet")
+    parser.add_argument("--staging", action="store_true",
+                        help="bulk load the publications into staging tables and merge them with set-based "
+                             "statements")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="stream the spreadsheet a chunk of rows at a time and insert the publications as they "
+                             "are read; use it with --engine stream for the memory not to grow with the spreadsheet")
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="number of rows of the spreadsheet read at a time by --pipeline")
+    parser.add_argument("--sdb-workers", type=int, default=1,
+                        help="maximum number of queries run against the SDB at the same time")
+    parser.add_argument("--database", default="mysql",
+                        help="where the salt_stats tables are written: mysql for the database configured in the "
+                             "environment, or sqlite:<path> or duckdb:<path> for a local database file")
+    parser.add_argument("--validate", action="store_true",
+                        help="only check the spreadsheet and list all its problems, without touching the databases")
+    parser.add_argument("--report", help="file the timings, query counts and slowest statements of the import are "
+                                         "written to as JSON")
+    parser.add_argument("--prometheus", help="file the measurements are written to in the Prometheus text format, "
+                                             "such as a .prom file in the directory of the node exporter's textfile "
+                                             "collector")
+    args = parser.parse_args(argv)
+    if args.validate:
+        snapshot = flagged_snapshot(args.path, args.sheet, args.engine, None if args.no_cache else args.cache_dir)
+        problems = validate_spreadsheet(without_legend(snapshot.dataframe()))
+        for problem in problems:
+            print("row {}: {}".format(problem.row, problem.message), file=sys.stderr)
+        return 1 if problems else 0
+
+    # the measurements are only recorded if they are asked for, and are written even if the import fails
+    recorder = enable() if args.report or args.prometheus else None
+    try:
+        counts = run_import(args.path, sheet_name=args.sheet, batch_size=args.batch_size, engine=args.engine,
+                            cache_directory=None if args.no_cache else args.cache_dir, incremental=args.incremental,
+                            staging=args.staging, pipeline=args.pipeline, chunk_size=args.chunk_size,
+                            sdb_workers=args.sdb_workers,
+                            backend=storage_backend(args.database, salt_statistics_db_config()))
+    finally:
+        if recorder is not None:
+            disable()
+            if args.report:
+                write_report(args.report, recorder)
+            if args.prometheus:
+                write_prometheus(args.prometheus, recorder)
+    if counts is not None:
+        print("{inserted} inserted, {replaced} replaced, {deleted} deleted, {unchanged} unchanged".format(**counts))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
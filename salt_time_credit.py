@@ -0,0 +1,187 @@
+import argparse
+import json
+import sys
+import numpy as np
+import pandas as pd
+from database_configuration import DatabaseConfiguration, salt_statistics_db_config
+from storage_backends import MySQLBackend, StorageBackend, storage_backend
+
+# Every publication is one credit, which is shared by the proposals whose data it used in proportion to the SALT time
+# which went into it: the total SALT time of the proposal times its fraction of total time, a percentage, if there is
+# one. The share of a proposal is split equally between the partners which allocated its time, and between the
+# instruments of the modes it used. The credits of a partner or instrument are the publications its SALT time bought.
+
+# The instrument use of the proposals of the publications, one row per publication, proposal and instrument mode
+USE_SQL = """
+SELECT u.Publication_Id, u.Proposal_Id, i.Instrument, m.Mode, u.TotalSALTTime, u.SALTTimeFraction
+FROM ProposalInstrumentUse u
+    LEFT JOIN InstrumentMode m ON m.InstrumentMode_Id = u.InstrumentMode_Id
+    LEFT JOIN Instrument i ON i.Instrument_Id = m.Instrument_Id
+WHERE u.Publication_Id IS NOT NULL AND u.Proposal_Id IS NOT NULL
+"""
+
+# The partners which allocated the time of the proposals
+ALLOCATION_SQL = """
+SELECT t.Proposal_Id, p.Name
+FROM TimeAllocatingPartner t JOIN Partner p ON p.Partner_Id = t.Partner_Id
+WHERE t.Proposal_Id IS NOT NULL
+"""
+
+
+def query_frame(cur, sql, columns, numeric=()):
+    """
+    We run a query and put its rows into a DataFrame
+    :param cur: A cursor of the database
+    :param sql: The query
+    :param columns: The names given to the columns of the query
+    :param numeric: The columns which are turned into float arrays, with NaN for NULL
+    :return: DataFrame with a column for each column of the query
+    """
+    cur.execute(sql)
+    frame = pd.DataFrame.from_records(list(cur.fetchall()), columns=columns)
+    for column in numeric:
+        frame[column] = pd.to_numeric(frame[column], errors="coerce").astype(float)
+    return frame
+
+
+def publication_shares(publication_ids, weights):
+    """
+    We split the credit of every publication between its rows in proportion to their weights. A publication whose
+    rows have no weight is split equally between them.
+    :param publication_ids: The publication of each row
+    :param weights: The weight of each row, NaN if it has none
+    :return: float array with the share of each row, the shares of a publication adding up to 1
+    """
+    groups, _ = pd.factorize(publication_ids)
+    weights = np.nan_to_num(np.asarray(weights, dtype=float), nan=0.0).clip(min=0.0)
+    totals = np.bincount(groups, weights=weights)[groups]
+    counts = np.bincount(groups)[groups]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(totals > 0, weights / totals, 1.0 / counts)
+
+
+def credit_allocations(uses, allocations):
+    """
+    We allocate the credit of the publications to the partners and instruments of their proposals
+    :param uses: DataFrame with the Publication_Id, Proposal_Id, Instrument, Mode, TotalSALTTime and
+    SALTTimeFraction of the instrument use of the proposals, as query_frame reads it with USE_SQL
+    :param allocations: DataFrame with the Proposal_Id and Name of the time allocating partners
+    :return: DataFrame with a row for each publication, proposal, mode and time allocating partner (whose Partner is
+    None if the proposal has none), with its Credit and PartnerSALTTime, the partner's part of the TotalSALTTime spent
+    in the mode
+    """
+    fractions = uses["SALTTimeFraction"].to_numpy() / 100.0
+    used_time = uses["TotalSALTTime"].to_numpy() * np.where(np.isnan(fractions), 1.0, fractions)
+    # a proposal which used several modes has a row for each of them, which share its SALT time
+    modes = uses.groupby(["Publication_Id", "Proposal_Id"])["Proposal_Id"].transform("size").to_numpy()
+    used_time = used_time / modes
+    # and the SALT time of a proposal is split equally between all the modes it used, so that it is counted once
+    # when the modes are added up
+    proposal_modes = uses[["Proposal_Id", "Mode"]].drop_duplicates()["Proposal_Id"].value_counts()
+    uses = uses.assign(Share=publication_shares(uses["Publication_Id"].to_numpy(), used_time),
+                       ModeShare=1.0 / uses["Proposal_Id"].map(proposal_modes).to_numpy(dtype=float))
+
+    allocations = allocations.drop_duplicates().rename(columns={"Name": "Partner"})
+    partners = allocations["Proposal_Id"].map(allocations["Proposal_Id"].value_counts())
+    allocations = allocations.assign(PartnerShare=1.0 / partners.to_numpy(dtype=float))
+    credits = uses.merge(allocations, on="Proposal_Id", how="left")
+    partner_share = credits["PartnerShare"].fillna(1.0).to_numpy()
+    credits["Credit"] = credits["Share"].to_numpy() * partner_share
+    credits["PartnerSALTTime"] = credits["TotalSALTTime"].to_numpy() * partner_share * credits["ModeShare"].to_numpy()
+    return credits.drop(columns=["Share", "PartnerShare", "ModeShare"])
+
+
+def credit_per_group(credits, group, time_keys):
+    """
+    We add up the credits of a group, and the SALT time which bought them. The SALT time of a proposal is counted
+    once for every group, however many publications it has.
+    :param credits: DataFrame as returned by credit_allocations
+    :param group: The column of the groups
+    :param time_keys: The columns which tell the SALT time of a proposal in a group apart
+    :return: DataFrame with the group column, Publications, SALTTime and PublicationsPerSALTTime
+    """
+    publications = credits.groupby(group, dropna=False, sort=True)["Credit"].sum()
+    times = (credits.groupby([group] + time_keys, dropna=False)["PartnerSALTTime"].max()
+             .groupby(level=group, dropna=False).sum(min_count=1))
+    result = pd.DataFrame({"Publications": publications, "SALTTime": times.reindex(publications.index)})
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result["PublicationsPerSALTTime"] = np.where(result["SALTTime"] > 0,
+                                                     result["Publications"] / result["SALTTime"], np.nan)
+    return result.reset_index()
+
+
+class SALTTimeCredit:
+    """
+    The publications bought by the SALT time of the partners and instruments, from the instrument use of the proposals
+    in the salt_stats database. The rows are read once, when the object is made, and the credits are computed from
+    them with array operations.
+    Parameters
+    ----------
+    database_config : DatabaseConfiguration
+        The configuration of the MySQL database, if no backend is given.
+    backend : StorageBackend
+        The database the instrument use is read from.
+    """
+
+    def __init__(self, database_config: DatabaseConfiguration = None, backend: StorageBackend = None) -> None:
+        if backend is None:
+            if database_config is None:
+                raise ValueError("Either a database configuration or a storage backend is needed")
+            backend = MySQLBackend(database_config)
+        connection = backend.connect()
+        try:
+            with connection.cursor() as cur:
+                uses = query_frame(cur, USE_SQL, ["Publication_Id", "Proposal_Id", "Instrument", "Mode",
+                                                  "TotalSALTTime", "SALTTimeFraction"],
+                                   numeric=["TotalSALTTime", "SALTTimeFraction"])
+                allocations = query_frame(cur, ALLOCATION_SQL, ["Proposal_Id", "Name"])
+        finally:
+            connection.close()
+        self._credits = credit_allocations(uses, allocations)
+
+    def allocations(self) -> pd.DataFrame:
+        """
+        The credit of every publication, proposal and time allocating partner.
+        :return: DataFrame as returned by credit_allocations
+        """
+
+        return self._credits.copy()
+
+    def credit_per_partner(self) -> pd.DataFrame:
+        """
+        The publications bought by the SALT time every partner allocated. Proposals without a time allocating partner
+        are counted for a Partner of None.
+        :return: DataFrame with Partner, Publications, SALTTime and PublicationsPerSALTTime
+        """
+
+        return credit_per_group(self._credits, "Partner", ["Proposal_Id", "Mode"])
+
+    def credit_per_instrument(self) -> pd.DataFrame:
+        """
+        The publications bought by the SALT time of every instrument.
+        :return: DataFrame with Instrument, Publications, SALTTime and PublicationsPerSALTTime
+        """
+
+        return credit_per_group(self._credits, "Instrument", ["Proposal_Id", "Mode", "Partner"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the publications bought by the SALT time of every partner "
+                                                 "and instrument as JSON.")
+    parser.add_argument("--database", default="mysql",
+                        help="mysql for the database configured in the environment, or sqlite:<path> or "
+                             "duckdb:<path> for a local database file")
+    args = parser.parse_args(argv)
+
+    credit = SALTTimeCredit(backend=storage_backend(args.database, salt_statistics_db_config()))
+    report = {
+        "credit_per_partner": credit.credit_per_partner(),
+        "credit_per_instrument": credit.credit_per_instrument(),
+    }
+    print(json.dumps({name: json.loads(frame.to_json(orient="records")) for name, frame in report.items()},
+                     indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+import argparse
+import os
+import re
+import sys
+from connection_pool import shared_pool
+from database_configuration import DatabaseConfiguration, salt_statistics_db_config
+from sql_scripts import sql_statements
+
+# The migrations are sql files named <version>_<description>.sql, applied in the order of their version on top of the
+# tables created by sql/tables.sql
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql", "migrations")
+
+# The lookups the loader makes for every row it inserts. None of them may need a full table scan.
+LOADER_LOOKUPS = [
+    ("publication by date, first author and ADS link",
+     "SELECT Publication_Id FROM Publication WHERE PublicationDate = %s AND FirstAuthor_Id = %s AND ADSLink = %s",
+     ("2019-01-15", 1, "https://ui.adsabs.harvard.edu/abs/2019MNRAS.00001")),
+    ("proposal by proposal code", "SELECT Proposal_Id FROM Proposal WHERE ProposalCode = %s",
+     ("2019-1-SCI-001",)),
+    ("science subject by name", "SELECT ScienceSubject_Id FROM ScienceSubject WHERE ScienceSubject = %s", ("agn",)),
+    ("instrument mode by mode", "SELECT InstrumentMode_Id FROM InstrumentMode WHERE Mode = %s", ("Imaging",)),
+    ("semester by year and semester", "SELECT Semester_Id FROM Semester WHERE Year = %s AND Semester = %s",
+     (2019, 1)),
+    ("first author by name", "SELECT FirstAuthor_Id FROM FirstAuthor WHERE Name = %s", ("Smith",)),
+    ("partner by name", "SELECT Partner_Id FROM Partner WHERE Name = %s", ("RSA",)),
+    ("publication type by name", "SELECT PublicationType_Id FROM PublicationType WHERE PublicationType = %s",
+     ("science",)),
+    ("proposal issue by description", "SELECT Issue_Id FROM IssuesForProposals WHERE Issue = %s",
+     ("No issue found",)),
+    ("publication issue by description", "SELECT Issue_Id FROM IssuesForPublications WHERE Issue = %s",
+     ("No issue found",)),
+    ("publication partner by publication and partner",
+     "SELECT 1 FROM PublicationPartner WHERE Publication_Id = %s AND Partner_Id = %s", (1, 1)),
+    ("proposal instrument use by publication, proposal and mode",
+     "SELECT 1 FROM ProposalInstrumentUse WHERE Publication_Id = %s AND Proposal_Id = %s AND InstrumentMode_Id = %s",
+     (1, 1, 1)),
+    ("publication issue by publication and issue",
+     "SELECT 1 FROM PublicationIssues WHERE Publication_Id = %s AND Issue_Id = %s", (1, 1)),
+]
+
+
+def database_connection(database_config: DatabaseConfiguration):
+    """
+    A connection to the database, checked out of its shared pool
+    :param database_config: The database configuration
+    :return: The connection, which is checked back in to the pool when it is closed
+    """
+    return shared_pool(database_config).checkout()
+
+
+def available_migrations(directory=MIGRATIONS_DIRECTORY):
+    """
+    The migrations in the migrations directory
+    :param directory: The migrations directory
+    :return: list of (version, name, path) tuples, ordered by version
+    """
+    migrations = []
+    for filename in os.listdir(directory):
+        match = re.match(r"^(\d+)_(\w+)\.sql$", filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    return sorted(migrations)
+
+
+def schema_change_made(cur, statement):
+    """
+    We check whether a statement of a migration makes a schema change which has been made already. MySQL commits
+    every schema change straight away and has no IF NOT EXISTS for indexes and columns, so a migration which failed
+    halfway would otherwise fail on the indexes and columns it added before when it is run again.
+    :param cur: A cursor of the database
+    :param statement: The statement
+    :return: True if the statement creates an index or column which exists, or drops or renames one which doesn't
+    """
+    create_index = re.match(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+(\w+)\s+ON\s+(\w+)", statement, re.IGNORECASE)
+    drop_index = re.match(r"DROP\s+INDEX\s+(\w+)\s+ON\s+(\w+)", statement, re.IGNORECASE)
+    add_column = re.match(r"ALTER\s+TABLE\s+(\w+)\s+ADD\s+COLUMN\s+(\w+)", statement, re.IGNORECASE)
+    drop_column = re.match(r"ALTER\s+TABLE\s+(\w+)\s+(?:DROP|CHANGE)\s+COLUMN\s+(\w+)", statement, re.IGNORECASE)
+    if create_index or drop_index:
+        index, table = (create_index or drop_index).groups()
+        cur.execute("""SELECT COUNT(*) FROM information_schema.statistics
+                       WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s""", (table, index))
+        return (cur.fetchone()[0] > 0) == bool(create_index)
+    if add_column or drop_column:
+        table, column = (add_column or drop_column).groups()
+        cur.execute("""SELECT COUNT(*) FROM information_schema.columns
+                       WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s""", (table, column))
+        return (cur.fetchone()[0] > 0) == bool(add_column)
+    return False
+
+
+def applied_versions(connection):
+    """
+    The versions of the migrations which have been applied to the database
+    :param connection: The database connection
+    :return: set of versions
+    """
+    with connection.cursor() as cur:
+        cur.execute("""CREATE TABLE IF NOT EXISTS SchemaVersion(
+                           Version INT PRIMARY KEY,
+                           Name VARCHAR(100),
+                           AppliedAt DATETIME DEFAULT CURRENT_TIMESTAMP
+                       )""")
+        cur.execute("SELECT Version FROM SchemaVersion")
+        return {row[0] for row in cur.fetchall()}
+
+
+def migrate(connection, directory=MIGRATIONS_DIRECTORY):
+    """
+    We apply the migrations which have not been applied to the database yet, in the order of their version. MySQL
+    commits every schema change straight away, so a migration is recorded in the SchemaVersion table as soon as its
+    last statement has run, and the schema changes which have been made already are skipped, so that a migration
+    which failed halfway can be run again.
+    :param connection: The database connection
+    :param directory: The migrations directory
+    :return: list of the versions which have been applied
+    """
+    applied = applied_versions(connection)
+    newly_applied = []
+    for version, name, path in available_migrations(directory):
+        if version in applied:
+            continue
+        with open(path) as f:
+            statements = sql_statements(f.read())
+        with connection.cursor() as cur:
+            for statement in statements:
+                if not schema_change_made(cur, statement):
+                    cur.execute(statement)
+            cur.execute("INSERT INTO SchemaVersion(Version, Name) VALUES (%s, %s)", (version, name))
+        connection.commit()
+        newly_applied.append(version)
+    return newly_applied
+
+
+def full_table_scans(connection, lookups=LOADER_LOOKUPS):
+    """
+    We check the query plans of the loader's lookups for full table scans
+    :param connection: The database connection
+    :param lookups: list of (description, sql, parameters) tuples
+    :return: list of the descriptions of the lookups which scan a whole table
+    """
+    scans = []
+    with connection.cursor() as cur:
+        for description, sql, parameters in lookups:
+            cur.execute("EXPLAIN " + sql, parameters)
+            columns = [column[0] for column in cur.description]
+            for row in cur.fetchall():
+                plan = dict(zip(columns, row))
+                if plan.get("type") == "ALL":
+                    scans.append("{} (table {})".format(description, plan.get("table")))
+    return scans
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply the schema migrations to the salt_stats database and check "
+                                                 "the query plans of the loader's lookups.")
+    parser.add_argument("--check-plans", action="store_true",
+                        help="only check that none of the loader's lookups needs a full table scan")
+    args = parser.parse_args(argv)
+
+    connection = database_connection(salt_statistics_db_config())
+    try:
+        if not args.check_plans:
+            for version in migrate(connection):
+                print("Applied migration {}".format(version))
+        scans = full_table_scans(connection)
+    finally:
+        connection.close()
+
+    for scan in scans:
+        print("Full table scan for the lookup of the {}".format(scan), file=sys.stderr)
+    return 1 if scans else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+from functools import lru_cache
+from types import MappingProxyType
+import numpy as np
+import pandas as pd
+
+# The codes used in the "type of science" column, with what they stand for
+SCIENCE_TYPES = MappingProxyType({
+    "exg": "Extragalactic", "sne": "Supernovae and GrW", "hz": "high z", "qso": "quasar", "gal": "galaxy",
+    "exo": "extra-solar planetary", "bin": "binary", "gc": "globular cluster", "He": "Helium",
+    "xrb": "X/gamma-ray binaries", "Gal": "Gal object", "ast": "asteroid", "sol": "Solar system",
+    "gw": "gravitational waves", "dwM": "M-dwarfs", "gcl": "galaxy cluster", "cv": "cataclysmic variable",
+    "cos": "cosmology", "nea": "near-earth asteroids", "psr": "pulsar", "cl": "cluster", "r-gal": "radio-galaxy",
+    "wd": "white dwarf", "*": "star", "ism": "interstellar matter",
+    "loc": "local neighbourhood (Gal: sun; exg: loc univ)", "yso": "young stellar object",
+    "lss": "lss and distance measurements", "dw": "dwarf", "V*": "variable star", "pn": "planetary nebulae",
+    "WR*": "Wolf-Rayet star", "stb": "starburst", "agn": "active galactic nucleus", "gl clu": "galaxy cluster",
+    "tde": "tidal disruption event", "*cl": "cluster of stars", "he*": "hydrogen deficient star", "uran": "Uranus",
+    "igm": "intergalactic medium", "dw*": "dwarf binary"
+})
+
+
+def science_types():
+    """
+    The codes used in the "type of science" column
+    :return: Read-only mapping of the codes to what they stand for
+    """
+    return SCIENCE_TYPES
+
+
+@lru_cache(maxsize=None)
+def parse_science_type(science_type):
+    """
+    We get the subject of a type of science, which is either just a subject (such as "agn") or a category and a
+    subject (such as "exg-agn" or "exg-r-gal"), and what it stands for. The result is computed once for every
+    distinct type of science.
+    :param science_type: The type of science on the spreadsheet
+    :return: The subject and its explanation
+    """
+    science_type = str(science_type)
+    if "-" in science_type:
+        subject = science_type.split("-", 1)[1].strip()
+    else:
+        subject = science_type.strip()
+
+    if subject not in SCIENCE_TYPES:
+        raise ValueError("Unknown science subject '{}' in the type of science '{}'".format(subject, science_type))
+    return subject, SCIENCE_TYPES[subject]
+
+
+def science_subject_and_explanation(science_type):
+    """
+    We get the subject of a type of science and what it stands for, or None for both if there is no type of science
+    :param science_type: The type of science on the spreadsheet
+    :return: dict with the subject and explanation
+    """
+    if pd.isnull(science_type) or "--" in str(science_type):
+        return {"subject": None, "explanation": None}
+
+    subject, explanation = parse_science_type(science_type)
+    return {"subject": subject, "explanation": explanation}
+
+
+def classify_science_types(column):
+    """
+    We get the subjects and explanations for a whole column of types of science, parsing every distinct type of
+    science once
+    :param column: pandas series with the types of science
+    :return: pandas dataframe with a subject and explanation column, with the index of the column
+    """
+    codes, uniques = pd.factorize(column, use_na_sentinel=False)
+    subjects = np.empty(len(uniques), dtype=object)
+    explanations = np.empty(len(uniques), dtype=object)
+    for i, science_type in enumerate(uniques):
+        classified = science_subject_and_explanation(science_type)
+        subjects[i], explanations[i] = classified["subject"], classified["explanation"]
+
+    return pd.DataFrame({"subject": subjects[codes], "explanation": explanations[codes]}, index=column.index)
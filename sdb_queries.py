@@ -0,0 +1,228 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from connection_pool import shared_pool
+from database_configuration import DatabaseConfiguration
+from instrumentation import operation, staged
+from dotenv import load_dotenv
+
+
+def sdb_config():
+    """
+    The configuration of the SDB (science database), from the environment (or the .env file)
+    :return: The database configuration
+    """
+    load_dotenv()
+    return DatabaseConfiguration(
+        username=os.getenv("user"),
+        password=os.getenv("password"),
+        host=os.getenv("host"),
+        port=int(os.getenv("port", "3306")),
+        database=os.getenv("database")
+    )
+
+
+def sdb_pool(max_size=None):
+    """
+    The pool of connections to the SDB. It is made the first time it is needed, so that importing this module doesn't
+    need the database.
+    :param max_size: Maximum number of connections, see connection_pool.shared_pool
+    :return: The pool, whose connections return rows as dictionaries
+    """
+    import MySQLdb.cursors
+    return shared_pool(sdb_config(), max_size, cursorclass=MySQLdb.cursors.DictCursor)
+
+
+@operation()
+def student_project_phd_numbers(proposal_code, thesis_type_id):
+    with sdb_pool().connection() as connection, connection.cursor() as cur:
+        sql = """SELECT COUNT(*) AS phd_numbers FROM P1Thesis p1t
+                 JOIN ProposalCode pc on p1t.ProposalCode_Id = pc.ProposalCode_Id
+                 WHERE pc.Proposal_Code= %(proposal_code)s and ThesisType_Id = %(thesis_type_id)s
+                 """
+        cur.execute(sql, dict(proposal_code=proposal_code, thesis_type_id=thesis_type_id))
+        results = cur.fetchall()
+        return results[0]["phd_numbers"]
+
+
+@operation()
+def student_project_msc_numbers(proposal_code, thesis_type_id):
+    with sdb_pool().connection() as connection, connection.cursor() as cur:
+        sql = """SELECT COUNT(*) AS msc_numbers FROM P1Thesis p1t
+                 JOIN ProposalCode pc on p1t.ProposalCode_Id = pc.ProposalCode_Id
+                 WHERE pc.Proposal_Code= %(proposal_code)s and ThesisType_Id = %(thesis_type_id)s
+              """
+        cur.execute(sql, dict(proposal_code=proposal_code, thesis_type_id=thesis_type_id))
+        results = cur.fetchall()
+        return results[0]["msc_numbers"]
+
+
+@operation()
+def institutes(proposal_code):
+    arr = []
+    with sdb_pool().connection() as connection, connection.cursor() as cur:
+        sql = """SELECT InstituteName_Name AS Institute, CONCAT(Surname,' ',FirstName ) AS ProposalInvestigator, 
+             ActOnAlert as TargetOfOpportunity
+             FROM  ProposalCode pc
+             JOIN ProposalInvestigator pi ON pc.ProposalCode_Id = pi.ProposalCode_Id
+             JOIN  Investigator ON pi.Investigator_Id = Investigator.Investigator_Id
+             JOIN Institute ON Investigator.Institute_Id = Institute.Institute_Id
+             JOIN InstituteName ON Institute.InstituteName_Id = InstituteName.InstituteName_Id
+             JOIN ProposalGeneralInfo pg ON pc.ProposalCode_Id = pg.ProposalCode_Id
+             WHERE Proposal_Code = %(proposal_code)s """
+        cur.execute(sql, dict(proposal_code=proposal_code))
+        results = cur.fetchall()
+        for result in results:
+            arr.append(result["Institute"])
+        return {"institutes": ",".join(list(dict.fromkeys(arr))),
+                "target of opportunity": result["TargetOfOpportunity"]}
+
+
+@operation()
+def proposal_investigator(proposal_code):
+    with sdb_pool().connection() as connection, connection.cursor() as cur:
+        sql = """SELECT CONCAT(Surname,' ',FirstName ) AS ProposalInvestigator
+                 FROM  ProposalCode pc
+                 JOIN ProposalInvestigator pi ON pc.ProposalCode_Id = pi.ProposalCode_Id
+                 JOIN Investigator ON pi.Investigator_Id = Investigator.Investigator_Id
+                 JOIN ProposalContact ON pc.ProposalCode_Id = ProposalContact.ProposalCode_Id
+                 WHERE Proposal_Code = %(proposal_code)s AND pi.Investigator_Id = Leader_Id"""
+        cur.execute(sql, dict(proposal_code=proposal_code))
+        results = cur.fetchall()
+        for result in results:
+            return result
+
+
+@operation()
+def semester_and_year_sdb(proposal_code):
+    with sdb_pool().connection() as connection, connection.cursor() as cur:
+        sql = """SELECT Semester, Year
+                 FROM ProposalCode
+                 JOIN Proposal ON sdb_daily.ProposalCode.ProposalCode_Id = sdb_daily.Proposal.ProposalCode_Id
+                 JOIN Semester ON sdb_daily.Proposal.Semester_Id = Semester.Semester_Id
+                 WHERE ProposalCode.Proposal_Code = %(proposal_code)s """
+        cur.execute(sql, dict(proposal_code=proposal_code))
+        results = cur.fetchall()
+        return {"year": results[0]["Year"], "semester": results[0]["Semester"]}
+
+
+# The queries of prefetch_proposal_information, which are run for a chunk of proposal codes at a time
+PREFETCH_QUERIES = {
+    "theses": """SELECT pc.Proposal_Code, ThesisType_Id, COUNT(*) AS numbers FROM P1Thesis p1t
+                 JOIN ProposalCode pc on p1t.ProposalCode_Id = pc.ProposalCode_Id
+                 WHERE pc.Proposal_Code IN %(proposal_codes)s AND ThesisType_Id IN (1, 2)
+                 GROUP BY pc.Proposal_Code, ThesisType_Id""",
+    "institutes": """SELECT Proposal_Code, InstituteName_Name AS Institute, ActOnAlert as TargetOfOpportunity
+                     FROM  ProposalCode pc
+                     JOIN ProposalInvestigator pi ON pc.ProposalCode_Id = pi.ProposalCode_Id
+                     JOIN  Investigator ON pi.Investigator_Id = Investigator.Investigator_Id
+                     JOIN Institute ON Investigator.Institute_Id = Institute.Institute_Id
+                     JOIN InstituteName ON Institute.InstituteName_Id = InstituteName.InstituteName_Id
+                     JOIN ProposalGeneralInfo pg ON pc.ProposalCode_Id = pg.ProposalCode_Id
+                     WHERE Proposal_Code IN %(proposal_codes)s """,
+    "investigators": """SELECT Proposal_Code, CONCAT(Surname,' ',FirstName ) AS ProposalInvestigator
+                        FROM  ProposalCode pc
+                        JOIN ProposalInvestigator pi ON pc.ProposalCode_Id = pi.ProposalCode_Id
+                        JOIN Investigator ON pi.Investigator_Id = Investigator.Investigator_Id
+                        JOIN ProposalContact ON pc.ProposalCode_Id = ProposalContact.ProposalCode_Id
+                        WHERE Proposal_Code IN %(proposal_codes)s AND pi.Investigator_Id = Leader_Id""",
+    "semesters": """SELECT ProposalCode.Proposal_Code, Semester, Year
+                    FROM ProposalCode
+                    JOIN Proposal ON sdb_daily.ProposalCode.ProposalCode_Id = sdb_daily.Proposal.ProposalCode_Id
+                    JOIN Semester ON sdb_daily.Proposal.Semester_Id = Semester.Semester_Id
+                    WHERE ProposalCode.Proposal_Code IN %(proposal_codes)s """,
+}
+
+
+@operation()
+def fetch_chunk(sql, proposal_codes):
+    """
+    We run one of the PREFETCH_QUERIES for a chunk of proposal codes, on the connection of the thread
+    :param sql: The query
+    :param proposal_codes: tuple of the proposal codes
+    :return: The rows, as dictionaries
+    """
+    with sdb_pool().connection() as connection, connection.cursor() as cur:
+        cur.execute(sql, dict(proposal_codes=proposal_codes))
+        return cur.fetchall()
+
+
+def run_queries(tasks, max_workers=1):
+    """
+    We run queries for chunks of proposal codes with at most max_workers of them in flight at a time. Every worker
+    thread checks a connection out of sdb_pool(), as a connection can only run one query at a time, and the pool is
+    made big enough for all of them. The connections stay open in the pool for the next queries.
+    :param tasks: list of (sql, proposal codes) tuples
+    :param max_workers: Maximum number of queries run at the same time, 1 runs them one after the other
+    :return: generator of the rows of every query, in the order of the tasks
+    """
+    if max_workers <= 1 or len(tasks) <= 1:
+        for sql, proposal_codes in tasks:
+            yield fetch_chunk(sql, proposal_codes)
+        return
+
+    workers = min(max_workers, len(tasks))
+    sdb_pool(workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # map hands the results back in the order of the tasks, whichever query finishes first
+        yield from executor.map(lambda task: fetch_chunk(*task), tasks)
+
+
+@staged("prefetch")
+def prefetch_proposal_information(proposal_codes, chunk_size=1000, max_workers=1):
+    """
+    We get the SDB information needed for all the proposal codes with a few queries for all of them, rather than with
+    the queries above for every proposal code on every row. The information for a proposal code is
+    {"master's student": 1, "phd student": 0, "institutes": "University of Cape Town,...",
+     "target of opportunity": 0, "PI": "Smith John", "year": 2019, "semester": 1}
+    where institutes, target of opportunity, PI, year and semester are None if the SDB doesn't have them
+    :param proposal_codes: The proposal codes, repeated codes are fine
+    :param chunk_size: Number of proposal codes per query
+    :param max_workers: Maximum number of queries run against the SDB at the same time, see run_queries
+    :return: The information for each proposal code
+    """
+    codes = list(dict.fromkeys(code for code in proposal_codes if code is not None))
+    proposal_info = {code: {"master's student": 0, "phd student": 0, "institutes": None,
+                            "target of opportunity": None, "PI": None, "year": None, "semester": None}
+                     for code in codes}
+    # MySQL compares the codes ignoring case and trailing spaces, so the SDB may return a code spelt differently
+    codes_in_sdb = {}
+    for code in codes:
+        codes_in_sdb.setdefault(str(code).rstrip().lower(), []).append(proposal_info[code])
+
+    def infos(sdb_code):
+        return codes_in_sdb.get(str(sdb_code).rstrip().lower(), [])
+
+    tasks = [(sql, tuple(codes[start:start + chunk_size]))
+             for start in range(0, len(codes), chunk_size) for sql in PREFETCH_QUERIES.values()]
+    # the results are used in the order of the tasks, so that they are the same whatever order the queries finish in
+    for kind, results in zip(list(PREFETCH_QUERIES) * len(tasks), run_queries(tasks, max_workers)):
+        if kind == "theses":
+            for result in results:
+                # 1 is for PhD and 2 for MSc theses
+                key = "phd student" if result["ThesisType_Id"] == 1 else "master's student"
+                for info in infos(result["Proposal_Code"]):
+                    info[key] = result["numbers"]
+
+        elif kind == "institutes":
+            institutes_of_proposal = {}
+            for result in results:
+                for info in infos(result["Proposal_Code"]):
+                    institutes_of_proposal.setdefault(id(info), (info, []))[1].append(result["Institute"])
+                    info["target of opportunity"] = result["TargetOfOpportunity"]
+            for info, arr in institutes_of_proposal.values():
+                info["institutes"] = ",".join(list(dict.fromkeys(arr)))
+
+        elif kind == "investigators":
+            for result in results:
+                for info in infos(result["Proposal_Code"]):
+                    if info["PI"] is None:
+                        info["PI"] = result["ProposalInvestigator"]
+
+        else:
+            for result in results:
+                for info in infos(result["Proposal_Code"]):
+                    if info["year"] is None:
+                        info["year"] = result["Year"]
+                        info["semester"] = result["Semester"]
+
+    return proposal_info
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import pickle
+from legend import LEGEND
+
+# The version of the parsing and flagging of the spreadsheet. It is part of the cache key, so it must be increased
+# whenever a change to create_dataframe or SpreadsheetSnapshot changes the flagged DataFrame.
+PARSER_VERSION = 1
+
+DEFAULT_CACHE_DIRECTORY = ".spreadsheet_cache"
+
+
+def file_hash(filepath, chunk_size=1 << 20):
+    """
+    The sha256 hash of the content of a file
+    :param filepath: Path of the file
+    :param chunk_size: Number of bytes read at a time
+    :return: The hex digest
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CachedSpreadsheet:
+    """
+    The flagged DataFrame of a spreadsheet as stored in the cache. It can be passed to read_spreadsheet in place of a
+    SpreadsheetSnapshot.
+    Parameters
+    ----------
+    filepath : str
+        Path of the xlsx file.
+    dataframe : DataFrame
+        The sheet with the Flag column, as SpreadsheetSnapshot.dataframe gives it after create_dataframe.
+    flags : dict
+        The flag value for each row number.
+    """
+
+    def __init__(self, filepath: str, dataframe, flags: dict) -> None:
+        self._filepath = filepath
+        self._dataframe = dataframe
+        self._flags = flags
+
+    def filepath(self) -> str:
+        """
+        The path of the xlsx file.
+        Returns
+        -------
+        str
+            The file path.
+        """
+
+        return self._filepath
+
+    def dataframe(self):
+        """
+        The sheet with the Flag column.
+        Returns
+        -------
+        DataFrame
+            The rows of the sheet, with the first row as the column names.
+        """
+
+        return self._dataframe
+
+    def flags(self) -> dict:
+        """
+        The flags of the rows.
+        Returns
+        -------
+        dict
+            The flag value for each row number.
+        """
+
+        return dict(self._flags)
+
+
+class SpreadsheetCache:
+    """
+    An on-disk cache of flagged spreadsheets, so that a spreadsheet which has not changed since the last run is not
+    parsed again. An entry is keyed by the sha256 hash of the xlsx file, the sheet name, the legend and
+    PARSER_VERSION, so it is no longer used as soon as any of them changes. Only the latest entry of a sheet is kept.
+    The DataFrame is pickled, as its object columns mix numbers and strings, which Parquet can't store without
+    changing their types.
+    Parameters
+    ----------
+    directory : str
+        Directory of the cache files.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIRECTORY) -> None:
+        self._directory = directory
+
+    def directory(self) -> str:
+        """
+        The directory of the cache files.
+        Returns
+        -------
+        str
+            The directory.
+        """
+
+        return self._directory
+
+    @staticmethod
+    def _sheet_prefix(filepath, sheet_name):
+        sheet = "{}:{}".format(os.path.abspath(filepath), sheet_name)
+        return hashlib.sha256(sheet.encode("utf-8")).hexdigest()[:16]
+
+    def _path(self, filepath, sheet_name, legend):
+        key = "{}:{}:{}:{}".format(file_hash(filepath), sheet_name, repr(sorted(legend.items())), PARSER_VERSION)
+        return os.path.join(self._directory, "{}-{}.pickle".format(
+            self._sheet_prefix(filepath, sheet_name), hashlib.sha256(key.encode("utf-8")).hexdigest()))
+
+    def load(self, filepath: str, sheet_name: str = "Sheet1", legend: dict = None):
+        """
+        The cached flagged spreadsheet, if the file has not changed since it was stored.
+        :param filepath: Path of the xlsx file
+        :param sheet_name: Name of the sheet with the publications
+        :param legend: The colors of the legend the flags were created with, legend.LEGEND if None
+        :return: The CachedSpreadsheet, or None if there is no entry for the file as it is now
+        """
+
+        path = self._path(filepath, sheet_name, LEGEND if legend is None else legend)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            # a damaged entry is treated as missing and replaced by the next store
+            return None
+        return CachedSpreadsheet(filepath, entry["dataframe"], entry["flags"])
+
+    def store(self, filepath: str, dataframe, flags: dict, sheet_name: str = "Sheet1", legend: dict = None) -> None:
+        """
+        Store a flagged spreadsheet, replacing the older entries of the sheet.
+        :param filepath: Path of the xlsx file
+        :param dataframe: The sheet with the Flag column
+        :param flags: The flag value for each row number
+        :param sheet_name: Name of the sheet with the publications
+        :param legend: The colors of the legend the flags were created with, legend.LEGEND if None
+        :return:
+        """
+
+        os.makedirs(self._directory, exist_ok=True)
+        path = self._path(filepath, sheet_name, LEGEND if legend is None else legend)
+        prefix = self._sheet_prefix(filepath, sheet_name)
+        for filename in os.listdir(self._directory):
+            if filename.startswith(prefix + "-") and os.path.join(self._directory, filename) != path:
+                os.remove(os.path.join(self._directory, filename))
+
+        # the entry is written to a temporary file first so that an interrupted run can't leave half an entry
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            pickle.dump({"dataframe": dataframe, "flags": dict(flags)}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
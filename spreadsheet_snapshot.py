@@ -0,0 +1,171 @@
+import openpyxl
+import pandas as pd
+from instrumentation import stage, staged
+from xlsx_style_reader import StyledCell, XlsxStyleReader
+
+# "openpyxl" loads the whole workbook with openpyxl, "stream" streams the sheet XML with XlsxStyleReader
+ENGINES = ["openpyxl", "stream"]
+
+
+class SpreadsheetSnapshot:
+    """
+    A spreadsheet which is parsed once, with its styles, and shared by everything reading it. With the openpyxl
+    engine the DataFrame view is built by pandas from the same parsed workbook rather than from the file. With the
+    stream engine the cell colors are streamed from the sheet XML instead, and the openpyxl workbook is only loaded if
+    it is asked for.
+    Parameters
+    ----------
+    filepath : str
+        Path of the xlsx file.
+    sheet_name : str
+        Name of the sheet with the publications.
+    engine : str
+        How the cells and their colors are read, "openpyxl" or "stream".
+    """
+
+    def __init__(self, filepath: str, sheet_name: str = "Sheet1", engine: str = "openpyxl") -> None:
+        if engine not in ENGINES:
+            raise ValueError("Unknown spreadsheet engine '{}', use one of {}".format(engine, ", ".join(ENGINES)))
+        self._filepath = filepath
+        self._sheet_name = sheet_name
+        self._engine = engine
+        self._workbook = None
+        self._style_reader = None
+        self._flag_writer = None
+        self._file_dataframe = None
+        self._dataframe = None
+        if engine == "openpyxl":
+            self._load_workbook()
+
+    @staged("load_workbook")
+    def _load_workbook(self):
+        # data_only gives the cached values of formulas, which is what pandas reads too
+        self._workbook = openpyxl.load_workbook(self._filepath, data_only=True)
+        if self._flag_writer is not None:
+            self._flag_writer.write(self._workbook[self._sheet_name])
+
+    def filepath(self) -> str:
+        """
+        The path of the xlsx file.
+        Returns
+        -------
+        str
+            The file path.
+        """
+
+        return self._filepath
+
+    def engine(self) -> str:
+        """
+        The engine reading the cells and their colors.
+        Returns
+        -------
+        str
+            The engine, "openpyxl" or "stream".
+        """
+
+        return self._engine
+
+    def workbook(self):
+        """
+        The parsed workbook, including the font and fill of every cell. With the stream engine it is loaded the
+        first time it is needed.
+        Returns
+        -------
+        Workbook
+            The openpyxl workbook.
+        """
+
+        if self._workbook is None:
+            self._load_workbook()
+        return self._workbook
+
+    def sheet(self):
+        """
+        The sheet with the publications.
+        Returns
+        -------
+        Worksheet
+            The openpyxl worksheet.
+        """
+
+        return self.workbook()[self._sheet_name]
+
+    def styled_cells(self, min_row: int = 1, max_col: int = None, max_row: int = None):
+        """
+        The cells of the sheet with the rgb colors of their font and fill, row by row.
+        :param min_row: First row to read
+        :param max_col: Last column to read, all the columns are read if None
+        :param max_row: Last row to read, all the rows are read if None
+        :return: generator of StyledCell
+        """
+
+        if self._engine == "stream":
+            if self._style_reader is None:
+                self._style_reader = XlsxStyleReader(self._filepath, self._sheet_name)
+            yield from self._style_reader.cells(min_row, max_col, max_row)
+            return
+
+        sheet = self.sheet()
+        # the font and fill colors of each style id, which are only looked up the first time the style is seen
+        style_colors = {}
+        for row in sheet.iter_rows(min_row=min_row, max_col=sheet.max_column if max_col is None else max_col,
+                                   max_row=sheet.max_row if max_row is None else max_row):
+            for cell in row:
+                style_id = cell.style_id
+                if style_id not in style_colors:
+                    font_rgb = cell.font.color.rgb if cell.font.color is not None else None
+                    fill_rgb = cell.fill.fgColor.rgb
+                    # colors which are not given as rgb (such as theme colors) are None, as with the stream engine
+                    style_colors[style_id] = (font_rgb if isinstance(font_rgb, str) else None,
+                                              fill_rgb if isinstance(fill_rgb, str) else None)
+                yield StyledCell(cell.row, cell.column, cell.value, *style_colors[style_id], style_id)
+
+    def dataframe(self) -> pd.DataFrame:
+        """
+        The sheet as a DataFrame, typed the same way as pd.read_excel would type it.
+        Returns
+        -------
+        DataFrame
+            The rows of the sheet, with the first row as the column names.
+        """
+
+        if self._dataframe is None:
+            if self._workbook is not None:
+                with stage("read_excel"):
+                    self._dataframe = pd.read_excel(self._workbook, self._sheet_name, engine="openpyxl")
+            else:
+                # the file is only read once, the flags are added to a copy of what was read
+                if self._file_dataframe is None:
+                    with stage("read_excel"):
+                        self._file_dataframe = pd.read_excel(self._filepath, self._sheet_name, engine="openpyxl")
+                self._dataframe = self._file_dataframe
+                if self._flag_writer is not None:
+                    self._dataframe = self._flag_writer.write_dataframe(self._file_dataframe)
+        return self._dataframe
+
+    def flags(self) -> dict:
+        """
+        The flags written to the sheet.
+        Returns
+        -------
+        dict
+            The flag value for each row number, empty if no flags have been written.
+        """
+
+        if self._flag_writer is None:
+            return {}
+        return self._flag_writer.flags()
+
+    def write_flags(self, flag_writer) -> None:
+        """
+        Write flags to the sheet. The DataFrame view is rebuilt from the sheet the next time it is needed so that it
+        includes them.
+        :param flag_writer: The FlagWriter with the flags for the sheet
+        :return:
+        """
+
+        self._flag_writer = flag_writer
+        if self._workbook is not None:
+            flag_writer.write(self.sheet())
+        self._dataframe = None
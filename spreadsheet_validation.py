@@ -0,0 +1,130 @@
+from collections import namedtuple
+import pandas as pd
+from instrumentation import staged
+from reading_spreadsheet import clean_column, publication_rows
+from science_taxonomy import parse_science_type
+
+# A problem on the spreadsheet, with the row number as shown by Excel and the column it is in
+SpreadsheetProblem = namedtuple("SpreadsheetProblem", ["row", "column", "message"])
+
+
+class SpreadsheetValidationError(ValueError):
+    """
+    The error raised for a spreadsheet with problems, which lists all of them.
+    Parameters
+    ----------
+    problems : list of SpreadsheetProblem
+        The problems, ordered by row.
+    """
+
+    def __init__(self, problems) -> None:
+        self.problems = problems
+        super().__init__("The spreadsheet has {} problem(s):\n{}".format(len(problems), "\n".join(
+            "row {}: {}".format(problem.row, problem.message) for problem in problems)))
+
+
+def proposal_code_problems(df, is_proposal):
+    """
+    We find the proposal codes which are not a single code such as 2019-1-SCI-012, because they list more than one
+    code, contain spaces or have too few parts
+    :param df: pandas dataframe with rows of the spreadsheet
+    :param is_proposal: boolean series which is True for the rows with a proposal
+    :return: list of SpreadsheetProblem
+    """
+    codes = clean_column(df["Proposal code(s)"])
+    text = codes.astype(str)
+    bad = is_proposal & codes.notnull() & (
+        text.str.contains("and", regex=False) | text.str.contains(",", regex=False) |
+        text.str.contains(" ", regex=False) | (text.str.count("-") < 3))
+    return [SpreadsheetProblem(index + 2, "Proposal code(s)", "Incorrect proposal code '{}'".format(code))
+            for index, code in codes[bad].items()]
+
+
+def missing_month_problems(df, is_publication):
+    """
+    We find the publications with a year but no month
+    :param df: pandas dataframe with rows of the spreadsheet
+    :param is_publication: boolean series which is True for the rows with a publication
+    :return: list of SpreadsheetProblem
+    """
+    year = pd.to_numeric(df["Year"], errors="coerce")
+    missing = is_publication & year.notnull() & df["Month (the ADS 'pub date')"].isnull()
+    return [SpreadsheetProblem(index + 2, "Month (the ADS 'pub date')", "The Month was not added. Please add it")
+            for index in df.index[missing.to_numpy()]]
+
+
+def missing_ads_link_problems(df, is_publication):
+    """
+    We find the publications without an ADS link, which the database tells publications with the same first author
+    and month apart by
+    :param df: pandas dataframe with rows of the spreadsheet
+    :param is_publication: boolean series which is True for the rows with a publication
+    :return: list of SpreadsheetProblem
+    """
+    ads_link = df["ADS link"]
+    missing = is_publication & (ads_link.isnull() | (ads_link.astype(str).str.strip() == ""))
+    return [SpreadsheetProblem(index + 2, "ADS link", "The ADS link was not added. Please add it")
+            for index in df.index[missing.to_numpy()]]
+
+
+def student_project_problems(df, is_proposal):
+    """
+    We find the proposals whose student project is inconsistent, such as "PhD,MSc"
+    :param df: pandas dataframe with rows of the spreadsheet
+    :param is_proposal: boolean series which is True for the rows with a proposal
+    :return: list of SpreadsheetProblem
+    """
+    inconsistent = is_proposal & df["student project"].astype(str).str.strip().isin(["PhD,MSc", "PhD,PhD"])
+    return [SpreadsheetProblem(index + 2, "student project", "The value for student project is inconsistent. "
+                                                             "Please correct it")
+            for index in df.index[inconsistent.to_numpy()]]
+
+
+def science_type_problems(df, is_publication):
+    """
+    We find the publications whose type of science has a subject which isn't in science_taxonomy.SCIENCE_TYPES.
+    Every distinct type of science is only parsed once.
+    :param df: pandas dataframe with rows of the spreadsheet
+    :param is_publication: boolean series which is True for the rows with a publication
+    :return: list of SpreadsheetProblem
+    """
+    science_types = clean_column(df["type of science"])[is_publication].dropna()
+    unknown = {}
+    for science_type in science_types.unique():
+        try:
+            parse_science_type(science_type)
+        except ValueError as e:
+            unknown[science_type] = str(e)
+    bad = science_types[science_types.isin(list(unknown))]
+    return [SpreadsheetProblem(index + 2, "type of science", unknown[science_type])
+            for index, science_type in bad.items()]
+
+
+def validate_spreadsheet(df):
+    """
+    We check the rows of the spreadsheet against all the rules at once, a whole column at a time, so that every
+    problem can be fixed before the next run
+    :param df: pandas dataframe with the rows of the spreadsheet, indexed by row number - 2 and without the legend
+    :return: list of SpreadsheetProblem, ordered by row, which is empty if the spreadsheet has no problems
+    """
+    is_publication, blank = publication_rows(df)
+    # the rows after a publication without an author hold more of its proposals
+    is_proposal = (is_publication | blank) & (is_publication.cumsum() > 0)
+
+    problems = proposal_code_problems(df, is_proposal) + missing_month_problems(df, is_publication) + \
+        missing_ads_link_problems(df, is_publication) + student_project_problems(df, is_proposal) + \
+        science_type_problems(df, is_publication)
+    # sorted is stable, so the problems of a row stay in the order of the rules
+    return sorted(problems, key=lambda problem: problem.row)
+
+
+@staged("validate")
+def check_spreadsheet(df):
+    """
+    We raise an error listing all the problems of the spreadsheet, if it has any
+    :param df: pandas dataframe with the rows of the spreadsheet, indexed by row number - 2 and without the legend
+    :return:
+    """
+    problems = validate_spreadsheet(df)
+    if problems:
+        raise SpreadsheetValidationError(problems)
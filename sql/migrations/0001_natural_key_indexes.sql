@@ -0,0 +1,166 @@
+-- Unique indexes on the natural keys the loader looks rows up by, and unique keys on the link tables so that
+-- ON DUPLICATE KEY UPDATE deduplicates them. Rows which would break the new unique keys are merged into the row
+-- with the lowest id first. MySQL commits every schema change straight away, so the indexes and temporary Row_Id
+-- columns of a run which failed halfway are left behind; the migration skips the schema changes which have been made
+-- already when it is run again.
+
+CREATE TABLE IF NOT EXISTS IssuesForProposals(
+        Issue_Id INT PRIMARY KEY AUTO_INCREMENT,
+        Issue VARCHAR(100)
+);
+
+CREATE TABLE IF NOT EXISTS IssuesForPublications(
+        Issue_Id INT PRIMARY KEY AUTO_INCREMENT,
+        Issue VARCHAR(100)
+);
+
+-- Proposals with the same proposal code
+
+UPDATE StudentProjects s
+    JOIN Proposal p ON p.Proposal_Id = s.Proposal_Id
+    JOIN (SELECT ProposalCode, MIN(Proposal_Id) AS Proposal_Id FROM Proposal GROUP BY ProposalCode) k
+        ON k.ProposalCode = p.ProposalCode
+SET s.Proposal_Id = k.Proposal_Id;
+
+UPDATE TimeAllocatingPartner t
+    JOIN Proposal p ON p.Proposal_Id = t.Proposal_Id
+    JOIN (SELECT ProposalCode, MIN(Proposal_Id) AS Proposal_Id FROM Proposal GROUP BY ProposalCode) k
+        ON k.ProposalCode = p.ProposalCode
+SET t.Proposal_Id = k.Proposal_Id;
+
+UPDATE ProposalInstrumentUse u
+    JOIN Proposal p ON p.Proposal_Id = u.Proposal_Id
+    JOIN (SELECT ProposalCode, MIN(Proposal_Id) AS Proposal_Id FROM Proposal GROUP BY ProposalCode) k
+        ON k.ProposalCode = p.ProposalCode
+SET u.Proposal_Id = k.Proposal_Id;
+
+UPDATE ProposalIssues i
+    JOIN Proposal p ON p.Proposal_Id = i.Proposal_Id
+    JOIN (SELECT ProposalCode, MIN(Proposal_Id) AS Proposal_Id FROM Proposal GROUP BY ProposalCode) k
+        ON k.ProposalCode = p.ProposalCode
+SET i.Proposal_Id = k.Proposal_Id;
+
+DELETE a FROM Proposal a JOIN Proposal b ON a.ProposalCode = b.ProposalCode AND a.Proposal_Id > b.Proposal_Id;
+
+CREATE UNIQUE INDEX idx_proposalCode ON Proposal(ProposalCode);
+
+-- Science subjects with the same name
+
+UPDATE Publication p
+    JOIN ScienceSubject s ON s.ScienceSubject_Id = p.ScienceSubject_Id
+    JOIN (SELECT ScienceSubject, MIN(ScienceSubject_Id) AS ScienceSubject_Id FROM ScienceSubject
+          GROUP BY ScienceSubject) k
+        ON k.ScienceSubject = s.ScienceSubject
+SET p.ScienceSubject_Id = k.ScienceSubject_Id;
+
+DELETE a FROM ScienceSubject a
+    JOIN ScienceSubject b ON a.ScienceSubject = b.ScienceSubject AND a.ScienceSubject_Id > b.ScienceSubject_Id;
+
+CREATE UNIQUE INDEX idx_scienceSubject ON ScienceSubject(ScienceSubject);
+
+-- Publications with the same date, first author and ADS link. The date alone doesn't tell publications apart, as
+-- every publication date is the 15th of its month.
+
+UPDATE PublicationPartner l
+    JOIN Publication p ON p.Publication_Id = l.Publication_Id
+    JOIN (SELECT PublicationDate, FirstAuthor_Id, ADSLink, MIN(Publication_Id) AS Publication_Id FROM Publication
+          GROUP BY PublicationDate, FirstAuthor_Id, ADSLink) k
+        ON k.PublicationDate = p.PublicationDate AND k.FirstAuthor_Id = p.FirstAuthor_Id AND k.ADSLink = p.ADSLink
+SET l.Publication_Id = k.Publication_Id;
+
+UPDATE PublicationInstitute l
+    JOIN Publication p ON p.Publication_Id = l.Publication_Id
+    JOIN (SELECT PublicationDate, FirstAuthor_Id, ADSLink, MIN(Publication_Id) AS Publication_Id FROM Publication
+          GROUP BY PublicationDate, FirstAuthor_Id, ADSLink) k
+        ON k.PublicationDate = p.PublicationDate AND k.FirstAuthor_Id = p.FirstAuthor_Id AND k.ADSLink = p.ADSLink
+SET l.Publication_Id = k.Publication_Id;
+
+UPDATE ProposalInstrumentUse l
+    JOIN Publication p ON p.Publication_Id = l.Publication_Id
+    JOIN (SELECT PublicationDate, FirstAuthor_Id, ADSLink, MIN(Publication_Id) AS Publication_Id FROM Publication
+          GROUP BY PublicationDate, FirstAuthor_Id, ADSLink) k
+        ON k.PublicationDate = p.PublicationDate AND k.FirstAuthor_Id = p.FirstAuthor_Id AND k.ADSLink = p.ADSLink
+SET l.Publication_Id = k.Publication_Id;
+
+UPDATE PublicationIssues l
+    JOIN Publication p ON p.Publication_Id = l.Publication_Id
+    JOIN (SELECT PublicationDate, FirstAuthor_Id, ADSLink, MIN(Publication_Id) AS Publication_Id FROM Publication
+          GROUP BY PublicationDate, FirstAuthor_Id, ADSLink) k
+        ON k.PublicationDate = p.PublicationDate AND k.FirstAuthor_Id = p.FirstAuthor_Id AND k.ADSLink = p.ADSLink
+SET l.Publication_Id = k.Publication_Id;
+
+DELETE a FROM Publication a
+    JOIN Publication b ON a.PublicationDate = b.PublicationDate AND a.FirstAuthor_Id = b.FirstAuthor_Id
+                          AND a.ADSLink = b.ADSLink AND a.Publication_Id > b.Publication_Id;
+
+CREATE UNIQUE INDEX idx_publication ON Publication(PublicationDate, FirstAuthor_Id, ADSLink);
+
+-- Issues with the same description
+
+UPDATE ProposalIssues l
+    JOIN IssuesForProposals i ON i.Issue_Id = l.Issue_Id
+    JOIN (SELECT Issue, MIN(Issue_Id) AS Issue_Id FROM IssuesForProposals GROUP BY Issue) k ON k.Issue = i.Issue
+SET l.Issue_Id = k.Issue_Id;
+
+DELETE a FROM IssuesForProposals a JOIN IssuesForProposals b ON a.Issue = b.Issue AND a.Issue_Id > b.Issue_Id;
+
+CREATE UNIQUE INDEX idx_issue ON IssuesForProposals(Issue);
+
+UPDATE PublicationIssues l
+    JOIN IssuesForPublications i ON i.Issue_Id = l.Issue_Id
+    JOIN (SELECT Issue, MIN(Issue_Id) AS Issue_Id FROM IssuesForPublications GROUP BY Issue) k ON k.Issue = i.Issue
+SET l.Issue_Id = k.Issue_Id;
+
+DELETE a FROM IssuesForPublications a
+    JOIN IssuesForPublications b ON a.Issue = b.Issue AND a.Issue_Id > b.Issue_Id;
+
+CREATE UNIQUE INDEX idx_issue ON IssuesForPublications(Issue);
+
+-- The link tables have no id, so a temporary one tells their duplicate rows apart
+
+ALTER TABLE PublicationPartner ADD COLUMN Row_Id INT AUTO_INCREMENT PRIMARY KEY;
+DELETE a FROM PublicationPartner a
+    JOIN PublicationPartner b ON a.Publication_Id <=> b.Publication_Id AND a.Partner_Id <=> b.Partner_Id
+                                 AND a.Row_Id > b.Row_Id;
+ALTER TABLE PublicationPartner DROP COLUMN Row_Id;
+CREATE UNIQUE INDEX idx_publicationPartner ON PublicationPartner(Publication_Id, Partner_Id);
+
+ALTER TABLE PublicationInstitute ADD COLUMN Row_Id INT AUTO_INCREMENT PRIMARY KEY;
+DELETE a FROM PublicationInstitute a
+    JOIN PublicationInstitute b ON a.Publication_Id <=> b.Publication_Id AND a.Institute <=> b.Institute
+                                   AND a.Row_Id > b.Row_Id;
+ALTER TABLE PublicationInstitute DROP COLUMN Row_Id;
+CREATE UNIQUE INDEX idx_publicationInstitute ON PublicationInstitute(Publication_Id, Institute);
+
+ALTER TABLE StudentProjects ADD COLUMN Row_Id INT AUTO_INCREMENT PRIMARY KEY;
+DELETE a FROM StudentProjects a
+    JOIN StudentProjects b ON a.Proposal_Id <=> b.Proposal_Id AND a.Row_Id > b.Row_Id;
+ALTER TABLE StudentProjects DROP COLUMN Row_Id;
+CREATE UNIQUE INDEX idx_studentProjects ON StudentProjects(Proposal_Id);
+
+ALTER TABLE TimeAllocatingPartner ADD COLUMN Row_Id INT AUTO_INCREMENT PRIMARY KEY;
+DELETE a FROM TimeAllocatingPartner a
+    JOIN TimeAllocatingPartner b ON a.Proposal_Id <=> b.Proposal_Id AND a.Partner_Id <=> b.Partner_Id
+                                    AND a.Row_Id > b.Row_Id;
+ALTER TABLE TimeAllocatingPartner DROP COLUMN Row_Id;
+CREATE UNIQUE INDEX idx_timeAllocatingPartner ON TimeAllocatingPartner(Proposal_Id, Partner_Id);
+
+ALTER TABLE ProposalInstrumentUse ADD COLUMN Row_Id INT AUTO_INCREMENT PRIMARY KEY;
+DELETE a FROM ProposalInstrumentUse a
+    JOIN ProposalInstrumentUse b ON a.Publication_Id <=> b.Publication_Id AND a.Proposal_Id <=> b.Proposal_Id
+                                    AND a.InstrumentMode_Id <=> b.InstrumentMode_Id AND a.Row_Id > b.Row_Id;
+ALTER TABLE ProposalInstrumentUse DROP COLUMN Row_Id;
+CREATE UNIQUE INDEX idx_proposalInstrumentUse ON ProposalInstrumentUse(Publication_Id, Proposal_Id, InstrumentMode_Id);
+
+ALTER TABLE ProposalIssues ADD COLUMN Row_Id INT AUTO_INCREMENT PRIMARY KEY;
+DELETE a FROM ProposalIssues a
+    JOIN ProposalIssues b ON a.Proposal_Id <=> b.Proposal_Id AND a.Issue_Id <=> b.Issue_Id AND a.Row_Id > b.Row_Id;
+ALTER TABLE ProposalIssues DROP COLUMN Row_Id;
+CREATE UNIQUE INDEX idx_proposalIssues ON ProposalIssues(Proposal_Id, Issue_Id);
+
+ALTER TABLE PublicationIssues ADD COLUMN Row_Id INT AUTO_INCREMENT PRIMARY KEY;
+DELETE a FROM PublicationIssues a
+    JOIN PublicationIssues b ON a.Publication_Id <=> b.Publication_Id AND a.Issue_Id <=> b.Issue_Id
+                                AND a.Row_Id > b.Row_Id;
+ALTER TABLE PublicationIssues DROP COLUMN Row_Id;
+CREATE UNIQUE INDEX idx_publicationIssues ON PublicationIssues(Publication_Id, Issue_Id);
@@ -0,0 +1,10 @@
+-- The fingerprints of the publication records imported from the spreadsheet, so that an incremental import only
+-- touches the publications whose rows have changed. RecordKey identifies a record on the spreadsheet (its first
+-- author and ADS link), Fingerprint is the hash of everything imported for it.
+
+CREATE TABLE IF NOT EXISTS PublicationFingerprint(
+        RecordKey CHAR(64) PRIMARY KEY,
+        Fingerprint CHAR(64) NOT NULL,
+        Publication_Id INT,
+        FOREIGN KEY (Publication_Id) REFERENCES Publication(Publication_Id)
+);
@@ -0,0 +1,45 @@
+-- Staging tables for the set-based load path (staging_load.py). The cleaned publications and their proposal rows are
+-- bulk loaded into them and then merged into the normalized tables.
+
+CREATE TABLE IF NOT EXISTS StagingPublication(
+        Row_Id INT PRIMARY KEY,
+        Name VARCHAR(40),
+        AuthorPosition VARCHAR(40),
+        Partnership VARCHAR(40),
+        Institute VARCHAR(40),
+        PublicationDate DATE,
+        ADSLink VARCHAR(255),
+        PublicationType VARCHAR(40),
+        ScienceCategory VARCHAR(40),
+        ScienceSubject VARCHAR(30),
+        Explanation VARCHAR(100),
+        Authors TEXT,
+        NumberOfSAs INT,
+        Comments VARCHAR(255),
+        FirstAuthorBelonging BOOLEAN,
+        OtherAuthorsBelonging BOOLEAN,
+        PublicationIssue VARCHAR(100)
+);
+
+CREATE TABLE IF NOT EXISTS StagingProposal(
+        Row_Id INT PRIMARY KEY,
+        Publication_Row INT,
+        ProposalPosition INT,
+        ProposalCode VARCHAR(40),
+        PrincipalInvestigator VARCHAR(40),
+        TargetOfOpportunity BOOLEAN,
+        Institutes VARCHAR(40),
+        MSc_Projects INT,
+        PhD_Projects INT,
+        TimeAllocatingPartner VARCHAR(40),
+        Instrument VARCHAR(40),
+        InstrumentMode VARCHAR(30),
+        Year INT,
+        Semester INT,
+        ObservationDates DATE,
+        Priorities INT,
+        TotalSALTTime INT,
+        SALTTimeFraction FLOAT,
+        ProposalIssue VARCHAR(100),
+        INDEX idx_stagingPublicationRow (Publication_Row)
+);
@@ -0,0 +1,35 @@
+-- The summary tables of publication_statistics.py, which the reports read instead of aggregating the fact tables.
+-- The importer refreshes the groups of the years and semesters of the publications it has written or deleted;
+-- python publication_statistics.py --refresh fills them from scratch, as is needed once this migration is applied.
+
+CREATE TABLE IF NOT EXISTS PartnerStatistics(
+        Year INT,
+        Partner VARCHAR(40),
+        Publications INT,
+        FirstAuthorPublications INT,
+        OtherAuthorsPublications INT
+);
+
+CREATE TABLE IF NOT EXISTS ScienceCategoryStatistics(
+        Year INT,
+        ScienceCategory VARCHAR(40),
+        Publications INT
+);
+
+CREATE TABLE IF NOT EXISTS InstrumentModeStatistics(
+        Year INT,
+        Semester INT,
+        Instrument VARCHAR(40),
+        InstrumentMode VARCHAR(30),
+        Proposals INT,
+        TotalSALTTime BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS ProposalStatistics(
+        Year INT,
+        Semester INT,
+        Proposals INT,
+        TargetOfOpportunityProposals INT,
+        MScProjects INT,
+        PhDProjects INT
+);
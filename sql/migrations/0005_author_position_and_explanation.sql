@@ -0,0 +1,7 @@
+-- sql/tables.sql named the position of a first author Position, but the loader looks it up by AuthorPosition, and
+-- its science subject explanations were too short for explanations such as the one of "loc". The column of a
+-- database which has AuthorPosition already is left as it is.
+
+ALTER TABLE FirstAuthorPosition CHANGE COLUMN Position AuthorPosition VARCHAR(40);
+
+ALTER TABLE ScienceSubject MODIFY COLUMN Explanation VARCHAR(100);
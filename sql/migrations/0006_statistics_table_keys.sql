@@ -0,0 +1,10 @@
+-- Keys on the groups of the summary tables, which refresh_statistics deletes by year (and semester) on every import
+-- and the reports filter and order by.
+
+CREATE INDEX idx_partnerStatistics ON PartnerStatistics(Year, Partner);
+
+CREATE INDEX idx_scienceCategoryStatistics ON ScienceCategoryStatistics(Year, ScienceCategory);
+
+CREATE INDEX idx_instrumentModeStatistics ON InstrumentModeStatistics(Year, Semester, Instrument, InstrumentMode);
+
+CREATE INDEX idx_proposalStatistics ON ProposalStatistics(Year, Semester);
@@ -0,0 +1,200 @@
+-- The salt_stats tables of sql/tables.sql as changed by the schema migrations, in SQL which SQLite and DuckDB both
+-- run, for the embedded backends of storage_backends.py. An id column is declared as INTEGER PRIMARY KEY, which
+-- SQLite numbers by itself and DuckDB is given a sequence for. The natural keys the loader looks rows up by are
+-- unique keys, as the migrations make them; the upserts are deduplicated by them. The foreign keys are left out, as
+-- DuckDB can't update a row which other rows refer to.
+
+CREATE TABLE IF NOT EXISTS FirstAuthorPosition(
+        Position_Id INTEGER PRIMARY KEY,
+        AuthorPosition VARCHAR(40),
+        UNIQUE (AuthorPosition)
+);
+
+CREATE TABLE IF NOT EXISTS FirstAuthor(
+        FirstAuthor_Id INTEGER PRIMARY KEY,
+        Name VARCHAR(40),
+        Position_Id INTEGER,
+        UNIQUE (Name)
+);
+
+CREATE TABLE IF NOT EXISTS PublicationType(
+        PublicationType_Id INTEGER PRIMARY KEY,
+        PublicationType VARCHAR(40),
+        UNIQUE (PublicationType)
+);
+
+CREATE TABLE IF NOT EXISTS ScienceCategory(
+        ScienceCategory_Id INTEGER PRIMARY KEY,
+        ScienceCategory VARCHAR(40),
+        UNIQUE (ScienceCategory)
+);
+
+CREATE TABLE IF NOT EXISTS ScienceSubject(
+        ScienceSubject_Id INTEGER PRIMARY KEY,
+        ScienceCategory_Id INTEGER,
+        ScienceSubject VARCHAR(30),
+        Explanation VARCHAR(100),
+        UNIQUE (ScienceSubject)
+);
+
+CREATE TABLE IF NOT EXISTS Publication(
+        Publication_Id INTEGER PRIMARY KEY,
+        FirstAuthor_Id INTEGER,
+        PublicationDate DATE,
+        ADSLink VARCHAR(255),
+        PublicationType_Id INTEGER,
+        ScienceSubject_Id INTEGER,
+        Authors TEXT,
+        NumberOfSAs INTEGER,
+        Comments VARCHAR(255),
+        UNIQUE (PublicationDate, FirstAuthor_Id, ADSLink)
+);
+
+CREATE TABLE IF NOT EXISTS Partner(
+        Partner_Id INTEGER PRIMARY KEY,
+        Name VARCHAR(40),
+        UNIQUE (Name)
+);
+
+CREATE TABLE IF NOT EXISTS PublicationPartner(
+        Publication_Id INTEGER,
+        Partner_Id INTEGER,
+        FirstAuthorBelonging BOOLEAN,
+        OtherAuthorsBelonging BOOLEAN,
+        UNIQUE (Publication_Id, Partner_Id)
+);
+
+CREATE TABLE IF NOT EXISTS PublicationInstitute(
+        Publication_Id INTEGER,
+        Institute VARCHAR(40),
+        FirstAuthorBelonging BOOLEAN,
+        OtherAuthorsBelonging BOOLEAN,
+        UNIQUE (Publication_Id, Institute)
+);
+
+CREATE TABLE IF NOT EXISTS Proposal(
+        Proposal_Id INTEGER PRIMARY KEY,
+        ProposalCode VARCHAR(40),
+        PrincipalInvestigator VARCHAR(40),
+        TargetOfOpportunity BOOLEAN,
+        Institutes VARCHAR(40),
+        UNIQUE (ProposalCode)
+);
+
+CREATE TABLE IF NOT EXISTS StudentProjects(
+        Proposal_Id INTEGER,
+        MSc_Projects INTEGER,
+        PhD_Projects INTEGER,
+        UNIQUE (Proposal_Id)
+);
+
+CREATE TABLE IF NOT EXISTS TimeAllocatingPartner(
+        Partner_Id INTEGER,
+        Proposal_Id INTEGER,
+        UNIQUE (Proposal_Id, Partner_Id)
+);
+
+CREATE TABLE IF NOT EXISTS Instrument(
+        Instrument_Id INTEGER PRIMARY KEY,
+        Instrument VARCHAR(40),
+        UNIQUE (Instrument)
+);
+
+CREATE TABLE IF NOT EXISTS InstrumentMode(
+        InstrumentMode_Id INTEGER PRIMARY KEY,
+        Instrument_Id INTEGER,
+        Mode VARCHAR(30),
+        UNIQUE (Mode)
+);
+
+CREATE TABLE IF NOT EXISTS Semester(
+        Semester_Id INTEGER PRIMARY KEY,
+        Year INTEGER,
+        Semester INTEGER,
+        UNIQUE (Year, Semester)
+);
+
+CREATE TABLE IF NOT EXISTS ProposalInstrumentUse(
+        Publication_Id INTEGER,
+        Proposal_Id INTEGER,
+        InstrumentMode_Id INTEGER,
+        Semester_Id INTEGER,
+        ObservationDates DATE,
+        Priorities INTEGER,
+        TotalSALTTime INTEGER,
+        SALTTimeFraction FLOAT,
+        UNIQUE (Publication_Id, Proposal_Id, InstrumentMode_Id)
+);
+
+CREATE TABLE IF NOT EXISTS IssuesForProposals(
+        Issue_Id INTEGER PRIMARY KEY,
+        Issue VARCHAR(100),
+        UNIQUE (Issue)
+);
+
+CREATE TABLE IF NOT EXISTS IssuesForPublications(
+        Issue_Id INTEGER PRIMARY KEY,
+        Issue VARCHAR(100),
+        UNIQUE (Issue)
+);
+
+CREATE TABLE IF NOT EXISTS ProposalIssues(
+        Proposal_Id INTEGER,
+        Issue_Id INTEGER,
+        UNIQUE (Proposal_Id, Issue_Id)
+);
+
+CREATE TABLE IF NOT EXISTS PublicationIssues(
+        Publication_Id INTEGER,
+        Issue_Id INTEGER,
+        UNIQUE (Publication_Id, Issue_Id)
+);
+
+CREATE TABLE IF NOT EXISTS PublicationFingerprint(
+        RecordKey CHAR(64) PRIMARY KEY,
+        Fingerprint CHAR(64) NOT NULL,
+        Publication_Id INTEGER
+);
+
+-- The summary tables of publication_statistics.py
+
+CREATE TABLE IF NOT EXISTS PartnerStatistics(
+        Year INTEGER,
+        Partner VARCHAR(40),
+        Publications INTEGER,
+        FirstAuthorPublications INTEGER,
+        OtherAuthorsPublications INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS ScienceCategoryStatistics(
+        Year INTEGER,
+        ScienceCategory VARCHAR(40),
+        Publications INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS InstrumentModeStatistics(
+        Year INTEGER,
+        Semester INTEGER,
+        Instrument VARCHAR(40),
+        InstrumentMode VARCHAR(30),
+        Proposals INTEGER,
+        TotalSALTTime BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS ProposalStatistics(
+        Year INTEGER,
+        Semester INTEGER,
+        Proposals INTEGER,
+        TargetOfOpportunityProposals INTEGER,
+        MScProjects INTEGER,
+        PhDProjects INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_partnerStatistics ON PartnerStatistics(Year, Partner);
+
+CREATE INDEX IF NOT EXISTS idx_scienceCategoryStatistics ON ScienceCategoryStatistics(Year, ScienceCategory);
+
+CREATE INDEX IF NOT EXISTS idx_instrumentModeStatistics
+        ON InstrumentModeStatistics(Year, Semester, Instrument, InstrumentMode);
+
+CREATE INDEX IF NOT EXISTS idx_proposalStatistics ON ProposalStatistics(Year, Semester);
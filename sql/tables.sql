@@ -3,10 +3,10 @@ DROP TABLE IF EXISTS FirstAuthorPosition;
 
 CREATE  TABLE  FirstAuthorPosition(
         Position_Id  INT AUTO_INCREMENT PRIMARY KEY,
-        Position VARCHAR(40)
+        AuthorPosition VARCHAR(40)
 );
 
-CREATE UNIQUE INDEX idx_position ON FirstAuthorPosition(Position);
+CREATE UNIQUE INDEX idx_position ON FirstAuthorPosition(AuthorPosition);
 
 DROP TABLE IF EXISTS FirstAuthor;
 
@@ -42,7 +42,7 @@ CREATE TABLE  ScienceSubject(
         ScienceSubject_Id INT PRIMARY KEY AUTO_INCREMENT,
         ScienceCategory_Id INT,
         ScienceSubject VARCHAR(30),
-        Explanation VARCHAR(30),
+        Explanation VARCHAR(100),
         FOREIGN KEY (ScienceCategory_Id)REFERENCES ScienceCategory(ScienceCategory_Id)
 );
 
@@ -178,16 +178,3 @@ CREATE TABLE  PublicationIssues(
         Issue_Id INT,
         FOREIGN KEY (Publication_Id) REFERENCES Publication(Publication_Id)
 );
-
-
-CREATE TABLE ProposalIssues(
-        Proposal_Id INT,
-        Issue_Id INT,
-        FOREIGN KEY (Proposal_Id) REFERENCES Proposal(Proposal_Id)
-);
-
-CREATE TABLE PublicationIssues(
-        Publication_Id INT,
-        Issue_Id INT,
-        FOREIGN KEY (Publication_Id) REFERENCES Publication(Publication_Id)
-);
@@ -0,0 +1,9 @@
+def sql_statements(sql):
+    """
+    We split an SQL script, such as a migration or sql/portable_tables.sql, into its statements. The scripts have no
+    semicolons other than the ones ending the statements.
+    :param sql: The content of the script
+    :return: list of statements
+    """
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
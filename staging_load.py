@@ -0,0 +1,291 @@
+from connection_pool import shared_pool
+from database_configuration import DatabaseConfiguration
+from instrumentation import staged
+from reading_spreadsheet import find_proposal_semester, publication_information
+
+STAGING_PUBLICATION_COLUMNS = ["Row_Id", "Name", "AuthorPosition", "Partnership", "Institute", "PublicationDate",
+                               "ADSLink", "PublicationType", "ScienceCategory", "ScienceSubject", "Explanation",
+                               "Authors", "NumberOfSAs", "Comments", "FirstAuthorBelonging", "OtherAuthorsBelonging",
+                               "PublicationIssue"]
+
+STAGING_PROPOSAL_COLUMNS = ["Row_Id", "Publication_Row", "ProposalPosition", "ProposalCode", "PrincipalInvestigator",
+                            "TargetOfOpportunity", "Institutes", "MSc_Projects", "PhD_Projects",
+                            "TimeAllocatingPartner", "Instrument", "InstrumentMode", "Year", "Semester",
+                            "ObservationDates", "Priorities", "TotalSALTTime", "SALTTimeFraction", "ProposalIssue"]
+
+# The publication of a staged row, which is known by its date, first author and ADS link
+STAGED_PUBLICATION = """
+    StagingPublication s
+    JOIN FirstAuthor a ON a.Name = s.Name
+    JOIN Publication p ON p.PublicationDate = s.PublicationDate AND p.FirstAuthor_Id = a.FirstAuthor_Id
+                          AND p.ADSLink = s.ADSLink
+"""
+
+# The statements merging the staging tables into the normalized tables, in the order the tables refer to each other.
+# They make the same rows as salt_import.insert_publication_record, except that link rows whose publication,
+# proposal or partner can't be found are left out rather than inserted with a NULL id.
+MERGE_STATEMENTS = [
+    ("FirstAuthor", """
+    INSERT INTO FirstAuthor(Name, Position_Id)
+    SELECT s.Name, MAX(f.Position_Id)
+    FROM StagingPublication s LEFT JOIN FirstAuthorPosition f ON f.AuthorPosition = s.AuthorPosition
+    WHERE s.Name IS NOT NULL
+    GROUP BY s.Name
+    ON DUPLICATE KEY UPDATE FirstAuthor.Position_Id = VALUES(Position_Id)
+    """),
+    ("ScienceCategory", """
+    INSERT INTO ScienceCategory(ScienceCategory)
+    SELECT DISTINCT ScienceCategory FROM StagingPublication WHERE ScienceCategory IS NOT NULL
+    ON DUPLICATE KEY UPDATE ScienceCategory.ScienceCategory = VALUES(ScienceCategory)
+    """),
+    ("ScienceSubject", """
+    INSERT INTO ScienceSubject(ScienceCategory_Id, ScienceSubject, Explanation)
+    SELECT MAX(c.ScienceCategory_Id), s.ScienceSubject, MAX(s.Explanation)
+    FROM StagingPublication s JOIN ScienceCategory c ON c.ScienceCategory = s.ScienceCategory
+    WHERE s.ScienceSubject IS NOT NULL
+    GROUP BY s.ScienceSubject
+    ON DUPLICATE KEY UPDATE ScienceSubject.ScienceCategory_Id = VALUES(ScienceCategory_Id),
+                            ScienceSubject.Explanation = VALUES(Explanation)
+    """),
+    ("Partner", """
+    INSERT INTO Partner(Name)
+    SELECT DISTINCT Partnership FROM StagingPublication WHERE Partnership IS NOT NULL
+    ON DUPLICATE KEY UPDATE Partner.Name = VALUES(Name)
+    """),
+    ("Publication", """
+    INSERT INTO Publication(FirstAuthor_Id, PublicationDate, ADSLink, PublicationType_Id, ScienceSubject_Id, Authors,
+                            NumberOfSAs, Comments)
+    SELECT a.FirstAuthor_Id, s.PublicationDate, s.ADSLink, t.PublicationType_Id, ss.ScienceSubject_Id, s.Authors,
+           s.NumberOfSAs, s.Comments
+    FROM StagingPublication s
+    JOIN PublicationType t ON t.PublicationType = s.PublicationType
+    LEFT JOIN FirstAuthor a ON a.Name = s.Name
+    LEFT JOIN ScienceSubject ss ON ss.ScienceSubject = s.ScienceSubject
+    ORDER BY s.Row_Id
+    ON DUPLICATE KEY UPDATE Publication.PublicationType_Id = VALUES(PublicationType_Id),
+                            Publication.ScienceSubject_Id = VALUES(ScienceSubject_Id),
+                            Publication.Authors = VALUES(Authors),
+                            Publication.NumberOfSAs = VALUES(NumberOfSAs),
+                            Publication.Comments = VALUES(Comments)
+    """),
+    ("PublicationPartner", """
+    INSERT INTO PublicationPartner(Publication_Id, Partner_Id, FirstAuthorBelonging, OtherAuthorsBelonging)
+    SELECT p.Publication_Id, pa.Partner_Id, s.FirstAuthorBelonging, s.OtherAuthorsBelonging
+    FROM """ + STAGED_PUBLICATION + """
+    JOIN Partner pa ON pa.Name = s.Partnership
+    ON DUPLICATE KEY UPDATE PublicationPartner.FirstAuthorBelonging = VALUES(FirstAuthorBelonging),
+                            PublicationPartner.OtherAuthorsBelonging = VALUES(OtherAuthorsBelonging)
+    """),
+    ("PublicationInstitute", """
+    INSERT INTO PublicationInstitute(Publication_Id, Institute, FirstAuthorBelonging, OtherAuthorsBelonging)
+    SELECT p.Publication_Id, s.Institute, s.FirstAuthorBelonging, s.OtherAuthorsBelonging
+    FROM """ + STAGED_PUBLICATION + """
+    WHERE s.Partnership IS NOT NULL AND s.Institute IS NOT NULL
+    ON DUPLICATE KEY UPDATE PublicationInstitute.FirstAuthorBelonging = VALUES(FirstAuthorBelonging),
+                            PublicationInstitute.OtherAuthorsBelonging = VALUES(OtherAuthorsBelonging)
+    """),
+    ("Proposal", """
+    INSERT INTO Proposal(ProposalCode, PrincipalInvestigator, TargetOfOpportunity, Institutes)
+    SELECT ProposalCode, MAX(PrincipalInvestigator), MAX(TargetOfOpportunity), MAX(Institutes)
+    FROM StagingProposal
+    WHERE ProposalCode IS NOT NULL AND PrincipalInvestigator IS NOT NULL AND Institutes IS NOT NULL
+    GROUP BY ProposalCode
+    ON DUPLICATE KEY UPDATE Proposal.PrincipalInvestigator = VALUES(PrincipalInvestigator),
+                            Proposal.TargetOfOpportunity = VALUES(TargetOfOpportunity),
+                            Proposal.Institutes = VALUES(Institutes)
+    """),
+    ("StudentProjects", """
+    INSERT INTO StudentProjects(Proposal_Id, MSc_Projects, PhD_Projects)
+    SELECT p.Proposal_Id, MAX(s.MSc_Projects), MAX(s.PhD_Projects)
+    FROM StagingProposal s JOIN Proposal p ON p.ProposalCode = s.ProposalCode
+    GROUP BY p.Proposal_Id
+    ON DUPLICATE KEY UPDATE StudentProjects.MSc_Projects = VALUES(MSc_Projects),
+                            StudentProjects.PhD_Projects = VALUES(PhD_Projects)
+    """),
+    ("TimeAllocatingPartner", """
+    INSERT INTO TimeAllocatingPartner(Partner_Id, Proposal_Id)
+    SELECT DISTINCT pa.Partner_Id, p.Proposal_Id
+    FROM StagingProposal s
+    JOIN Proposal p ON p.ProposalCode = s.ProposalCode
+    JOIN Partner pa ON pa.Name = s.TimeAllocatingPartner
+    ON DUPLICATE KEY UPDATE TimeAllocatingPartner.Partner_Id = VALUES(Partner_Id)
+    """),
+    ("Instrument", """
+    INSERT INTO Instrument(Instrument)
+    SELECT DISTINCT Instrument FROM StagingProposal WHERE ProposalCode IS NOT NULL AND Instrument IS NOT NULL
+    ON DUPLICATE KEY UPDATE Instrument.Instrument = VALUES(Instrument)
+    """),
+    ("InstrumentMode", """
+    INSERT INTO InstrumentMode(Instrument_Id, Mode)
+    SELECT MAX(i.Instrument_Id), s.InstrumentMode
+    FROM StagingProposal s JOIN Instrument i ON i.Instrument = s.Instrument
+    WHERE s.ProposalCode IS NOT NULL AND s.InstrumentMode IS NOT NULL
+    GROUP BY s.InstrumentMode
+    ON DUPLICATE KEY UPDATE InstrumentMode.Instrument_Id = VALUES(Instrument_Id)
+    """),
+    ("Semester", """
+    INSERT INTO Semester(Year, Semester)
+    SELECT DISTINCT Year, Semester FROM StagingProposal
+    WHERE ProposalCode IS NOT NULL AND Year IS NOT NULL AND Semester IS NOT NULL
+    ON DUPLICATE KEY UPDATE Semester.Year = VALUES(Year)
+    """),
+    # the instrument use of the staged publications is replaced, as a row whose mode has changed wouldn't be updated
+    ("ProposalInstrumentUse", """
+    DELETE u FROM ProposalInstrumentUse u
+    JOIN (SELECT DISTINCT p.Publication_Id FROM """ + STAGED_PUBLICATION + """) k ON k.Publication_Id = u.Publication_Id
+    """),
+    ("ProposalInstrumentUse", """
+    INSERT INTO ProposalInstrumentUse(Publication_Id, Proposal_Id, InstrumentMode_Id, Semester_Id, ObservationDates,
+                                      Priorities, TotalSALTTime, SALTTimeFraction)
+    SELECT p.Publication_Id, pr.Proposal_Id, m.InstrumentMode_Id, se.Semester_Id, sp.ObservationDates,
+           sp.Priorities, sp.TotalSALTTime, sp.SALTTimeFraction
+    FROM """ + STAGED_PUBLICATION + """
+    JOIN StagingProposal sp ON sp.Publication_Row = s.Row_Id
+        AND (sp.ProposalCode IS NOT NULL
+             OR (sp.ProposalPosition = 0 AND NOT EXISTS (SELECT 1 FROM StagingProposal c
+                                                         WHERE c.Publication_Row = s.Row_Id
+                                                               AND c.ProposalCode IS NOT NULL)))
+    LEFT JOIN Proposal pr ON pr.ProposalCode = sp.ProposalCode
+    LEFT JOIN InstrumentMode m ON m.Mode = sp.InstrumentMode
+    LEFT JOIN Semester se ON se.Year = sp.Year AND se.Semester = sp.Semester
+    ON DUPLICATE KEY UPDATE ProposalInstrumentUse.Semester_Id = VALUES(Semester_Id),
+                            ProposalInstrumentUse.ObservationDates = VALUES(ObservationDates),
+                            ProposalInstrumentUse.Priorities = VALUES(Priorities),
+                            ProposalInstrumentUse.TotalSALTTime = VALUES(TotalSALTTime),
+                            ProposalInstrumentUse.SALTTimeFraction = VALUES(SALTTimeFraction)
+    """),
+    ("IssuesForProposals", """
+    INSERT INTO IssuesForProposals(Issue)
+    SELECT DISTINCT ProposalIssue FROM StagingProposal WHERE ProposalCode IS NOT NULL AND ProposalIssue IS NOT NULL
+    ON DUPLICATE KEY UPDATE IssuesForProposals.Issue = VALUES(Issue)
+    """),
+    ("IssuesForPublications", """
+    INSERT INTO IssuesForPublications(Issue)
+    SELECT DISTINCT PublicationIssue FROM StagingPublication WHERE PublicationIssue IS NOT NULL
+    ON DUPLICATE KEY UPDATE IssuesForPublications.Issue = VALUES(Issue)
+    """),
+    ("ProposalIssues", """
+    INSERT INTO ProposalIssues(Proposal_Id, Issue_Id)
+    SELECT DISTINCT p.Proposal_Id, i.Issue_Id
+    FROM StagingProposal s
+    JOIN Proposal p ON p.ProposalCode = s.ProposalCode
+    JOIN IssuesForProposals i ON i.Issue = s.ProposalIssue
+    ON DUPLICATE KEY UPDATE ProposalIssues.Issue_Id = VALUES(Issue_Id)
+    """),
+    ("PublicationIssues", """
+    INSERT INTO PublicationIssues(Publication_Id, Issue_Id)
+    SELECT DISTINCT p.Publication_Id, i.Issue_Id
+    FROM """ + STAGED_PUBLICATION + """
+    JOIN IssuesForPublications i ON i.Issue = s.PublicationIssue
+    ON DUPLICATE KEY UPDATE PublicationIssues.Issue_Id = VALUES(Issue_Id)
+    """),
+]
+
+
+def staging_rows(records, proposal_information):
+    """
+    We flatten the publications read by read_spreadsheet into the rows of the staging tables, with the SDB
+    information of the proposals filled in
+    :param records: The publications read by read_spreadsheet
+    :param proposal_information: The SDB information fetched by prefetch_proposal_information
+    :return: list of StagingPublication rows and list of StagingProposal rows, as dicts
+    """
+    publications = []
+    proposals = []
+    for row_id, values in enumerate(records):
+        paper = publication_information(values["Publication Paper"])
+        publications.append({
+            "Row_Id": row_id,
+            "Name": values["Name"],
+            "AuthorPosition": values["Position of 1st author"],
+            "Partnership": values["Partnership of 1st author"],
+            "Institute": values["Institute of 1st author"],
+            "PublicationDate": paper["Publication date"],
+            "ADSLink": values["ADS link"],
+            "PublicationType": paper["Type of paper"],
+            "ScienceCategory": paper["Type of Science"],
+            "ScienceSubject": paper["Science subject"],
+            "Explanation": paper["Science explanation"],
+            "Authors": paper["Full author list"],
+            "NumberOfSAs": paper["No of SA"],
+            "Comments": paper["Comments"],
+            "FirstAuthorBelonging": paper["First Author Belonging"],
+            "OtherAuthorsBelonging": paper["Other Author Belonging"],
+            "PublicationIssue": paper["publication issue"],
+        })
+
+        for position, proposal in enumerate(values["Proposal code(s)"]):
+            proposal_code = proposal["Proposal code"]
+            information = proposal_information.get(proposal_code, {}) if proposal_code else {}
+            semester = find_proposal_semester(proposal["proposal semester"], proposal_code, proposal_information)
+            proposals.append({
+                "Row_Id": len(proposals),
+                "Publication_Row": row_id,
+                "ProposalPosition": position,
+                "ProposalCode": proposal_code,
+                "PrincipalInvestigator": information.get("PI"),
+                "TargetOfOpportunity": information.get("target of opportunity"),
+                "Institutes": information.get("institutes"),
+                "MSc_Projects": proposal["master's student"],
+                "PhD_Projects": proposal["phd student"],
+                "TimeAllocatingPartner": proposal["Partner(time allocated)"],
+                "Instrument": proposal["Instrument(s)"],
+                "InstrumentMode": proposal["Instrument mode(s)"],
+                "Year": semester.get("year"),
+                "Semester": semester.get("semester"),
+                "ObservationDates": proposal["observation date"],
+                "Priorities": proposal["Priorities"],
+                "TotalSALTTime": proposal["Total SALT time"],
+                "SALTTimeFraction": proposal["Fraction of total time"],
+                "ProposalIssue": proposal["proposal issue"] if proposal_code else None,
+            })
+    return publications, proposals
+
+
+def staging_insert(table, columns):
+    return "INSERT INTO {table}({columns}) VALUES ({values})".format(
+        table=table, columns=", ".join(columns), values=", ".join("%({})s".format(column) for column in columns))
+
+
+class StagingLoader:
+    """
+    A load path for the salt_stats database which bulk loads the cleaned publications into staging tables and then
+    fills the normalized tables with the fixed sequence of set-based statements in MERGE_STATEMENTS, so that the
+    number of statements does not depend on the number of publications. The staging tables are created by the
+    schema migrations.
+    Parameters
+    ----------
+    database_config : DatabaseConfiguration
+        The configuration of the salt_stats database.
+    """
+
+    def __init__(self, database_config: DatabaseConfiguration) -> None:
+        self._pool = shared_pool(database_config)
+
+    @staged("staging_load")
+    def load(self, records, proposal_information, chunk_size: int = 1000) -> None:
+        """
+        Load publications into the salt_stats database, all in one transaction.
+        :param records: The publications read by read_spreadsheet
+        :param proposal_information: The SDB information fetched by prefetch_proposal_information
+        :param chunk_size: Number of staging rows sent in one multi-row insert
+        :return:
+        """
+        publications, proposals = staging_rows(records, proposal_information)
+        with self._pool.connection() as connection:
+            try:
+                with connection.cursor() as cur:
+                    cur.execute("DELETE FROM StagingProposal")
+                    cur.execute("DELETE FROM StagingPublication")
+                    for table, columns, rows in [("StagingPublication", STAGING_PUBLICATION_COLUMNS, publications),
+                                                 ("StagingProposal", STAGING_PROPOSAL_COLUMNS, proposals)]:
+                        sql = staging_insert(table, columns)
+                        # executemany sends the rows as multi-row inserts
+                        for start in range(0, len(rows), chunk_size):
+                            cur.executemany(sql, rows[start:start + chunk_size])
+                    for _, sql in MERGE_STATEMENTS:
+                        cur.execute(sql)
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
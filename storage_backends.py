@@ -0,0 +1,388 @@
+import abc
+import datetime
+import functools
+import os
+import re
+import sqlite3
+from connection_pool import shared_pool
+from database_configuration import DatabaseConfiguration
+from instrumentation import instrumented_cursor
+from sql_scripts import sql_statements
+
+# The schema of the embedded backends, the tables of sql/tables.sql as changed by the schema migrations
+PORTABLE_TABLES_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql", "portable_tables.sql")
+
+# The placeholders of MySQLdb statements, %(name)s and %s, and an escaped percent sign
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+# An id column of the portable schema, which SQLite numbers by itself
+_ID_COLUMN = re.compile(r"CREATE TABLE IF NOT EXISTS (\w+)\s*\(\s*(\w+) INTEGER PRIMARY KEY", re.I)
+
+
+class StorageBackend(abc.ABC):
+    """
+    The database DatabaseInsertion writes the salt_stats tables to. A backend makes the connections and writes the
+    upserts, the only statements whose syntax differs between the databases. Everything else DatabaseInsertion runs
+    is plain SQL with MySQLdb placeholders, which the connections of the embedded backends translate.
+    """
+
+    # whether the lastrowid of an upsert is the id of the row, also if it updated an existing row
+    upsert_sets_lastrowid = False
+
+    @abc.abstractmethod
+    def name(self) -> str:
+        """
+        The name of the database, for the instrumentation.
+        Returns
+        -------
+        str
+            The name of the database.
+        """
+
+    @abc.abstractmethod
+    def connect(self):
+        """
+        A connection to the database, which is given back with its close method.
+        :return: The connection
+        """
+
+    @abc.abstractmethod
+    def upsert_sql(self, table, columns, key_columns, update_columns=(), id_column=None) -> str:
+        """
+        An insert which updates the row with the same unique key instead if there is one. Its parameters are the
+        values of the columns, in their order, as %s placeholders.
+        :param table: The table
+        :param columns: The columns the values are inserted into
+        :param key_columns: The columns of the unique key
+        :param update_columns: The columns updated on an existing row, the others keep their values
+        :param id_column: The id column of the table, if the id of the row must be the lastrowid of the statement
+        :return: The statement
+        """
+
+    @abc.abstractmethod
+    def year_sql(self, expression) -> str:
+        """
+        The year of a date, as an integer.
+        :param expression: The SQL expression of the date
+        :return: The SQL expression of the year
+        """
+
+
+class MySQLBackend(StorageBackend):
+    """
+    The salt_stats database on a MySQL server, with connections checked out of its shared pool. The database is
+    created with sql/tables.sql and the schema migrations.
+    Parameters
+    ----------
+    database_config : DatabaseConfiguration
+        The configuration of the database.
+    """
+
+    upsert_sets_lastrowid = True
+
+    def __init__(self, database_config: DatabaseConfiguration) -> None:
+        self._database_config = database_config
+
+    def name(self) -> str:
+        return self._database_config.database()
+
+    def database_config(self) -> DatabaseConfiguration:
+        """
+        The configuration of the database.
+        Returns
+        -------
+        DatabaseConfiguration
+            The database configuration.
+        """
+
+        return self._database_config
+
+    def connect(self):
+        return shared_pool(self._database_config).checkout()
+
+    def upsert_sql(self, table, columns, key_columns, update_columns=(), id_column=None) -> str:
+        updates = ["{0} = VALUES({0})".format(column) for column in update_columns]
+        if id_column is not None:
+            # LAST_INSERT_ID(id) makes the id of an updated row the lastrowid too
+            updates.insert(0, "{0} = LAST_INSERT_ID({0})".format(id_column))
+        else:
+            # executemany turns the statement into a multi-row insert by repeating its VALUES list, which it finds
+            # with a regular expression that a clause ending with VALUES(column) would confuse
+            updates.append("{0} = {0}".format(key_columns[0]))
+        return "INSERT INTO {table}({columns}) VALUES ({values}) ON DUPLICATE KEY UPDATE {updates}".format(
+            table=table, columns=", ".join(columns), values=", ".join(["%s"] * len(columns)),
+            updates=", ".join(updates))
+
+    def year_sql(self, expression) -> str:
+        return "YEAR({})".format(expression)
+
+
+class EmbeddedBackend(StorageBackend):
+    """
+    A database in a local file. The tables of sql/portable_tables.sql which it doesn't have yet are created whenever it
+    is connected to.
+    Parameters
+    ----------
+    path : str
+        Path of the database file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+
+    def name(self) -> str:
+        return os.path.basename(self._path)
+
+    @abc.abstractmethod
+    def _open(self):
+        """
+        A connection of the database's own driver to the database file.
+        :return: The connection
+        """
+
+    def schema_statements(self, sql):
+        """
+        The statements creating the tables of the portable schema in this database
+        :param sql: The content of sql/portable_tables.sql
+        :return: list of statements
+        """
+
+        return sql_statements(sql)
+
+    def connect(self):
+        connection = EmbeddedConnection(self, self._open())
+        with open(PORTABLE_TABLES_SQL) as f:
+            statements = self.schema_statements(f.read())
+        with connection.cursor() as cur:
+            for statement in statements:
+                cur.execute(statement)
+        connection.commit()
+        return connection
+
+    def value(self, value):
+        """
+        A parameter value as the database driver takes it. Values of numpy types, as pandas gives them, are turned
+        into the Python values MySQLdb would send.
+        :param value: The value
+        :return: The value for the driver
+        """
+
+        if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+            return value.item()
+        return value
+
+    def upsert_sql(self, table, columns, key_columns, update_columns=(), id_column=None) -> str:
+        # the ids of the rows are looked up by their natural key afterwards, see upsert_sets_lastrowid
+        if update_columns:
+            action = "DO UPDATE SET " + ", ".join("{0} = excluded.{0}".format(column) for column in update_columns)
+        else:
+            action = "DO NOTHING"
+        return "INSERT INTO {table}({columns}) VALUES ({values}) ON CONFLICT ({keys}) {action}".format(
+            table=table, columns=", ".join(columns), values=", ".join(["%s"] * len(columns)),
+            keys=", ".join(key_columns), action=action)
+
+
+class SQLiteBackend(EmbeddedBackend):
+    """
+    The salt_stats tables in an SQLite database file.
+    Parameters
+    ----------
+    path : str
+        Path of the database file, ":memory:" for a database which only lives as long as its connection.
+    """
+
+    def _open(self):
+        return sqlite3.connect(self._path)
+
+    def year_sql(self, expression) -> str:
+        # the dates are strings starting with the year, see value
+        return "CAST(substr({}, 1, 4) AS INTEGER)".format(expression)
+
+    def value(self, value):
+        value = super().value(value)
+        # SQLite has no date type, dates are kept as the strings MySQL would show them as
+        if isinstance(value, datetime.datetime):
+            return value.date().isoformat() if value.time() == datetime.time() else value.isoformat(" ")
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        return value
+
+
+class DuckDBBackend(EmbeddedBackend):
+    """
+    The salt_stats tables in a DuckDB database file, for analytics. The duckdb package is only needed for this
+    backend.
+    Parameters
+    ----------
+    path : str
+        Path of the database file.
+    """
+
+    def _open(self):
+        try:
+            import duckdb
+        except ImportError:
+            raise ValueError("The duckdb package is needed for a DuckDB database, install it with pip install duckdb")
+        connection = duckdb.connect(self._path)
+        # DuckDB commits every statement by itself unless a transaction has been begun
+        connection.begin()
+        return connection
+
+    def year_sql(self, expression) -> str:
+        return "year({})".format(expression)
+
+    def schema_statements(self, sql):
+        statements = []
+        for statement in super().schema_statements(sql):
+            match = _ID_COLUMN.match(statement)
+            if match:
+                # DuckDB numbers the rows with a sequence
+                table, id_column = match.groups()
+                statements.append("CREATE SEQUENCE IF NOT EXISTS {}_Sequence".format(table))
+                statement = statement.replace(
+                    "{} INTEGER PRIMARY KEY".format(id_column),
+                    "{} INTEGER PRIMARY KEY DEFAULT nextval('{}_Sequence')".format(id_column, table), 1)
+            statements.append(statement)
+        return statements
+
+
+@functools.lru_cache(maxsize=1024)
+def _qmark_statement(sql):
+    """
+    A statement with MySQLdb placeholders, with ? placeholders instead
+    :param sql: The statement
+    :return: The statement and the names of its named placeholders, in their order
+    """
+    names = []
+
+    def placeholder(match):
+        if match.group(0) == "%%":
+            return "%"
+        names.append(match.group(1))
+        return "?"
+
+    return _PLACEHOLDER.sub(placeholder, sql), names
+
+
+class EmbeddedCursor:
+    """
+    A cursor of an embedded database which takes the statements and parameters MySQLdb would.
+    Parameters
+    ----------
+    backend : EmbeddedBackend
+        The backend of the database.
+    cursor : Cursor
+        The cursor of the database driver.
+    """
+
+    def __init__(self, backend, cursor) -> None:
+        self._backend = backend
+        self._cursor = cursor
+        self.rowcount = -1
+        # the ids of upserted rows are looked up by their natural key
+        self.lastrowid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        return iter(self._cursor.fetchall())
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def _statement(self, query, args):
+        sql, names = _qmark_statement(query)
+        if isinstance(args, dict):
+            args = [args[name] for name in names]
+        return sql, tuple(self._backend.value(value) for value in args)
+
+    def execute(self, query, args=None):
+        if args is None:
+            self._cursor.execute(query)
+        else:
+            self._cursor.execute(*self._statement(query, args))
+        self.rowcount = getattr(self._cursor, "rowcount", -1)
+
+    def executemany(self, query, args):
+        args = list(args)
+        if not args:
+            return
+        sql = _qmark_statement(query)[0]
+        self._cursor.executemany(sql, [self._statement(query, row)[1] for row in args])
+        self.rowcount = len(args)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+
+class EmbeddedConnection:
+    """
+    A connection to an embedded database, which works like the pooled MySQL connections: its cursors take MySQLdb
+    statements, and closing it rolls back anything not committed.
+    Parameters
+    ----------
+    backend : EmbeddedBackend
+        The backend of the database.
+    connection : Connection
+        The connection of the database driver.
+    """
+
+    def __init__(self, backend, connection) -> None:
+        self._backend = backend
+        self._connection = connection
+        self._begins = isinstance(backend, DuckDBBackend)
+
+    def cursor(self):
+        # a DuckDB cursor is a connection of its own, with a transaction of its own, so statements are run on the
+        # connection itself
+        cursor = self._connection if self._begins else self._connection.cursor()
+        return instrumented_cursor(EmbeddedCursor(self._backend, cursor), self._backend.name())
+
+    def commit(self) -> None:
+        self._connection.commit()
+        if self._begins:
+            self._connection.begin()
+
+    def rollback(self) -> None:
+        self._connection.rollback()
+        if self._begins:
+            self._connection.begin()
+
+    def ping(self) -> bool:
+        """
+        An embedded database can't go away, so there is nothing to check.
+        :return: False
+        """
+
+        return False
+
+    def close(self) -> None:
+        self._connection.rollback()
+        self._connection.close()
+
+
+def storage_backend(name, database_config: DatabaseConfiguration = None) -> StorageBackend:
+    """
+    The backend with a name such as mysql, sqlite:salt_stats.sqlite or duckdb:salt_stats.duckdb
+    :param name: mysql, or sqlite or duckdb followed by a colon and the path of the database file
+    :param database_config: The configuration of the database for mysql
+    :return: The backend
+    """
+    kind, _, path = name.partition(":")
+    if kind == "mysql" and not path:
+        if database_config is None:
+            raise ValueError("The mysql backend needs the configuration of the database")
+        return MySQLBackend(database_config)
+    if kind == "sqlite" and path:
+        return SQLiteBackend(path)
+    if kind == "duckdb" and path:
+        return DuckDBBackend(path)
+    raise ValueError("Unknown storage backend {}, use mysql, sqlite:<path> or duckdb:<path>".format(name))
@@ -0,0 +1,10 @@
+import pytest
+from benchmarks.generate_spreadsheet import generate_spreadsheet
+
+
+@pytest.fixture(scope="session")
+def generated_spreadsheet(tmp_path_factory):
+    # a small synthetic spreadsheet, with the legend colors, continuation rows and legend of the real one
+    path = str(tmp_path_factory.mktemp("spreadsheets") / "publications.xlsx")
+    generate_spreadsheet(path, 0.1)
+    return path
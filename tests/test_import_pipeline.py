@@ -0,0 +1,43 @@
+import openpyxl
+import pytest
+import salt_import
+from benchmarks.generate_spreadsheet import generate_spreadsheet
+from salt_import import run_import
+from spreadsheet_validation import SpreadsheetValidationError
+from storage_backends import SQLiteBackend
+from test_storage_backends import fake_proposal_information, query
+
+
+def without_ads_links(path, rows):
+    workbook = openpyxl.load_workbook(path)
+    sheet = workbook["Sheet1"]
+    column = [cell.value for cell in sheet[1]].index("ADS link") + 1
+    for row in rows:
+        sheet.cell(row=row, column=column).value = None
+    workbook.save(path)
+
+
+def publication_rows(path):
+    sheet = openpyxl.load_workbook(path)["Sheet1"]
+    column = [cell.value for cell in sheet[1]].index("ADS link") + 1
+    return [row for row in range(2, sheet.max_row + 1)
+            if sheet.cell(row=row, column=1).value and sheet.cell(row=row, column=column).value]
+
+
+def test_pipeline_reports_the_problems_of_every_chunk(tmp_path, monkeypatch):
+    monkeypatch.setattr(salt_import, "prefetch_proposal_information", fake_proposal_information)
+    path = str(tmp_path / "publications.xlsx")
+    generate_spreadsheet(path, 0.1)
+    rows = publication_rows(path)
+    broken = [rows[0], rows[-1]]
+    without_ads_links(path, broken)
+    backend = SQLiteBackend(str(tmp_path / "salt_stats.sqlite"))
+
+    with pytest.raises(SpreadsheetValidationError) as error:
+        run_import(path, cache_directory=None, pipeline=True, chunk_size=10, batch_size=5, backend=backend)
+    with pytest.raises(SpreadsheetValidationError) as whole_sheet_error:
+        run_import(path, cache_directory=None, backend=backend)
+
+    assert [problem.row for problem in error.value.problems] == broken
+    assert error.value.problems == whole_sheet_error.value.problems
+    assert query(backend, "SELECT COUNT(*) FROM Publication") == [(0,)]
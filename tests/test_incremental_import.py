@@ -0,0 +1,97 @@
+import copy
+import pytest
+from database_insertion import DatabaseInsertion
+from salt_import import import_incrementally, insert_position_of_first_author, insert_type_of_publication
+from storage_backends import SQLiteBackend
+
+
+def proposal(code):
+    return {"Proposal code": code, "proposal semester": 2019.1, "ToO": "no", "PI": "Smith",
+            "Partner(time allocated)": "RSA", "Institutes (on proposal)": "UCT", "master's student": 0,
+            "phd student": 1, "student project": None,
+            "Instrument(s)": "RSS", "Instrument mode(s)": "Imaging", "observation date": "2019-06-01",
+            "Priorities": 2.0, "Total SALT time": 3600.0, "Fraction of total time": 50.0, "Flag": None,
+            "proposal issue": "No issue found"}
+
+
+def publication(name, ads_link, code):
+    return {"Name": name, "ADS link": ads_link, "Institute of 1st author": "UCT", "Position of 1st author": "Staff",
+            "Partnership of 1st author": "RSA", "Proposal code(s)": [proposal(code)],
+            "Publication Paper": [{"Publication date": "2019-07-15", "Full author list": name + ", Jones",
+                                   "Partners (on paper)": "RSA",
+                                   "Institutes of partners (on paper, excl 1st author)": "UCT", "No of SA": 1.0,
+                                   "Comments": None, "No of papers": 1.0, "Type of paper": "science",
+                                   "Type of Science": "stars", "Science subject": "stars",
+                                   "Science explanation": "stars", "First Author Belonging": True,
+                                   "Other Author Belonging": False, "publication issue": "No issue found"}]}
+
+
+PROPOSAL_INFORMATION = {code: {"PI": "Smith", "institutes": "UCT", "target of opportunity": 0, "year": 2019,
+                               "semester": 1, "master's student": 0, "phd student": 1}
+                        for code in ["2019-1-SCI-001", "2019-1-SCI-002", "2019-1-SCI-003"]}
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteBackend(str(tmp_path / "salt_stats.sqlite"))
+
+
+def run_import(backend, records):
+    salt_stats = DatabaseInsertion(backend=backend)
+    try:
+        insert_type_of_publication(salt_stats)
+        insert_position_of_first_author(salt_stats)
+        with salt_stats.batch(100):
+            return import_incrementally(salt_stats, records, PROPOSAL_INFORMATION)
+    finally:
+        salt_stats.close()
+
+
+def query(backend, sql):
+    connection = backend.connect()
+    try:
+        with connection.cursor() as cur:
+            cur.execute(sql)
+            return cur.fetchall()
+    finally:
+        connection.close()
+
+
+def dangling_fingerprints(backend):
+    return query(backend, """SELECT COUNT(*) FROM PublicationFingerprint f
+                             LEFT JOIN Publication p ON p.Publication_Id = f.Publication_Id
+                             WHERE p.Publication_Id IS NULL""")[0][0]
+
+
+def test_ads_link_edited_between_runs(backend):
+    records = [publication("Smith", "https://ui.adsabs.harvard.edu/abs/2019MNRAS.001", "2019-1-SCI-001"),
+               publication("Jones", "https://ui.adsabs.harvard.edu/abs/2019MNRAS.002", "2019-1-SCI-002")]
+    run_import(backend, records)
+
+    edited = copy.deepcopy(records)
+    edited[0]["ADS link"] = "https://ui.adsabs.harvard.edu/abs/2019MNRAS.003"
+    counts = run_import(backend, edited)
+
+    assert counts == {"inserted": 1, "replaced": 0, "deleted": 1, "unchanged": 1}
+    assert query(backend, "SELECT COUNT(*) FROM Publication")[0][0] == 2
+    assert query(backend, "SELECT ADSLink FROM Publication ORDER BY ADSLink") == \
+        [("https://ui.adsabs.harvard.edu/abs/2019MNRAS.002",), ("https://ui.adsabs.harvard.edu/abs/2019MNRAS.003",)]
+    assert dangling_fingerprints(backend) == 0
+
+
+def test_changed_publication_sharing_its_row_with_an_unchanged_one(backend):
+    # the same publication appears twice on the spreadsheet, with different proposals
+    records = [publication("Smith", "https://ui.adsabs.harvard.edu/abs/2019MNRAS.001", "2019-1-SCI-001"),
+               publication("Smith", "https://ui.adsabs.harvard.edu/abs/2019MNRAS.001", "2019-1-SCI-002")]
+    run_import(backend, records)
+
+    changed = copy.deepcopy(records)
+    changed[1]["Proposal code(s)"][0]["Total SALT time"] = 7200.0
+    counts = run_import(backend, changed)
+
+    assert counts == {"inserted": 0, "replaced": 1, "deleted": 0, "unchanged": 1}
+    assert query(backend, "SELECT COUNT(*) FROM Publication")[0][0] == 1
+    assert dangling_fingerprints(backend) == 0
+    assert query(backend, """SELECT p.ProposalCode, u.TotalSALTTime FROM ProposalInstrumentUse u
+                             JOIN Proposal p ON p.Proposal_Id = u.Proposal_Id ORDER BY p.ProposalCode""") == \
+        [("2019-1-SCI-001", 3600), ("2019-1-SCI-002", 7200)]
@@ -0,0 +1,33 @@
+from legend import BROWN, GREY, LEGEND, NONE, RED, YELLOW, StyleClassifier
+from xlsx_style_reader import StyledCell
+
+
+def cell(font_rgb, fill_rgb, style_id):
+    return StyledCell(row=2, column=1, value="x", font_rgb=font_rgb, fill_rgb=fill_rgb, style_id=style_id)
+
+
+def test_colors_of_more_than_one_category_are_added_up():
+    classifier = StyleClassifier()
+
+    assert classifier.colors("FFB7B7B7", "FFFFF2CC") == GREY | YELLOW
+    assert classifier.colors("FF783F04", None) == BROWN
+    assert classifier.colors("FF000000", "FFFFFFFF") == NONE
+
+
+def test_cells_are_classified_by_their_style():
+    classifier = StyleClassifier()
+
+    assert classifier.classify(cell("FFFF0000", None, 3)) == RED
+    # a cell with a style which has been seen is classified by its style id alone
+    assert classifier.classify(cell(None, None, 3)) == RED
+    assert classifier.classify(cell("FFFF0000", None, None)) == RED
+    assert classifier.classify(cell(None, None, None)) == NONE
+
+
+def test_legend_can_be_given():
+    legend = dict(LEGEND)
+    legend[GREY] = {"font": ["FF123456"]}
+    classifier = StyleClassifier(legend)
+
+    assert classifier.colors("FF123456", None) == GREY
+    assert classifier.colors("FFB7B7B7", None) == NONE
@@ -0,0 +1,65 @@
+import copy
+import pytest
+from database_insertion import DatabaseInsertion
+from publication_statistics import PublicationStatistics
+from salt_import import import_incrementally, insert_position_of_first_author, insert_type_of_publication
+from storage_backends import SQLiteBackend
+from test_incremental_import import PROPOSAL_INFORMATION, publication
+
+
+def dated(record, publication_date, semester):
+    record = copy.deepcopy(record)
+    record["Publication Paper"][0]["Publication date"] = publication_date
+    record["Proposal code(s)"][0]["proposal semester"] = semester
+    return record
+
+
+def import_and_refresh(backend, records):
+    salt_stats = DatabaseInsertion(backend=backend)
+    try:
+        insert_type_of_publication(salt_stats)
+        insert_position_of_first_author(salt_stats)
+        with salt_stats.batch(100):
+            import_incrementally(salt_stats, records, PROPOSAL_INFORMATION)
+            # only the years and semesters of the publications written or deleted are refreshed
+            salt_stats.refresh_statistics()
+    finally:
+        salt_stats.close()
+
+
+def reports(statistics):
+    return [statistics.publications_per_partner(), statistics.publications_per_science_category(),
+            statistics.salt_time_per_instrument_mode(), statistics.proposal_statistics()]
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteBackend(str(tmp_path / "salt_stats.sqlite"))
+
+
+def test_incremental_refresh_gives_the_rows_of_a_full_refresh(backend):
+    records = [dated(publication("Smith", "https://ui.adsabs.harvard.edu/abs/2018MNRAS.001", "2019-1-SCI-001"),
+                     "2018-03-15", 2018.1),
+               dated(publication("Jones", "https://ui.adsabs.harvard.edu/abs/2019MNRAS.002", "2019-1-SCI-002"),
+                     "2019-07-15", 2019.1),
+               dated(publication("Brown", "https://ui.adsabs.harvard.edu/abs/2019MNRAS.003", "2019-1-SCI-003"),
+                     "2019-10-15", 2019.2)]
+    import_and_refresh(backend, records)
+
+    # one publication moves to another year and semester, one is deleted and one is added
+    changed = [dated(records[0], "2020-01-15", 2019.2), records[1],
+               dated(publication("Green", "https://ui.adsabs.harvard.edu/abs/2020MNRAS.004", "2019-1-SCI-001"),
+                     "2020-05-15", 2020.1)]
+    import_and_refresh(backend, changed)
+
+    statistics = PublicationStatistics(backend=backend)
+    try:
+        incremental = reports(statistics)
+        statistics.refresh()
+        full = reports(statistics)
+    finally:
+        statistics.close()
+
+    assert all(incremental)
+    assert incremental == full
+    assert [row["Year"] for row in full[1]] == [2019, 2020]
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+from salt_time_credit import credit_allocations, credit_per_group
+
+USE_COLUMNS = ["Publication_Id", "Proposal_Id", "Instrument", "Mode", "TotalSALTTime", "SALTTimeFraction"]
+
+
+def credits(uses, allocations):
+    return credit_allocations(pd.DataFrame(uses, columns=USE_COLUMNS),
+                              pd.DataFrame(allocations, columns=["Proposal_Id", "Name"]))
+
+
+def test_proposal_with_two_modes_counts_its_time_once():
+    allocated = credits([(1, 1, "RSS", "LS", 100.0, np.nan), (1, 1, "RSS", "MOS", 100.0, np.nan)], [(1, "RSA")])
+
+    per_instrument = credit_per_group(allocated, "Instrument", ["Proposal_Id", "Mode", "Partner"])
+    per_partner = credit_per_group(allocated, "Partner", ["Proposal_Id", "Mode"])
+
+    assert per_instrument[["Instrument", "Publications", "SALTTime"]].values.tolist() == [["RSS", 1.0, 100.0]]
+    assert per_instrument["PublicationsPerSALTTime"].tolist() == [pytest.approx(0.01)]
+    assert per_partner[["Partner", "Publications", "SALTTime"]].values.tolist() == [["RSA", 1.0, 100.0]]
+
+
+def test_instrument_and_partner_time_add_up_to_the_same():
+    # the proposal used one mode for the first publication and two for the second, and has two partners
+    allocated = credits([(1, 1, "RSS", "LS", 100.0, np.nan),
+                         (2, 1, "RSS", "LS", 100.0, np.nan), (2, 1, "HRS", "HR", 100.0, np.nan),
+                         (2, 2, "SALTICAM", "Imaging", 50.0, 40.0)],
+                        [(1, "RSA"), (1, "UW"), (2, "RSA")])
+
+    per_instrument = credit_per_group(allocated, "Instrument", ["Proposal_Id", "Mode", "Partner"])
+    per_partner = credit_per_group(allocated, "Partner", ["Proposal_Id", "Mode"])
+
+    assert per_instrument["SALTTime"].sum() == pytest.approx(150.0)
+    assert per_partner["SALTTime"].sum() == pytest.approx(150.0)
+    assert per_instrument["Publications"].sum() == pytest.approx(2.0)
+    assert per_partner["Publications"].sum() == pytest.approx(2.0)
+    assert dict(zip(per_instrument["Instrument"], per_instrument["SALTTime"])) == \
+        {"HRS": pytest.approx(50.0), "RSS": pytest.approx(50.0), "SALTICAM": pytest.approx(50.0)}
@@ -0,0 +1,85 @@
+import pytest
+from schema_migrations import LOADER_LOOKUPS, available_migrations, full_table_scans, schema_change_made
+from sql_scripts import sql_statements
+from storage_backends import SQLiteBackend
+
+
+class PlanCursor:
+    """
+    A cursor which answers EXPLAIN with the plans of a MySQL server, and the information_schema queries with the
+    indexes and columns it is given.
+    """
+
+    def __init__(self, plans=None, schema=()):
+        self._plans = plans or {}
+        self._schema = set(schema)
+        self._rows = []
+        self.description = [("id",), ("table",), ("type",), ("key",)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, parameters=None):
+        if sql.startswith("EXPLAIN "):
+            self._rows = self._plans.get(sql[len("EXPLAIN "):], [(1, "t", "ref", "idx")])
+        else:
+            self._rows = [(int(tuple(parameters) in self._schema),)]
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0]
+
+
+class PlanConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+def test_full_table_scans_lists_the_lookups_which_scan_a_table():
+    description, sql, _ = LOADER_LOOKUPS[1]
+    connection = PlanConnection(PlanCursor({sql: [(1, "Proposal", "ALL", None)]}))
+
+    assert full_table_scans(connection) == ["{} (table Proposal)".format(description)]
+    assert full_table_scans(PlanConnection(PlanCursor())) == []
+
+
+def test_loader_lookups_use_an_index(tmp_path):
+    # the portable schema has the same unique keys as the migrated MySQL schema
+    connection = SQLiteBackend(str(tmp_path / "salt_stats.sqlite")).connect()
+    try:
+        with connection.cursor() as cur:
+            for description, sql, parameters in LOADER_LOOKUPS:
+                cur.execute("EXPLAIN QUERY PLAN " + sql, parameters)
+                assert not [row for row in cur.fetchall() if row[-1].startswith("SCAN")], description
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize("statement, schema, made", [
+    ("CREATE UNIQUE INDEX idx_proposalCode ON Proposal(ProposalCode)", [("Proposal", "idx_proposalCode")], True),
+    ("CREATE UNIQUE INDEX idx_proposalCode ON Proposal(ProposalCode)", [], False),
+    ("ALTER TABLE StudentProjects ADD COLUMN Row_Id INT AUTO_INCREMENT PRIMARY KEY",
+     [("StudentProjects", "Row_Id")], True),
+    ("ALTER TABLE StudentProjects DROP COLUMN Row_Id", [("StudentProjects", "Row_Id")], False),
+    ("ALTER TABLE StudentProjects DROP COLUMN Row_Id", [], True),
+    ("ALTER TABLE FirstAuthorPosition CHANGE COLUMN Position AuthorPosition VARCHAR(40)", [], True),
+    ("DELETE FROM Proposal WHERE Proposal_Id > 1", [], False),
+])
+def test_schema_changes_which_have_been_made_are_skipped(statement, schema, made):
+    assert schema_change_made(PlanCursor(schema=schema), statement) is made
+
+
+def test_migrations_split_into_statements():
+    for version, name, path in available_migrations():
+        with open(path) as f:
+            statements = sql_statements(f.read())
+        assert statements, name
+        assert not [statement for statement in statements if statement.startswith("--")], name
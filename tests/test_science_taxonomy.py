@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+from science_taxonomy import SCIENCE_TYPES, classify_science_types, parse_science_type, \
+    science_subject_and_explanation
+
+
+@pytest.mark.parametrize("science_type, subject", [
+    ("agn", "agn"),
+    (" agn ", "agn"),
+    ("exg-agn", "agn"),
+    ("exg-r-gal", "r-gal"),
+    ("Gal-*cl", "*cl"),
+])
+def test_parse_science_type(science_type, subject):
+    assert parse_science_type(science_type) == (subject, SCIENCE_TYPES[subject])
+
+
+def test_unknown_subject_is_an_error():
+    with pytest.raises(ValueError, match="Unknown science subject 'xyz'"):
+        parse_science_type("exg-xyz")
+
+
+@pytest.mark.parametrize("science_type", [None, float("nan"), "--"])
+def test_no_science_type(science_type):
+    assert science_subject_and_explanation(science_type) == {"subject": None, "explanation": None}
+
+
+def test_classify_science_types_keeps_the_index_and_order():
+    column = pd.Series(["exg-agn", None, "tde", "exg-agn", "--"], index=[7, 3, 5, 9, 2])
+
+    classified = classify_science_types(column)
+
+    assert list(classified.index) == [7, 3, 5, 9, 2]
+    assert classified.notnull().all(axis=1).tolist() == [True, False, True, True, False]
+    assert classified["subject"].dropna().tolist() == ["agn", "tde", "agn"]
+    assert classified["explanation"].dropna().tolist() == [SCIENCE_TYPES["agn"], SCIENCE_TYPES["tde"],
+                                                           SCIENCE_TYPES["agn"]]
@@ -0,0 +1,63 @@
+import random
+import time
+import pytest
+import sdb_queries
+from sdb_queries import PREFETCH_QUERIES, prefetch_proposal_information
+
+# The rows the SDB has for each query, with the codes spelt the way the SDB spells them
+SDB_ROWS = {
+    "theses": [{"Proposal_Code": "2019-1-SCI-001", "ThesisType_Id": 1, "numbers": 2},
+               {"Proposal_Code": "2019-1-SCI-001", "ThesisType_Id": 2, "numbers": 1},
+               {"Proposal_Code": "2019-2-SCI-003", "ThesisType_Id": 2, "numbers": 3}],
+    "institutes": [{"Proposal_Code": "2019-1-SCI-001", "Institute": "UCT", "TargetOfOpportunity": 0},
+                   {"Proposal_Code": "2019-1-SCI-001", "Institute": "SAAO", "TargetOfOpportunity": 0},
+                   {"Proposal_Code": "2019-1-SCI-001", "Institute": "UCT", "TargetOfOpportunity": 0},
+                   {"Proposal_Code": "2019-2-SCI-003", "Institute": "IUCAA", "TargetOfOpportunity": 1}],
+    "investigators": [{"Proposal_Code": "2019-1-SCI-001", "ProposalInvestigator": "Smith John"},
+                      {"Proposal_Code": "2019-1-SCI-001", "ProposalInvestigator": "Jones Mary"},
+                      {"Proposal_Code": "2019-2-SCI-003", "ProposalInvestigator": "Brown Anna"}],
+    "semesters": [{"Proposal_Code": "2019-1-SCI-001", "Year": 2019, "Semester": 1},
+                  {"Proposal_Code": "2019-2-SCI-003", "Year": 2019, "Semester": 2}],
+}
+
+KINDS = {sql: kind for kind, sql in PREFETCH_QUERIES.items()}
+
+
+def fake_fetch_chunk(sql, proposal_codes):
+    # MySQL compares the codes ignoring case and trailing spaces
+    codes = {code.rstrip().lower() for code in proposal_codes}
+    # the queries finish in any order
+    time.sleep(random.random() / 100)
+    return [row for row in SDB_ROWS[KINDS[sql]] if row["Proposal_Code"].lower() in codes]
+
+
+@pytest.fixture(autouse=True)
+def fake_sdb(monkeypatch):
+    monkeypatch.setattr(sdb_queries, "fetch_chunk", fake_fetch_chunk)
+    monkeypatch.setattr(sdb_queries, "sdb_pool", lambda max_size=None: None)
+
+
+def test_information_of_the_proposal_codes():
+    information = prefetch_proposal_information(["2019-1-SCI-001", None, "2019-2-sci-003 ", "2019-1-SCI-001",
+                                                 "2020-1-SCI-999"])
+
+    assert list(information) == ["2019-1-SCI-001", "2019-2-sci-003 ", "2020-1-SCI-999"]
+    assert information["2019-1-SCI-001"] == {"master's student": 1, "phd student": 2, "institutes": "UCT,SAAO",
+                                             "target of opportunity": 0, "PI": "Smith John", "year": 2019,
+                                             "semester": 1}
+    # the SDB spells the code differently
+    assert information["2019-2-sci-003 "] == {"master's student": 3, "phd student": 0, "institutes": "IUCAA",
+                                              "target of opportunity": 1, "PI": "Brown Anna", "year": 2019,
+                                              "semester": 2}
+    # the SDB doesn't know the proposal
+    assert information["2020-1-SCI-999"] == {"master's student": 0, "phd student": 0, "institutes": None,
+                                             "target of opportunity": None, "PI": None, "year": None,
+                                             "semester": None}
+
+
+def test_concurrent_queries_give_the_information_of_queries_one_after_the_other():
+    codes = ["2019-1-SCI-001", "2019-1-sci-001", "2019-2-SCI-003", "2020-1-SCI-999", "2019-2-SCI-003 "]
+
+    sequential = prefetch_proposal_information(codes, chunk_size=1)
+    for _ in range(5):
+        assert prefetch_proposal_information(codes, chunk_size=1, max_workers=4) == sequential
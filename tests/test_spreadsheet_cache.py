@@ -0,0 +1,55 @@
+import shutil
+import openpyxl
+from legend import GREY, LEGEND
+from salt_import import flagged_snapshot
+from spreadsheet_cache import SpreadsheetCache
+
+
+def test_unchanged_spreadsheet_is_loaded_from_the_cache(tmp_path, generated_spreadsheet):
+    cache_directory = str(tmp_path / "cache")
+    snapshot = flagged_snapshot(generated_spreadsheet, cache_directory=cache_directory)
+
+    cached = SpreadsheetCache(cache_directory).load(generated_spreadsheet)
+
+    assert cached is not None
+    assert cached.dataframe().equals(snapshot.dataframe())
+    assert cached.flags() == snapshot.flags()
+    assert flagged_snapshot(generated_spreadsheet, cache_directory=cache_directory).dataframe().equals(
+        snapshot.dataframe())
+
+
+def test_changed_spreadsheet_is_not_loaded_from_the_cache(tmp_path, generated_spreadsheet):
+    path = str(tmp_path / "publications.xlsx")
+    shutil.copy(generated_spreadsheet, path)
+    cache = SpreadsheetCache(str(tmp_path / "cache"))
+    flagged_snapshot(path, cache_directory=cache.directory())
+
+    workbook = openpyxl.load_workbook(path)
+    workbook["Sheet1"].cell(row=2, column=7).value = "https://ui.adsabs.harvard.edu/abs/changed"
+    workbook.save(path)
+
+    assert cache.load(path) is None
+    snapshot = flagged_snapshot(path, cache_directory=cache.directory())
+    assert snapshot.dataframe()["ADS link"][0] == "https://ui.adsabs.harvard.edu/abs/changed"
+    # the entry of the old spreadsheet has been replaced
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+    assert cache.load(path) is not None
+
+
+def test_other_legend_is_not_loaded_from_the_cache(tmp_path, generated_spreadsheet):
+    cache = SpreadsheetCache(str(tmp_path / "cache"))
+    flagged_snapshot(generated_spreadsheet, cache_directory=cache.directory())
+    legend = dict(LEGEND)
+    legend[GREY] = {"font": ["FF123456"]}
+
+    assert cache.load(generated_spreadsheet, legend=legend) is None
+    assert cache.load(generated_spreadsheet) is not None
+
+
+def test_damaged_entry_is_a_miss(tmp_path, generated_spreadsheet):
+    cache = SpreadsheetCache(str(tmp_path / "cache"))
+    flagged_snapshot(generated_spreadsheet, cache_directory=cache.directory())
+    for entry in (tmp_path / "cache").iterdir():
+        entry.write_bytes(b"not a pickle")
+
+    assert cache.load(generated_spreadsheet) is None
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+from reading_spreadsheet import AUTHOR_COLUMN
+from spreadsheet_validation import SpreadsheetProblem, SpreadsheetValidationError, check_spreadsheet, \
+    validate_spreadsheet
+
+
+def row(author, code="2019-1-SCI-001", year=2019, month="Jul", ads_link="https://ui.adsabs.harvard.edu/abs/x",
+        student_project=None, science_type="agn"):
+    return {AUTHOR_COLUMN: author, "Proposal code(s)": code, "Year": year, "Month (the ADS 'pub date')": month,
+            "ADS link": ads_link, "student project": student_project, "type of science": science_type}
+
+
+def spreadsheet(rows):
+    # the first row of the sheet holds the column names, so the dataframe's index is the row number - 2
+    return pd.DataFrame(rows, index=range(len(rows)))
+
+
+def test_valid_spreadsheet_has_no_problems():
+    df = spreadsheet([row("Smith"), row(None, code="2019-1-SCI-002", science_type=None), row("Jones")])
+
+    assert validate_spreadsheet(df) == []
+    check_spreadsheet(df)
+
+
+def test_problems_have_the_row_numbers_shown_by_excel():
+    df = spreadsheet([
+        row("-- 2019 --", code=None, year=None, month=None, ads_link=None, science_type=None),
+        row("Smith", month=None),
+        row(None, code="2019-1-SCI-002 and 2019-1-SCI-003", ads_link=None, science_type=None),
+        row("Jones", ads_link=" ", student_project="PhD,MSc"),
+        row("Brown", code="2019-SCI-004", science_type="unknown"),
+    ])
+
+    problems = validate_spreadsheet(df)
+
+    assert [(problem.row, problem.column) for problem in problems] == [
+        (3, "Month (the ADS 'pub date')"),
+        (4, "Proposal code(s)"),
+        (5, "ADS link"),
+        (5, "student project"),
+        (6, "Proposal code(s)"),
+        (6, "type of science"),
+    ]
+    assert problems[0] == SpreadsheetProblem(3, "Month (the ADS 'pub date')", "The Month was not added. Please add it")
+    assert problems[1].message == "Incorrect proposal code '2019-1-SCI-002 and 2019-1-SCI-003'"
+    assert problems[2].message == "The ADS link was not added. Please add it"
+    assert problems[4].message == "Incorrect proposal code '2019-SCI-004'"
+
+
+def test_rows_before_the_first_publication_are_not_checked():
+    df = spreadsheet([
+        row("discarded papers:", code="wrong", month=None, ads_link=None, student_project="PhD,PhD",
+            science_type="unknown"),
+        row(None, code="wrong", student_project="PhD,PhD"),
+        row("Smith"),
+    ])
+
+    assert validate_spreadsheet(df) == []
+
+
+def test_check_spreadsheet_lists_every_problem():
+    df = spreadsheet([row("Smith", month=None), row("Jones", ads_link=None)])
+
+    with pytest.raises(SpreadsheetValidationError) as e:
+        check_spreadsheet(df)
+
+    assert e.value.problems == validate_spreadsheet(df)
+    assert len(e.value.problems) == 2
+    assert "row 2: The Month was not added" in str(e.value)
+    assert "row 3: The ADS link was not added" in str(e.value)
@@ -0,0 +1,73 @@
+import pytest
+import salt_import
+from backend_comparison import compare_backends
+from benchmarks.generate_spreadsheet import generate_spreadsheet
+from salt_import import run_import
+from storage_backends import DuckDBBackend, SQLiteBackend
+
+
+def fake_proposal_information(proposal_codes, **kwargs):
+    return {code: {"master's student": len(str(code)) % 3, "phd student": len(str(code)) % 2,
+                   "institutes": "University of Cape Town", "target of opportunity": 0, "PI": "Smith",
+                   "year": 2019, "semester": 1}
+            for code in proposal_codes if code is not None}
+
+
+@pytest.fixture
+def spreadsheet(tmp_path, monkeypatch):
+    # the SDB isn't needed for the comparison
+    monkeypatch.setattr(salt_import, "prefetch_proposal_information", fake_proposal_information)
+    path = str(tmp_path / "publications.xlsx")
+    generate_spreadsheet(path, 0.1)
+    return path
+
+
+def query(backend, sql, args=None):
+    connection = backend.connect()
+    try:
+        with connection.cursor() as cur:
+            cur.execute(sql, args)
+            return cur.fetchall()
+    finally:
+        connection.close()
+
+
+def test_placeholders_are_translated(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "salt_stats.sqlite"))
+
+    assert query(backend, "SELECT %(b)s, %(a)s, %(a)s, '5%%'", {"a": 1, "b": 2}) == [(2, 1, 1, "5%")]
+    assert query(backend, "SELECT %s, %s", (1, "x")) == [(1, "x")]
+
+
+def test_upsert_updates_the_row_with_the_same_key(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "salt_stats.sqlite"))
+    sql = backend.upsert_sql("Proposal", ["ProposalCode", "PrincipalInvestigator"], ["ProposalCode"],
+                             ["PrincipalInvestigator"])
+    connection = backend.connect()
+    try:
+        with connection.cursor() as cur:
+            cur.execute(sql, ("2019-1-SCI-001", "Smith"))
+            cur.execute(sql, ("2019-1-SCI-001", "Jones"))
+        connection.commit()
+    finally:
+        connection.close()
+
+    assert query(backend, "SELECT ProposalCode, PrincipalInvestigator FROM Proposal") == [("2019-1-SCI-001", "Jones")]
+
+
+def test_sqlite_databases_have_identical_rows(tmp_path, spreadsheet):
+    backends = [SQLiteBackend(str(tmp_path / "first.sqlite")), SQLiteBackend(str(tmp_path / "second.sqlite"))]
+    for backend in backends:
+        run_import(spreadsheet, cache_directory=None, backend=backend)
+
+    assert query(backends[0], "SELECT COUNT(*) FROM Publication")[0][0] > 0
+    assert [differences for _, differences in compare_backends(backends)] == [[]]
+
+
+def test_sqlite_and_duckdb_have_identical_rows(tmp_path, spreadsheet):
+    pytest.importorskip("duckdb")
+    backends = [SQLiteBackend(str(tmp_path / "salt_stats.sqlite")), DuckDBBackend(str(tmp_path / "salt_stats.duckdb"))]
+    for backend in backends:
+        run_import(spreadsheet, cache_directory=None, backend=backend)
+
+    assert [differences for _, differences in compare_backends(backends)] == [[]]
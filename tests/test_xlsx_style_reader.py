@@ -0,0 +1,33 @@
+from reading_spreadsheet import create_dataframe
+from spreadsheet_snapshot import SpreadsheetSnapshot
+from xlsx_style_reader import column_number
+
+
+def flagged(path, engine):
+    snapshot = SpreadsheetSnapshot(path, engine=engine)
+    df = snapshot.dataframe()
+    create_dataframe(snapshot, 1, df.shape[-1], df.shape[0])
+    return snapshot
+
+
+def test_column_number():
+    assert [column_number(letters) for letters in ["A", "Z", "AA", "AB", "BA"]] == [1, 26, 27, 28, 53]
+
+
+def test_stream_engine_reads_the_colors_openpyxl_reads(generated_spreadsheet):
+    def colors(engine):
+        # the stream engine only reads the cells the sheet has, openpyxl also gives the empty ones between them
+        return {(cell.row, cell.column): (cell.font_rgb, cell.fill_rgb)
+                for cell in SpreadsheetSnapshot(generated_spreadsheet, engine=engine).styled_cells()
+                if cell.value is not None}
+
+    assert colors("stream") == colors("openpyxl")
+
+
+def test_stream_engine_flags_the_rows_openpyxl_flags(generated_spreadsheet):
+    stream = flagged(generated_spreadsheet, "stream")
+    workbook = flagged(generated_spreadsheet, "openpyxl")
+
+    assert stream.flags()
+    assert stream.flags() == workbook.flags()
+    assert stream.dataframe()["Flag"].equals(workbook.dataframe()["Flag"])
@@ -0,0 +1,287 @@
+import posixpath
+import re
+import zipfile
+from collections import namedtuple
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601
+
+try:
+    from lxml.etree import iterparse
+except ImportError:
+    from xml.etree.ElementTree import iterparse
+
+MAIN_NAMESPACE = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIP_NAMESPACE = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_RELATIONSHIP_NAMESPACE = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# A cell of a sheet with its value, the rgb colors of its font and fill and the id of its style, such as
+# StyledCell(row=12, column=3, value="2019-1-SCI-001", font_rgb="FFB7B7B7", fill_rgb=None, style_id=7)
+StyledCell = namedtuple("StyledCell", ["row", "column", "value", "font_rgb", "fill_rgb", "style_id"])
+
+
+def column_number(column_letters):
+    """
+    The number of a column from its letters, such as 28 for "AB"
+    :param column_letters: The column letters
+    :return: The column number
+    """
+    number = 0
+    for letter in column_letters:
+        number = number * 26 + ord(letter) - ord("A") + 1
+    return number
+
+
+def cell_value(cell_type, value, inline_string, shared_strings):
+    """
+    We convert the value of a cell as stored in the sheet XML, the way openpyxl does except that numbers with a date
+    format are left as numbers, see XlsxStyleReader.cells
+    :param cell_type: The type of the cell (the t attribute)
+    :param value: The text of the v element of the cell
+    :param inline_string: The text of an inline string
+    :param shared_strings: The shared strings of the workbook
+    :return: The value
+    """
+    if cell_type == "inlineStr":
+        return inline_string
+    if value is None:
+        return None
+    if cell_type == "s":
+        return shared_strings[int(value)]
+    if cell_type == "b":
+        return bool(int(value))
+    if cell_type == "d":
+        return from_ISO8601(value)
+    if cell_type in ("str", "e"):
+        return value
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+class XlsxStyleReader:
+    """
+    A reader for the cells of an xlsx sheet and the colors of their font and fill, which streams the sheet XML rather
+    than building the full openpyxl object model. The styles and shared strings are read once; the rows of the sheet
+    are then parsed and discarded one at a time, so the memory used does not grow with the sheet.
+    Parameters
+    ----------
+    filepath : str
+        Path of the xlsx file.
+    sheet_name : str
+        Name of the sheet to read.
+    """
+
+    def __init__(self, filepath: str, sheet_name: str = "Sheet1") -> None:
+        self._filepath = filepath
+        self._sheet_name = sheet_name
+        with zipfile.ZipFile(filepath) as archive:
+            self._sheet_path = self._find_sheet_path(archive, sheet_name)
+            self._epoch = self._read_epoch(archive)
+            self._styles = self._read_styles(archive)
+            self._date_styles, self._timedelta_styles = self._read_date_styles(archive)
+            self._shared_strings = self._read_shared_strings(archive)
+
+    @staticmethod
+    def _find_sheet_path(archive, sheet_name):
+        """
+        The path of the XML of a sheet in the xlsx archive.
+        :param archive: The xlsx zip file
+        :param sheet_name: Name of the sheet
+        :return: The path of the sheet XML
+        """
+        relationship_id = None
+        with archive.open("xl/workbook.xml") as f:
+            for _, element in iterparse(f):
+                if element.tag == MAIN_NAMESPACE + "sheet" and element.get("name") == sheet_name:
+                    relationship_id = element.get(RELATIONSHIP_NAMESPACE + "id")
+                    break
+        if relationship_id is None:
+            raise ValueError("There is no sheet '{}' in the workbook".format(sheet_name))
+
+        with archive.open("xl/_rels/workbook.xml.rels") as f:
+            for _, element in iterparse(f):
+                if element.tag == PACKAGE_RELATIONSHIP_NAMESPACE + "Relationship" and \
+                        element.get("Id") == relationship_id:
+                    target = element.get("Target")
+                    if target.startswith("/"):
+                        return target[1:]
+                    return posixpath.normpath(posixpath.join("xl", target))
+        raise ValueError("The workbook has no XML for the sheet '{}'".format(sheet_name))
+
+    @staticmethod
+    def _read_epoch(archive):
+        """
+        The date the serial numbers of the dates of the workbook count from.
+        :param archive: The xlsx zip file
+        :return: The epoch, as openpyxl gives it
+        """
+        with archive.open("xl/workbook.xml") as f:
+            for _, element in iterparse(f):
+                if element.tag == MAIN_NAMESPACE + "workbookPr":
+                    if element.get("date1904") in ("1", "true"):
+                        return CALENDAR_MAC_1904
+                    break
+        return CALENDAR_WINDOWS_1900
+
+    @staticmethod
+    def _read_date_styles(archive):
+        """
+        The cell styles of the workbook whose number format is a date or a duration, the numbers of which openpyxl
+        converts to datetimes and timedeltas.
+        :param archive: The xlsx zip file
+        :return: set of the style ids with a date format and set of the style ids with a duration format
+        """
+        if "xl/styles.xml" not in archive.namelist():
+            return set(), set()
+
+        custom_formats = {}
+        date_styles = set()
+        timedelta_styles = set()
+        with archive.open("xl/styles.xml") as f:
+            for _, element in iterparse(f):
+                if element.tag == MAIN_NAMESPACE + "numFmt":
+                    custom_formats[int(element.get("numFmtId"))] = element.get("formatCode")
+                elif element.tag == MAIN_NAMESPACE + "cellXfs":
+                    for style_id, xf in enumerate(element.findall(MAIN_NAMESPACE + "xf")):
+                        number_format_id = int(xf.get("numFmtId", 0))
+                        number_format = custom_formats.get(number_format_id, BUILTIN_FORMATS.get(number_format_id))
+                        if number_format is not None and is_date_format(number_format):
+                            date_styles.add(style_id)
+                        if number_format is not None and is_timedelta_format(number_format):
+                            timedelta_styles.add(style_id)
+        return date_styles, timedelta_styles
+
+    @staticmethod
+    def _read_styles(archive):
+        """
+        The font and fill rgb colors of every cell style of the workbook.
+        :param archive: The xlsx zip file
+        :return: list of (font rgb, fill rgb) tuples, indexed by style id
+        """
+        if "xl/styles.xml" not in archive.namelist():
+            return []
+
+        font_colors = []
+        fill_colors = []
+        styles = []
+        with archive.open("xl/styles.xml") as f:
+            for _, element in iterparse(f):
+                if element.tag == MAIN_NAMESPACE + "font":
+                    color = element.find(MAIN_NAMESPACE + "color")
+                    font_colors.append(color.get("rgb") if color is not None else None)
+                elif element.tag == MAIN_NAMESPACE + "fill":
+                    pattern_fill = element.find(MAIN_NAMESPACE + "patternFill")
+                    color = pattern_fill.find(MAIN_NAMESPACE + "fgColor") if pattern_fill is not None else None
+                    if pattern_fill is None:
+                        fill_colors.append(None)
+                    elif color is None:
+                        # openpyxl's default foreground color
+                        fill_colors.append("00000000")
+                    else:
+                        fill_colors.append(color.get("rgb"))
+                elif element.tag == MAIN_NAMESPACE + "cellXfs":
+                    for xf in element.findall(MAIN_NAMESPACE + "xf"):
+                        font_id = int(xf.get("fontId", 0))
+                        fill_id = int(xf.get("fillId", 0))
+                        styles.append((font_colors[font_id] if font_id < len(font_colors) else None,
+                                       fill_colors[fill_id] if fill_id < len(fill_colors) else None))
+        return styles
+
+    @staticmethod
+    def _read_shared_strings(archive):
+        """
+        The shared strings of the workbook, which the string cells of the sheets refer to.
+        :param archive: The xlsx zip file
+        :return: list of strings
+        """
+        if "xl/sharedStrings.xml" not in archive.namelist():
+            return []
+
+        shared_strings = []
+        with archive.open("xl/sharedStrings.xml") as f:
+            for _, element in iterparse(f):
+                if element.tag == MAIN_NAMESPACE + "si":
+                    # rich text is split into runs, phonetic runs (rPh) are not part of the text
+                    texts = [t.text or "" for t in element.findall(MAIN_NAMESPACE + "t")]
+                    texts += [t.text or "" for t in element.findall(MAIN_NAMESPACE + "r/" + MAIN_NAMESPACE + "t")]
+                    shared_strings.append("".join(texts))
+                    element.clear()
+        return shared_strings
+
+    def sheet_name(self) -> str:
+        """
+        The name of the sheet.
+        Returns
+        -------
+        str
+            The sheet name.
+        """
+
+        return self._sheet_name
+
+    def style(self, style_id: int) -> tuple:
+        """
+        The font and fill rgb colors of a cell style. Colors which are not given as rgb (such as theme colors) are
+        None.
+        :param style_id: The style id (the s attribute of a cell)
+        :return: The font rgb and fill rgb
+        """
+
+        if style_id < len(self._styles):
+            return self._styles[style_id]
+        return None, None
+
+    def cells(self, min_row: int = 1, max_col: int = None, max_row: int = None):
+        """
+        The cells of the sheet which are in its XML, row by row.
+        :param min_row: First row to read
+        :param max_col: Last column to read, all the columns are read if None
+        :param max_row: Last row to read, all the rows are read if None
+        :return: generator of StyledCell
+        """
+
+        with zipfile.ZipFile(self._filepath) as archive, archive.open(self._sheet_path) as f:
+            sheet_data = None
+            row_number = 0
+            column = 0
+            for event, element in iterparse(f, events=("start", "end")):
+                tag = element.tag
+                if event == "start":
+                    if tag == MAIN_NAMESPACE + "sheetData":
+                        sheet_data = element
+                    elif tag == MAIN_NAMESPACE + "row":
+                        row_number = int(element.get("r", row_number + 1))
+                        column = 0
+                        if max_row is not None and row_number > max_row:
+                            return
+                    continue
+
+                if tag == MAIN_NAMESPACE + "c":
+                    reference = element.get("r")
+                    if reference is not None:
+                        column = column_number(re.match(r"[A-Z]+", reference).group(0))
+                    else:
+                        column += 1
+                    if row_number >= min_row and (max_col is None or column <= max_col):
+                        value = element.find(MAIN_NAMESPACE + "v")
+                        inline_string = element.find(MAIN_NAMESPACE + "is")
+                        if inline_string is not None:
+                            inline_string = "".join(t.text or "" for t in inline_string.iter(MAIN_NAMESPACE + "t"))
+                        style_id = int(element.get("s", 0))
+                        font_rgb, fill_rgb = self.style(style_id)
+                        cell_type = element.get("t", "n")
+                        converted = cell_value(cell_type, value.text if value is not None else None, inline_string,
+                                               self._shared_strings)
+                        if cell_type == "n" and converted is not None and style_id in self._date_styles:
+                            try:
+                                converted = from_excel(converted, self._epoch,
+                                                       timedelta=style_id in self._timedelta_styles)
+                            except (OverflowError, ValueError):
+                                # openpyxl treats a date it can't convert as an error
+                                converted = "#VALUE!"
+                        yield StyledCell(row_number, column, converted, font_rgb, fill_rgb, style_id)
+                elif tag == MAIN_NAMESPACE + "row":
+                    # the parsed row is dropped so that only one row is held in memory
+                    element.clear()
+                    if sheet_data is not None:
+                        sheet_data.remove(element)